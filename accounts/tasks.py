@@ -0,0 +1,20 @@
+# accounts/tasks.py
+from django.conf import settings
+from django.core.mail import EmailMessage
+
+from cakeshop.mailer import get_mailer
+from jobs.queue import task
+
+
+@task(name='accounts.send_contact_message')
+def send_contact_message(name, email, message):
+    """Forward a contact form submission to the shop inbox."""
+    mail = EmailMessage(
+        f"Contact Us Inquiry from {name}",
+        f"Name: {name}\nEmail: {email}\n\nMessage:\n{message}",
+        settings.EMAIL_HOST_USER,
+        [settings.EMAIL_HOST_USER],
+        reply_to=[email],
+    )
+    if not get_mailer().send(mail):
+        raise RuntimeError(f"Contact message from {email} was not sent")
@@ -10,8 +10,7 @@ from django.contrib import messages
 from .models import User  # your custom user model
 from .forms import UserProfileForm  # we'll define this form below
 from django.shortcuts import render
-from django.core.mail import send_mail
-from django.conf import settings
+from .tasks import send_contact_message
 from django.contrib import messages
 
 class UserRegistrationForm(forms.ModelForm):
@@ -76,9 +75,8 @@ def contact(request):
         email = request.POST.get('email')
         message = request.POST.get('message')
         if name and email and message:
-            subject = f"Contact Us Inquiry from {name}"
-            body = f"Name: {name}\nEmail: {email}\n\nMessage:\n{message}"
-            send_mail(subject, body, settings.EMAIL_HOST_USER, [settings.EMAIL_HOST_USER])
+            # Sent by the job worker, so a slow SMTP server does not hold up the page
+            send_contact_message.enqueue(name=name, email=email, message=message)
             messages.success(request, "Thank you for contacting us! We'll get back to you soon.")
         else:
             messages.error(request, "All fields are required.")
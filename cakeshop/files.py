@@ -0,0 +1,118 @@
+# cakeshop/files.py
+import os
+import re
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date
+
+STREAM_BLOCK_SIZE = 64 * 1024
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class _Unsatisfiable(Exception):
+    pass
+
+
+def _parse_range(header, size):
+    """
+    (start, end) of a single "bytes=" range, inclusive, or None to send the
+    whole file. Multiple ranges are answered with the whole file, which
+    RFC 9110 allows.
+    """
+    match = RANGE_RE.match(header.strip())
+    if not match or match.group(1) == match.group(2) == '':
+        return None
+    first, last = match.groups()
+    if first == '':
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            raise _Unsatisfiable
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        raise _Unsatisfiable
+    return start, end
+
+
+def _read_range(path, start, length):
+    with open(path, 'rb') as file:
+        file.seek(start)
+        while length > 0:
+            block = file.read(min(STREAM_BLOCK_SIZE, length))
+            if not block:
+                break
+            length -= len(block)
+            yield block
+
+
+def _internal_url(path):
+    relative = os.path.relpath(path, settings.MEDIA_ROOT).replace(os.sep, '/')
+    return settings.SENDFILE_URL.rstrip('/') + '/' + relative
+
+
+def send_file(request, path, filename, content_type='application/octet-stream', as_attachment=True):
+    """
+    Serve a private file with ETag / Last-Modified validation.
+
+    With SENDFILE_BACKEND = 'nginx' the body is handed to the front proxy
+    through X-Accel-Redirect (SENDFILE_URL must be an `internal` location
+    aliasing MEDIA_ROOT); with 'apache' through X-Sendfile. The proxy then
+    serves the bytes, ranges included, and the Django worker is free at
+    once. Without a backend the file is streamed from here, honouring a
+    single byte Range and If-Range.
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        raise Http404("File not found")
+    size = stat.st_size
+    etag = f'"{stat.st_mtime_ns:x}-{size:x}"'
+    last_modified = int(stat.st_mtime)
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        backend = getattr(settings, 'SENDFILE_BACKEND', '')
+        if backend == 'nginx':
+            response = HttpResponse(content_type=content_type)
+            response['X-Accel-Redirect'] = _internal_url(path)
+        elif backend == 'apache':
+            response = HttpResponse(content_type=content_type)
+            response['X-Sendfile'] = path
+        else:
+            response = _stream(request, path, size, etag, last_modified, content_type)
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Accept-Ranges'] = 'bytes'
+    response['Content-Disposition'] = content_disposition_header(as_attachment, filename)
+    response['Cache-Control'] = 'private, max-age=0, must-revalidate'
+    return response
+
+
+def _stream(request, path, size, etag, last_modified, content_type):
+    byte_range = None
+    range_header = request.headers.get('Range')
+    if range_header and request.method in ('GET', 'HEAD'):
+        if_range = request.headers.get('If-Range')
+        # A stale If-Range validator means the client's partial copy is outdated: send it all
+        if not if_range or if_range in (etag, http_date(last_modified)):
+            try:
+                byte_range = _parse_range(range_header, size)
+            except _Unsatisfiable:
+                response = HttpResponse(status=416)
+                response['Content-Range'] = f'bytes */{size}'
+                return response
+
+    if byte_range is None:
+        return FileResponse(open(path, 'rb'), content_type=content_type)
+
+    start, end = byte_range
+    length = end - start + 1
+    response = StreamingHttpResponse(_read_range(path, start, length), status=206, content_type=content_type)
+    response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response['Content-Length'] = str(length)
+    return response
@@ -0,0 +1,146 @@
+# cakeshop/mailer.py
+import logging
+import smtplib
+import threading
+import time
+
+from django.conf import settings
+from django.core.mail import get_connection
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """Token bucket: `rate` messages per second on average, bursts of up to `burst`."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(1, int(rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        if not self.rate:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def is_transient(error):
+    """Worth retrying: dropped connections, timeouts and 4xx SMTP replies."""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(400 <= code < 500 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    return isinstance(error, (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, OSError))
+
+
+class Mailer:
+    """
+    Sends EmailMessages over one authenticated connection that is kept open
+    across messages and reopened when it has been idle too long or dropped.
+    Sends are rate limited to the provider's quota and transient failures
+    are retried with backoff. Counts and latencies are kept in `stats`.
+
+    Works with any Django email backend, so the locmem backend or a local
+    SMTP stand-in (aiosmtpd) can replace the real server in tests.
+    """
+
+    def __init__(self, backend=None, rate=None, max_retries=None, retry_delay=1.0, idle_timeout=None):
+        self.backend = backend
+        self.limiter = RateLimiter(rate if rate is not None else settings.EMAIL_RATE_LIMIT)
+        self.max_retries = max_retries if max_retries is not None else settings.EMAIL_MAX_RETRIES
+        self.retry_delay = retry_delay
+        self.idle_timeout = idle_timeout if idle_timeout is not None else settings.EMAIL_CONNECTION_IDLE_TIMEOUT
+        self.connection = None
+        self.last_used = 0.0
+        self.lock = threading.RLock()
+        self.stats = {'sent': 0, 'failed': 0, 'retried': 0, 'connections': 0,
+                      'total_seconds': 0.0, 'max_seconds': 0.0}
+
+    def _connection(self):
+        if self.connection is not None and time.monotonic() - self.last_used > self.idle_timeout:
+            # Servers drop idle sessions; start a fresh one rather than fail on the next send
+            self.close()
+        if self.connection is None:
+            self.connection = get_connection(self.backend, fail_silently=False)
+            self.connection.open()
+            self.stats['connections'] += 1
+        return self.connection
+
+    def close(self):
+        with self.lock:
+            if self.connection is not None:
+                try:
+                    self.connection.close()
+                except Exception:
+                    pass
+                self.connection = None
+
+    def send(self, message):
+        """Send one EmailMessage. Returns True when it was accepted."""
+        with self.lock:
+            for attempt in range(self.max_retries + 1):
+                self.limiter.acquire()
+                started = time.monotonic()
+                try:
+                    message.connection = self._connection()
+                    message.send()
+                except Exception as e:
+                    self.close()
+                    if attempt < self.max_retries and is_transient(e):
+                        self.stats['retried'] += 1
+                        logger.warning("Transient failure sending %r, retrying: %s", message.subject, e)
+                        time.sleep(self.retry_delay * 2 ** attempt)
+                        continue
+                    self.stats['failed'] += 1
+                    logger.error("Failed to send %r to %s: %s", message.subject, message.to, e)
+                    return False
+                finally:
+                    message.connection = None
+                elapsed = time.monotonic() - started
+                self.last_used = time.monotonic()
+                self.stats['sent'] += 1
+                self.stats['total_seconds'] += elapsed
+                self.stats['max_seconds'] = max(self.stats['max_seconds'], elapsed)
+                return True
+        return False
+
+    def send_many(self, messages):
+        """Send a batch over the same connection. Returns the number accepted."""
+        with self.lock:
+            return sum(1 for message in messages if self.send(message))
+
+    def snapshot(self):
+        with self.lock:
+            stats = dict(self.stats)
+        stats['avg_seconds'] = stats['total_seconds'] / stats['sent'] if stats['sent'] else 0.0
+        return stats
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+_mailer = None
+_mailer_lock = threading.Lock()
+
+
+def get_mailer():
+    """The process-wide Mailer, so web requests and job threads share one connection."""
+    global _mailer
+    with _mailer_lock:
+        if _mailer is None:
+            _mailer = Mailer()
+    return _mailer
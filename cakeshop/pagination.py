@@ -0,0 +1,145 @@
+# cakeshop/pagination.py
+import datetime
+import decimal
+
+from django.core import signing
+from django.db.models import Q
+
+CURSOR_SALT = 'cakeshop.pagination.cursor'
+
+
+def _encode_value(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    return value
+
+
+def _resolve(obj, path):
+    for attr in path.split('__'):
+        obj = getattr(obj, attr)
+    return obj
+
+
+class KeysetPage:
+    def __init__(self, object_list, paginator, next_token, previous_token):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_token = next_token
+        self.previous_token = previous_token
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+    def has_next(self):
+        return self.next_token is not None
+
+    def has_previous(self):
+        return self.previous_token is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """
+    Cursor pagination over a fixed ordering, e.g. ('-created_at', '-id').
+
+    Instead of COUNT(*) + OFFSET, each page is fetched with a WHERE clause
+    that continues after the last row of the previous page, so deep pages
+    cost the same as the first one. The ordering must end in a unique
+    field and none of the fields may be NULL. Cursors are signed and
+    opaque to the client; a tampered or stale cursor yields the first page.
+    """
+
+    def __init__(self, queryset, per_page, ordering=('-created_at', '-id'), count_limit=1000):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = tuple(ordering)
+        self.count_limit = count_limit
+        self._count = None
+
+    @property
+    def fields(self):
+        return [name.lstrip('-') for name in self.ordering]
+
+    def _encode_cursor(self, obj, direction):
+        values = [_encode_value(_resolve(obj, field)) for field in self.fields]
+        return signing.dumps({'d': direction, 'v': values}, salt=CURSOR_SALT, compress=True)
+
+    def _decode_cursor(self, token):
+        if not token:
+            return None, None
+        try:
+            data = signing.loads(token, salt=CURSOR_SALT)
+        except signing.BadSignature:
+            return None, None
+        values = data.get('v')
+        if data.get('d') not in ('n', 'p') or not isinstance(values, list) or len(values) != len(self.ordering):
+            return None, None
+        return data['d'], values
+
+    def _after(self, values, reverse=False):
+        """
+        Build the lexicographic "comes after" condition for the ordering:
+        (a > x) OR (a = x AND b > y) OR ...
+        """
+        condition = Q()
+        equal = Q()
+        for name, value in zip(self.ordering, values):
+            field = name.lstrip('-')
+            descending = name.startswith('-') != reverse
+            lookup = 'lt' if descending else 'gt'
+            condition |= equal & Q(**{f'{field}__{lookup}': value})
+            equal &= Q(**{field: value})
+        return condition
+
+    def _reversed_ordering(self):
+        return [name[1:] if name.startswith('-') else f'-{name}' for name in self.ordering]
+
+    def get_page(self, token=None):
+        direction, values = self._decode_cursor(token)
+        queryset = self.queryset
+
+        if direction == 'p':
+            rows = list(
+                queryset.filter(self._after(values, reverse=True))
+                .order_by(*self._reversed_ordering())[:self.per_page + 1]
+            )
+            has_more = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+            rows.reverse()
+            has_previous, has_next = has_more, True
+        else:
+            if direction == 'n':
+                queryset = queryset.filter(self._after(values))
+            rows = list(queryset.order_by(*self.ordering)[:self.per_page + 1])
+            has_next = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+            has_previous = direction == 'n'
+
+        next_token = self._encode_cursor(rows[-1], 'n') if rows and has_next else None
+        previous_token = self._encode_cursor(rows[0], 'p') if rows and has_previous else None
+        return KeysetPage(rows, self, next_token, previous_token)
+
+    @property
+    def approximate_count(self):
+        """
+        Number of matching rows, counted only up to count_limit so the
+        query stays bounded on large tables. Compare with count_limit to
+        render "1000+".
+        """
+        if self._count is None:
+            self._count = self.queryset.order_by()[:self.count_limit].count()
+        return self._count
+
+    @property
+    def count_is_capped(self):
+        return self.approximate_count >= self.count_limit
@@ -32,6 +32,7 @@ INSTALLED_APPS = [
     "payments",
     "reviews",
     "dashboard",
+    "jobs",
 
     
 ]
@@ -59,6 +60,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'products.context_processors.category_navigation',
             ],
         },
     },
@@ -78,6 +80,15 @@ DATABASES = {
     }
 }
 
+# Cache (locmem by default; point CACHE_BACKEND/CACHE_LOCATION at a shared
+# backend such as django.core.cache.backends.redis.RedisCache in production)
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='cakeshop'),
+    }
+}
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -109,20 +120,61 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Private downloads (invoices) are handed to the front proxy when set (see cakeshop/files.py):
+# 'nginx' sends X-Accel-Redirect to SENDFILE_URL, an internal location aliasing MEDIA_ROOT;
+# 'apache' sends X-Sendfile. Empty streams the file from Django.
+SENDFILE_BACKEND = config('SENDFILE_BACKEND', default='')
+SENDFILE_URL = config('SENDFILE_URL', default='/protected-media/')
+
+# Background threads that render resized product images (see products/images.py)
+IMAGE_PIPELINE_WORKERS = config('IMAGE_PIPELINE_WORKERS', default=2, cast=int)
+
+# Seconds an unpaid online order holds its stock (see orders/inventory.py)
+STOCK_RESERVATION_TTL = config('STOCK_RESERVATION_TTL', default=15 * 60, cast=int)
+
+# Seconds a checkout / payment result is replayed for a retried request (see orders/idempotency.py)
+IDEMPOTENCY_KEY_TTL = config('IDEMPOTENCY_KEY_TTL', default=24 * 60 * 60, cast=int)
+# Seconds an unfinished claim blocks retries before one may take it over
+IDEMPOTENCY_CLAIM_LEASE = config('IDEMPOTENCY_CLAIM_LEASE', default=5 * 60, cast=int)
+
+# Background jobs (see jobs/worker.py): retry backoff and how long a claimed job is
+# left to its worker before another worker takes it over
+JOB_RETRY_BASE_DELAY = config('JOB_RETRY_BASE_DELAY', default=30, cast=int)
+JOB_RETRY_MAX_DELAY = config('JOB_RETRY_MAX_DELAY', default=60 * 60, cast=int)
+JOB_LEASE_SECONDS = config('JOB_LEASE_SECONDS', default=10 * 60, cast=int)
+
 # Custom User Model
 AUTH_USER_MODEL = 'accounts.User'
 
 # Email settings (Gmail SMTP)
-EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
-EMAIL_HOST = 'smtp.gmail.com'
-EMAIL_PORT = 587
-EMAIL_USE_TLS = True
+EMAIL_BACKEND = config('EMAIL_BACKEND', default='django.core.mail.backends.smtp.EmailBackend')
+EMAIL_HOST = config('EMAIL_HOST', default='smtp.gmail.com')
+EMAIL_PORT = config('EMAIL_PORT', default=587, cast=int)
+EMAIL_USE_TLS = config('EMAIL_USE_TLS', default=True, cast=bool)
 EMAIL_HOST_USER = config('EMAIL_HOST_USER')
 EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD')
+EMAIL_TIMEOUT = config('EMAIL_TIMEOUT', default=15, cast=int)
+
+# Outgoing mail through cakeshop/mailer.py: messages per second allowed by the
+# provider, retries of transient failures, and how long an idle connection is kept
+EMAIL_RATE_LIMIT = config('EMAIL_RATE_LIMIT', default=5, cast=float)
+EMAIL_MAX_RETRIES = config('EMAIL_MAX_RETRIES', default=3, cast=int)
+EMAIL_CONNECTION_IDLE_TIMEOUT = config('EMAIL_CONNECTION_IDLE_TIMEOUT', default=30, cast=int)
 
 # Razorpay integration
 RAZORPAY_KEY_ID = config('RAZORPAY_KEY_ID', default='dummy')
 RAZORPAY_KEY_SECRET = config('RAZORPAY_KEY_SECRET', default='dummy')
+# Secret set on the Razorpay dashboard for the payments/webhooks/razorpay/ endpoint
+RAZORPAY_WEBHOOK_SECRET = config('RAZORPAY_WEBHOOK_SECRET', default='')
+# Gateway client (see payments/gateway.py); point RAZORPAY_API_URL at
+# `manage.py run_fake_gateway` to exercise payments offline
+RAZORPAY_API_URL = config('RAZORPAY_API_URL', default='https://api.razorpay.com/v1')
+RAZORPAY_CONNECT_TIMEOUT = config('RAZORPAY_CONNECT_TIMEOUT', default=3.05, cast=float)
+RAZORPAY_READ_TIMEOUT = config('RAZORPAY_READ_TIMEOUT', default=10.0, cast=float)
+RAZORPAY_MAX_RETRIES = config('RAZORPAY_MAX_RETRIES', default=2, cast=int)
+RAZORPAY_POOL_SIZE = config('RAZORPAY_POOL_SIZE', default=10, cast=int)
+RAZORPAY_BREAKER_THRESHOLD = config('RAZORPAY_BREAKER_THRESHOLD', default=5, cast=int)
+RAZORPAY_BREAKER_RESET = config('RAZORPAY_BREAKER_RESET', default=30.0, cast=float)
 
 
 # Default primary key field type
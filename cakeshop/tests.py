@@ -0,0 +1,261 @@
+import os
+import smtplib
+import tempfile
+import time
+from decimal import Decimal
+
+from django.core import mail, signing
+from django.core.mail import EmailMessage
+from django.core.mail.backends import locmem
+from django.http import Http404
+from django.test import RequestFactory, SimpleTestCase, TestCase
+from django.utils.http import http_date
+
+from products.models import Cake
+from products.search import search_cakes
+from products.tests import CatalogFixtures
+from .files import send_file
+from .mailer import Mailer, RateLimiter
+from .pagination import CURSOR_SALT, KeysetPaginator
+
+
+class KeysetPaginatorTests(CatalogFixtures, TestCase):
+    def setUp(self):
+        super().setUp()
+        # Three price points shared by several cakes, so the sort key ties
+        prices = [Decimal('500.00'), Decimal('700.00'), Decimal('500.00'), Decimal('900.00'),
+                  Decimal('700.00'), Decimal('500.00'), Decimal('700.00')]
+        self.cakes = [self.make_cake(f'Chocolate cake {i}', prices=(price,)) for i, price in enumerate(prices)]
+
+    def walk(self, paginator):
+        """Follow next cursors from the first page; returns the pages' ids."""
+        pages, token = [], None
+        while True:
+            page = paginator.get_page(token)
+            pages.append([cake.pk for cake in page])
+            if not page.has_next():
+                return pages, page
+            token = page.next_token
+
+    def test_forward_walk_visits_every_row_once(self):
+        paginator = KeysetPaginator(Cake.objects.all(), 3, ordering=('-created_at', '-id'))
+        pages, _ = self.walk(paginator)
+        self.assertEqual([len(page) for page in pages], [3, 3, 1])
+        self.assertEqual(sum(pages, []), sorted((cake.pk for cake in self.cakes), reverse=True))
+
+    def test_previous_cursor_returns_the_same_pages(self):
+        paginator = KeysetPaginator(Cake.objects.all(), 3, ordering=('-created_at', '-id'))
+        pages, page = self.walk(paginator)
+        back = []
+        while page.has_previous():
+            page = paginator.get_page(page.previous_token)
+            back.append([cake.pk for cake in page])
+        self.assertEqual(back, pages[-2::-1])
+        self.assertFalse(page.has_previous())
+
+    def test_ties_on_price_broken_by_id(self):
+        paginator = KeysetPaginator(Cake.objects.all(), 2, ordering=('min_price', 'id'))
+        pages, _ = self.walk(paginator)
+        expected = [cake.pk for cake in sorted(self.cakes, key=lambda cake: (cake.min_price, cake.pk))]
+        self.assertEqual(sum(pages, []), expected)
+
+    def test_ties_on_search_rank_broken_by_id(self):
+        ranked = search_cakes(Cake.objects.all(), 'chocolate')
+        paginator = KeysetPaginator(ranked, 2, ordering=('-search_rank', '-id'))
+        pages, _ = self.walk(paginator)
+        self.assertEqual(sum(pages, []), sorted((cake.pk for cake in self.cakes), reverse=True))
+
+    def test_tampered_cursor_falls_back_to_first_page(self):
+        paginator = KeysetPaginator(Cake.objects.all(), 3)
+        first = [cake.pk for cake in paginator.get_page()]
+        token = paginator.get_page().next_token
+        for bad in (token[:-2] + 'xx', 'garbage', signing.dumps({'d': 'n', 'v': [1, 2]}, salt='another.salt')):
+            page = paginator.get_page(bad)
+            self.assertEqual([cake.pk for cake in page], first)
+            self.assertFalse(page.has_previous())
+
+    def test_foreign_cursor_falls_back_to_first_page(self):
+        token = KeysetPaginator(Cake.objects.all(), 3, ordering=('min_price', 'id')).get_page().next_token
+        three_keys = KeysetPaginator(Cake.objects.all(), 3, ordering=('flavor', 'min_price', 'id'))
+        first = [cake.pk for cake in three_keys.get_page()]
+        self.assertEqual([cake.pk for cake in three_keys.get_page(token)], first)
+
+        forged = signing.dumps({'d': 'x', 'v': ['a', 1, 2]}, salt=CURSOR_SALT)
+        self.assertEqual([cake.pk for cake in three_keys.get_page(forged)], first)
+
+
+class SendFileTests(SimpleTestCase):
+    body = bytes(range(256)) * 4
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        media = self.settings(MEDIA_ROOT=directory.name, SENDFILE_BACKEND='', SENDFILE_URL='/protected-media/')
+        media.enable()
+        self.addCleanup(media.disable)
+        os.makedirs(os.path.join(directory.name, 'invoices'))
+        self.path = os.path.join(directory.name, 'invoices', 'invoice_CO1.pdf')
+        with open(self.path, 'wb') as file:
+            file.write(self.body)
+        self.factory = RequestFactory()
+
+    def get(self, **meta):
+        return send_file(self.factory.get('/invoice/', **meta), self.path, 'invoice_CO1.pdf')
+
+    def content(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_whole_file(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.content(response), self.body)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertIn('attachment; filename="invoice_CO1.pdf"', response['Content-Disposition'])
+
+    def test_not_modified(self):
+        etag = self.get()['ETag']
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_range(self):
+        response = self.get(HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 10-19/{len(self.body)}')
+        self.assertEqual(response['Content-Length'], '10')
+        self.assertEqual(self.content(response), self.body[10:20])
+
+    def test_open_and_suffix_ranges(self):
+        self.assertEqual(self.content(self.get(HTTP_RANGE='bytes=1000-')), self.body[1000:])
+        self.assertEqual(self.content(self.get(HTTP_RANGE='bytes=-24')), self.body[-24:])
+        self.assertEqual(self.content(self.get(HTTP_RANGE='bytes=1000-5000')), self.body[1000:])
+
+    def test_unsatisfiable_range(self):
+        for header in (f'bytes={len(self.body)}-', 'bytes=-0', 'bytes=20-10'):
+            response = self.get(HTTP_RANGE=header)
+            self.assertEqual(response.status_code, 416, header)
+            self.assertEqual(response['Content-Range'], f'bytes */{len(self.body)}')
+
+    def test_multiple_ranges_get_whole_file(self):
+        response = self.get(HTTP_RANGE='bytes=0-1,5-6')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.content(response), self.body)
+
+    def test_if_range(self):
+        fresh = self.get()
+        for validator in (fresh['ETag'], fresh['Last-Modified']):
+            self.assertEqual(self.get(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=validator).status_code, 206)
+
+        stale = '"0-0"', http_date(0)
+        for validator in stale:
+            response = self.get(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=validator)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(self.content(response), self.body)
+
+    def test_nginx_backend(self):
+        with self.settings(SENDFILE_BACKEND='nginx'):
+            response = self.get(HTTP_RANGE='bytes=0-9')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/invoices/invoice_CO1.pdf')
+        self.assertEqual(response.content, b'')
+        self.assertIn('ETag', response)
+
+    def test_apache_backend(self):
+        with self.settings(SENDFILE_BACKEND='apache'):
+            response = self.get()
+        self.assertEqual(response['X-Sendfile'], self.path)
+        self.assertEqual(response.content, b'')
+
+    def test_missing_file(self):
+        os.remove(self.path)
+        with self.assertRaises(Http404):
+            self.get()
+
+
+class FlakyBackend(locmem.EmailBackend):
+    """The locmem backend, raising the queued errors on the next sends."""
+    errors = []
+
+    def send_messages(self, messages):
+        if FlakyBackend.errors:
+            raise FlakyBackend.errors.pop(0)
+        return super().send_messages(messages)
+
+
+class MailerTests(SimpleTestCase):
+    backend = 'cakeshop.tests.FlakyBackend'
+
+    def setUp(self):
+        FlakyBackend.errors = []
+        mail.outbox = []
+
+    def mailer(self, **options):
+        options.setdefault('rate', 0)
+        options.setdefault('max_retries', 2)
+        options.setdefault('idle_timeout', 60)
+        return Mailer(self.backend, retry_delay=0, **options)
+
+    def message(self, subject='Order confirmed'):
+        return EmailMessage(subject, 'Thanks!', 'shop@example.com', ['buyer@example.com'])
+
+    def test_batch_shares_one_connection(self):
+        with self.mailer() as mailer:
+            self.assertEqual(mailer.send_many(self.message(f'Order {i}') for i in range(3)), 3)
+            stats = mailer.snapshot()
+        self.assertEqual([message.subject for message in mail.outbox], ['Order 0', 'Order 1', 'Order 2'])
+        self.assertEqual((stats['sent'], stats['failed'], stats['retried'], stats['connections']), (3, 0, 0, 1))
+        self.assertGreaterEqual(stats['max_seconds'], stats['avg_seconds'])
+
+    def test_idle_connection_reopened(self):
+        mailer = self.mailer(idle_timeout=0)
+        mailer.send(self.message())
+        time.sleep(0.01)
+        mailer.send(self.message())
+        self.assertEqual(mailer.snapshot()['connections'], 2)
+
+    def test_transient_failures_retried(self):
+        FlakyBackend.errors = [smtplib.SMTPServerDisconnected('dropped'),
+                               smtplib.SMTPResponseException(421, b'try later')]
+        mailer = self.mailer()
+        self.assertTrue(mailer.send(self.message()))
+        self.assertEqual(len(mail.outbox), 1)
+        stats = mailer.snapshot()
+        self.assertEqual((stats['sent'], stats['retried'], stats['connections']), (1, 2, 3))
+
+    def test_gives_up_after_max_retries(self):
+        FlakyBackend.errors = [smtplib.SMTPServerDisconnected('dropped')] * 3
+        mailer = self.mailer(max_retries=2)
+        self.assertFalse(mailer.send(self.message()))
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual((mailer.stats['failed'], mailer.stats['retried']), (1, 2))
+
+    def test_permanent_failure_not_retried(self):
+        FlakyBackend.errors = [smtplib.SMTPRecipientsRefused({'buyer@example.com': (550, b'no such user')})]
+        mailer = self.mailer()
+        self.assertFalse(mailer.send(self.message()))
+        self.assertEqual((mailer.stats['failed'], mailer.stats['retried']), (1, 0))
+
+    def test_sends_rate_limited(self):
+        mailer = self.mailer(rate=20)
+        started = time.monotonic()
+        mailer.send_many(self.message() for _ in range(25))
+        # A burst of 20, then one message every 50ms
+        self.assertGreaterEqual(time.monotonic() - started, 0.2)
+        self.assertEqual(len(mail.outbox), 25)
+
+
+class RateLimiterTests(SimpleTestCase):
+    def test_burst_then_steady_rate(self):
+        limiter = RateLimiter(rate=50, burst=2)
+        started = time.monotonic()
+        for _ in range(2):
+            limiter.acquire()
+        self.assertLess(time.monotonic() - started, 0.02)
+        for _ in range(5):
+            limiter.acquire()
+        self.assertGreaterEqual(time.monotonic() - started, 0.09)
+
+    def test_no_rate_means_no_limit(self):
+        limiter = RateLimiter(rate=0)
+        started = time.monotonic()
+        for _ in range(1000):
+            limiter.acquire()
+        self.assertLess(time.monotonic() - started, 0.5)
@@ -12,4 +12,6 @@ urlpatterns = [
     path('payments/', include('payments.urls')),
     path('reviews/', include('reviews.urls')),
     path('dashboard/', include('dashboard.urls')),
+    path('api/v1/', include('products.api_urls')),
+    path('api/v1/', include('reviews.api_urls')),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
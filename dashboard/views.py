@@ -10,6 +10,7 @@ from accounts.models import User, LoginActivity
 from products.models import Cake
 from orders.models import Order, OrderItem
 from reviews.models import Review
+from cakeshop.pagination import KeysetPaginator
 
 @admin_required
 def admin_dashboard(request):
@@ -21,7 +22,9 @@ def admin_dashboard(request):
     pending_sellers = User.objects.filter(role='seller', is_approved=False).count()
     
     # Recent orders
-    recent_orders = Order.objects.select_related('user').order_by('-created_at')[:10]
+    recent_orders = KeysetPaginator(
+        Order.objects.select_related('user'), 10, ordering=('-created_at', '-id')
+    ).get_page(request.GET.get('cursor'))
     
     # Top selling cakes
     top_cakes = OrderItem.objects.values(
@@ -121,9 +124,13 @@ def seller_dashboard(request):
     ).aggregate(total=Sum('price'))['total'] or 0
     
     # Recent orders for seller's cakes
-    recent_orders = OrderItem.objects.filter(
-        variant__cake__seller=request.user
-    ).select_related('order', 'variant__cake').order_by('-order__created_at')[:10]
+    recent_orders = KeysetPaginator(
+        OrderItem.objects.filter(
+            variant__cake__seller=request.user
+        ).select_related('order', 'variant__cake'),
+        10,
+        ordering=('-order__created_at', '-id'),
+    ).get_page(request.GET.get('cursor'))
     
     context = {
         'total_cakes': seller_cakes.count(),
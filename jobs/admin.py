@@ -0,0 +1,20 @@
+from django.contrib import admin
+from django.utils import timezone
+
+from .models import Job
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'task', 'status', 'attempts', 'max_attempts', 'run_at', 'locked_by', 'updated_at']
+    list_filter = ['status', 'task']
+    search_fields = ['task']
+    readonly_fields = ('attempts', 'locked_at', 'locked_by', 'last_error', 'created_at', 'updated_at')
+    actions = ['requeue']
+
+    @admin.action(description="Requeue selected jobs now")
+    def requeue(self, request, queryset):
+        updated = queryset.exclude(status='running').update(
+            status='queued', attempts=0, run_at=timezone.now(), locked_at=None, locked_by='',
+        )
+        self.message_user(request, f"{updated} jobs requeued.")
@@ -0,0 +1,42 @@
+import signal
+
+from django.core.management.base import BaseCommand
+
+from cakeshop.mailer import get_mailer
+from jobs.worker import Worker
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs (emails, invoices, notifications) on a worker pool"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=4, help="Jobs run in parallel")
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help="Seconds to sleep when the queue is empty")
+        parser.add_argument('--once', action='store_true', help="Exit once the queue is drained")
+
+    def handle(self, *args, **options):
+        worker = Worker(concurrency=options['concurrency'], poll_interval=options['poll_interval'])
+
+        def shutdown(signum, frame):
+            self.stdout.write("Finishing the running jobs, then stopping...")
+            worker.stop()
+
+        signal.signal(signal.SIGINT, shutdown)
+        signal.signal(signal.SIGTERM, shutdown)
+
+        self.stdout.write(f"Worker {worker.name} started with {worker.concurrency} threads")
+        stats = worker.run(once=options['once'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Done: {stats['done']}, retried: {stats['retried']}, dead: {stats['dead']}"
+        ))
+
+        mailer = get_mailer()
+        mail = mailer.snapshot()
+        mailer.close()
+        if mail['sent'] or mail['failed']:
+            self.stdout.write(
+                f"Mail: {mail['sent']} sent, {mail['failed']} failed, {mail['retried']} retried "
+                f"over {mail['connections']} connections, avg {mail['avg_seconds'] * 1000:.0f} ms, "
+                f"max {mail['max_seconds'] * 1000:.0f} ms"
+            )
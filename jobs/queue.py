@@ -0,0 +1,60 @@
+# jobs/queue.py
+from datetime import timedelta
+
+from django.utils import timezone
+
+from .models import Job
+
+DEFAULT_MAX_ATTEMPTS = 5
+
+# task name -> Task, filled by @task as the apps' tasks modules are imported
+TASKS = {}
+
+
+class Task:
+    def __init__(self, func, name, max_attempts, on_dead):
+        self.func = func
+        self.name = name
+        self.max_attempts = max_attempts
+        self.on_dead = on_dead
+
+    def __call__(self, **payload):
+        return self.func(**payload)
+
+    def enqueue(self, delay=0, **payload):
+        return enqueue(self.name, payload, delay=delay, max_attempts=self.max_attempts)
+
+    def __repr__(self):
+        return f"<Task {self.name}>"
+
+
+def task(name=None, max_attempts=DEFAULT_MAX_ATTEMPTS, on_dead=None):
+    """
+    Register a function as a background task. It is called with the job's
+    payload as keyword arguments, so payloads must be JSON serializable
+    (pass ids, not model instances). Raising retries the job with backoff
+    until `max_attempts`; then the job is dead-lettered and
+    `on_dead(payload, error)` is called, if given.
+    """
+    def decorator(func):
+        registered = Task(func, name or f'{func.__module__}.{func.__name__}', max_attempts, on_dead)
+        TASKS[registered.name] = registered
+        return registered
+    return decorator
+
+
+def enqueue(task_name, payload=None, delay=0, max_attempts=None):
+    """
+    Queue a job. The row is written in the caller's transaction, so a job
+    enqueued next to other writes only becomes visible to workers if they
+    commit, and is never lost if they do.
+    """
+    if isinstance(task_name, Task):
+        max_attempts = max_attempts or task_name.max_attempts
+        task_name = task_name.name
+    return Job.objects.create(
+        task=task_name,
+        payload=payload or {},
+        max_attempts=max_attempts or DEFAULT_MAX_ATTEMPTS,
+        run_at=timezone.now() + timedelta(seconds=delay),
+    )
@@ -0,0 +1,116 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from .models import Job
+from .queue import enqueue, task
+from .worker import Worker, retry_delay
+
+calls = []
+dead_letters = []
+
+
+@task(name='jobs.tests.record')
+def record(**payload):
+    calls.append(payload)
+
+
+@task(name='jobs.tests.fail', max_attempts=2, on_dead=lambda payload, error: dead_letters.append((payload, error)))
+def fail(**payload):
+    raise RuntimeError('boom')
+
+
+@override_settings(JOB_RETRY_BASE_DELAY=30, JOB_RETRY_MAX_DELAY=300)
+class RetryDelayTests(SimpleTestCase):
+    def test_doubles_per_attempt_with_jitter(self):
+        for attempts, full in ((1, 30), (2, 60), (3, 120)):
+            for _ in range(20):
+                self.assertTrue(full / 2 <= retry_delay(attempts) <= full)
+
+    def test_capped(self):
+        self.assertLessEqual(retry_delay(20), 300)
+
+
+# close_old_connections() would close the test case's connection mid-transaction
+@mock.patch('jobs.worker.close_old_connections')
+@override_settings(JOB_RETRY_BASE_DELAY=30, JOB_RETRY_MAX_DELAY=300, JOB_LEASE_SECONDS=60)
+class WorkerTests(TestCase):
+    def setUp(self):
+        calls.clear()
+        dead_letters.clear()
+        self.worker = Worker(name='test-worker')
+
+    def run_due(self):
+        """Claim and run the due jobs in this thread, as one poll of run() does."""
+        jobs = self.worker.claim(10)
+        for job in jobs:
+            self.worker.run_job(job)
+        return jobs
+
+    def make_due(self, job):
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+
+    def test_finished_job_deleted(self, _):
+        enqueue(record, {'order_id': 7})
+        self.assertEqual(len(self.run_due()), 1)
+        self.assertEqual(calls, [{'order_id': 7}])
+        self.assertFalse(Job.objects.exists())
+        self.assertEqual(self.worker.stats['done'], 1)
+
+    def test_failure_retried_with_backoff(self, _):
+        job = fail.enqueue(order_id=7)
+        before = timezone.now()
+        self.run_due()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.locked_by), ('queued', 1, ''))
+        self.assertIn('RuntimeError: boom', job.last_error)
+        self.assertTrue(before + timedelta(seconds=15) <= job.run_at <= timezone.now() + timedelta(seconds=30))
+        self.assertEqual(self.worker.stats['retried'], 1)
+
+        # Not due yet
+        self.assertEqual(self.run_due(), [])
+
+    def test_dead_lettered_after_max_attempts(self, _):
+        job = fail.enqueue(order_id=7)
+        self.run_due()
+        self.make_due(job)
+        self.run_due()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('dead', 2))
+        (payload, error), = dead_letters
+        self.assertEqual(payload, {'order_id': 7})
+        self.assertIsInstance(error, RuntimeError)
+
+        self.make_due(job)
+        self.assertEqual(self.run_due(), [])
+
+    def test_unknown_task_dead_lettered(self, _):
+        job = enqueue('jobs.tests.missing')
+        self.run_due()
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'dead')
+        self.assertIn('Unknown task', job.last_error)
+
+    def test_expired_lock_reclaimed(self, _):
+        job = enqueue(record, {'order_id': 7})
+        Job.objects.filter(pk=job.pk).update(
+            status='running', attempts=1, locked_by='crashed', locked_at=timezone.now() - timedelta(seconds=61),
+        )
+        claimed, = self.worker.claim(10)
+        self.assertEqual((claimed.pk, claimed.attempts, claimed.locked_by), (job.pk, 2, 'test-worker'))
+        self.worker.run_job(claimed)
+        self.assertFalse(Job.objects.exists())
+
+    def test_live_lock_not_reclaimed(self, _):
+        job = enqueue(record)
+        Job.objects.filter(pk=job.pk).update(status='running', locked_by='busy', locked_at=timezone.now())
+        self.assertEqual(self.worker.claim(10), [])
+
+    def test_late_finish_of_reclaimed_job_does_not_touch_it(self, _):
+        job = enqueue(record)
+        stale = self.worker.claim(10)[0]
+        Job.objects.filter(pk=job.pk).update(locked_by='other-worker')
+        self.worker.run_job(stale)
+        self.assertEqual(Job.objects.get(pk=job.pk).locked_by, 'other-worker')
@@ -0,0 +1,131 @@
+# jobs/worker.py
+import logging
+import os
+import random
+import socket
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+from .queue import TASKS
+
+logger = logging.getLogger(__name__)
+
+
+def retry_delay(attempts):
+    """Exponential backoff with jitter, capped at JOB_RETRY_MAX_DELAY seconds."""
+    base = getattr(settings, 'JOB_RETRY_BASE_DELAY', 30)
+    cap = getattr(settings, 'JOB_RETRY_MAX_DELAY', 60 * 60)
+    delay = min(cap, base * 2 ** max(0, attempts - 1))
+    return delay * random.uniform(0.5, 1.0)
+
+
+class Worker:
+    """
+    Claims due jobs from the Job table and runs them on a thread pool.
+
+    Claiming locks the due rows with SELECT ... FOR UPDATE SKIP LOCKED where
+    the database supports it, so several worker processes can share the
+    table without taking the same job. A job whose worker died stays
+    'running' until its lease expires and is then claimed again.
+    """
+
+    def __init__(self, concurrency=4, poll_interval=1.0, lease=None, name=None):
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.lease = lease or getattr(settings, 'JOB_LEASE_SECONDS', 10 * 60)
+        self.name = name or f'{socket.gethostname()}:{os.getpid()}'
+        self.stopping = threading.Event()
+        self.stats = {'done': 0, 'retried': 0, 'dead': 0}
+        self._stats_lock = threading.Lock()
+
+    def claim(self, limit):
+        now = timezone.now()
+        due = Job.objects.filter(status='queued', run_at__lte=now)
+        expired = Job.objects.filter(status='running', locked_at__lt=now - timedelta(seconds=self.lease))
+        with transaction.atomic():
+            ids = []
+            for queryset in (due, expired):
+                if len(ids) >= limit:
+                    break
+                if connection.features.has_select_for_update_skip_locked:
+                    queryset = queryset.select_for_update(skip_locked=True)
+                else:
+                    queryset = queryset.select_for_update()
+                ids += list(queryset.order_by('run_at').values_list('id', flat=True)[:limit - len(ids)])
+            if not ids:
+                return []
+            Job.objects.filter(pk__in=ids).update(
+                status='running', locked_at=now, locked_by=self.name, attempts=F('attempts') + 1,
+            )
+        return list(Job.objects.filter(pk__in=ids).order_by('run_at'))
+
+    def run_job(self, job):
+        close_old_connections()
+        try:
+            registered = TASKS.get(job.task)
+            if registered is None:
+                self._dead(job, f"Unknown task {job.task!r}", None)
+                return
+            try:
+                registered(**job.payload)
+            except Exception as e:
+                error = traceback.format_exc()
+                if job.attempts >= job.max_attempts:
+                    self._dead(job, error, registered, e)
+                else:
+                    delay = retry_delay(job.attempts)
+                    logger.warning("Job %s (%s) failed, retrying in %.0fs: %s", job.pk, job.task, delay, e)
+                    Job.objects.filter(pk=job.pk, locked_by=self.name).update(
+                        status='queued', locked_at=None, locked_by='', last_error=error,
+                        run_at=timezone.now() + timedelta(seconds=delay),
+                    )
+                    self._count('retried')
+            else:
+                # Finished jobs are deleted so the queue table only holds pending and dead work
+                Job.objects.filter(pk=job.pk, locked_by=self.name).delete()
+                self._count('done')
+        except Exception:
+            logger.exception("Worker failed while handling job %s", job.pk)
+        finally:
+            close_old_connections()
+
+    def _dead(self, job, error, registered, exception=None):
+        logger.error("Job %s (%s) dead after %s attempts: %s", job.pk, job.task, job.attempts, error)
+        Job.objects.filter(pk=job.pk, locked_by=self.name).update(
+            status='dead', locked_at=None, locked_by='', last_error=error,
+        )
+        self._count('dead')
+        if registered is not None and registered.on_dead is not None:
+            try:
+                registered.on_dead(job.payload, exception)
+            except Exception:
+                logger.exception("Dead-letter handler of job %s failed", job.pk)
+
+    def _count(self, key):
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    def run(self, once=False):
+        """Process jobs until stop() is called, or until the queue is drained with once=True."""
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='job-worker') as pool:
+            while not self.stopping.is_set():
+                jobs = self.claim(self.concurrency)
+                if jobs:
+                    wait([pool.submit(self.run_job, job) for job in jobs])
+                    continue
+                if once:
+                    break
+                self.stopping.wait(self.poll_interval)
+        close_old_connections()
+        return self.stats
+
+    def stop(self):
+        self.stopping.set()
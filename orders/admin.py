@@ -1,6 +1,6 @@
 # orders/admin.py
 from django.contrib import admin
-from .models import Cart, CartItem, Coupon, Order, OrderItem, OrderStatusHistory
+from .models import Cart, CartItem, Coupon, Order, OrderItem, OrderStatusHistory, StockReservation, IdempotencyKey, CouponRedemption
 
 class CartItemInline(admin.TabularInline):
     model = CartItem
@@ -14,7 +14,7 @@ class CartAdmin(admin.ModelAdmin):
 
 @admin.register(Coupon)
 class CouponAdmin(admin.ModelAdmin):
-    list_display = ['code', 'coupon_type', 'value', 'min_order_amount', 'valid_from', 'valid_until', 'usage_limit', 'used_count', 'is_active', 'seller']
+    list_display = ['code', 'coupon_type', 'value', 'min_order_amount', 'valid_from', 'valid_until', 'usage_limit', 'per_user_limit', 'used_count', 'is_active', 'seller']
     list_filter = ['coupon_type', 'is_active', 'valid_from', 'valid_until']
     search_fields = ['code', 'seller__username']
 
@@ -25,8 +25,8 @@ class OrderItemInline(admin.TabularInline):
 
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
-    list_display = ['order_number', 'user', 'status', 'payment_method', 'total_amount', 'is_paid', 'created_at']
-    list_filter = ['status', 'payment_method', 'is_paid', 'created_at']
+    list_display = ['order_number', 'user', 'status', 'payment_method', 'total_amount', 'is_paid', 'refund_due', 'created_at']
+    list_filter = ['status', 'payment_method', 'is_paid', 'refund_due', 'created_at']
     search_fields = ['order_number', 'user__email']
     inlines = [OrderItemInline]
     readonly_fields = ('order_number', 'subtotal', 'delivery_charge', 'coupon_discount', 'total_amount', 'razorpay_order_id', 'razorpay_payment_id', 'razorpay_signature')
@@ -36,3 +36,23 @@ class OrderStatusHistoryAdmin(admin.ModelAdmin):
     list_display = ['order', 'status', 'updated_by', 'created_at']
     list_filter = ['status', 'created_at']
     search_fields = ['order__order_number', 'updated_by__username']
+
+@admin.register(StockReservation)
+class StockReservationAdmin(admin.ModelAdmin):
+    list_display = ['order', 'variant', 'quantity', 'expires_at', 'created_at']
+    list_filter = ['expires_at']
+    search_fields = ['order__order_number']
+    raw_id_fields = ['order', 'variant']
+
+@admin.register(IdempotencyKey)
+class IdempotencyKeyAdmin(admin.ModelAdmin):
+    list_display = ['key', 'completed', 'created_at', 'expires_at']
+    list_filter = ['completed']
+    search_fields = ['key']
+    readonly_fields = ('key', 'response', 'completed', 'created_at', 'expires_at')
+
+@admin.register(CouponRedemption)
+class CouponRedemptionAdmin(admin.ModelAdmin):
+    list_display = ['coupon', 'user', 'order', 'created_at']
+    search_fields = ['coupon__code', 'user__email', 'order__order_number']
+    raw_id_fields = ['coupon', 'user', 'order']
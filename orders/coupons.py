@@ -0,0 +1,71 @@
+# orders/coupons.py
+from django.db import transaction
+from django.db.models import F, Q
+
+from products.cache import bump_version, get_or_build
+from .models import Coupon, CouponRedemption
+
+COUPON_CACHE_TIMEOUT = 60 * 5
+
+
+class CouponUnavailable(Exception):
+    """The coupon cannot be redeemed (limit reached); the message is shown to the buyer."""
+
+
+def invalidate_coupons():
+    bump_version('coupons')
+
+
+def get_coupon(code):
+    """
+    The coupon with this code, or None. Looked up by the normalized code on
+    the unique index and cached until any coupon is saved or deleted;
+    unknown codes are cached too so repeated guesses stay cheap. The cached
+    used_count may lag, redeem_coupon() is what enforces the limits.
+    """
+    code = Coupon.normalize_code(code)
+    if not code:
+        return None
+    coupon = get_or_build(
+        f'coupon:{code}', ['coupons'],
+        lambda: Coupon.objects.filter(code=code).first() or False,
+        COUPON_CACHE_TIMEOUT,
+    )
+    return coupon or None
+
+
+def redeem_coupon(coupon, user, order):
+    """
+    Record one use of `coupon` by `order`.
+
+    The usage counter is bumped with a conditional UPDATE that only
+    matches while the coupon is active and below usage_limit, so a rush of
+    checkouts cannot overshoot the limit or lose increments. The per-user
+    count is read from the ledger; place_order() holds the buyer's cart
+    lock, so one buyer's checkouts cannot race each other past it.
+    Raises CouponUnavailable.
+    """
+    with transaction.atomic():
+        if coupon.per_user_limit:
+            used = CouponRedemption.objects.filter(coupon=coupon, user=user).count()
+            if used >= coupon.per_user_limit:
+                raise CouponUnavailable("You have already used this coupon")
+        updated = (
+            Coupon.objects.filter(pk=coupon.pk, is_active=True)
+            .filter(Q(usage_limit__isnull=True) | Q(usage_limit=0) | Q(used_count__lt=F('usage_limit')))
+            .update(used_count=F('used_count') + 1)
+        )
+        if not updated:
+            raise CouponUnavailable("Coupon usage limit exceeded")
+        CouponRedemption.objects.create(coupon=coupon, user=user, order=order)
+
+
+def release_coupon(order):
+    """Give back the coupon use of a cancelled order, if it had one."""
+    with transaction.atomic():
+        deleted, _ = CouponRedemption.objects.filter(order=order).delete()
+        if deleted and order.applied_coupon_id:
+            Coupon.objects.filter(pk=order.applied_coupon_id, used_count__gt=0).update(
+                used_count=F('used_count') - 1,
+            )
+        return bool(deleted)
@@ -0,0 +1,63 @@
+# orders/documents.py
+import hashlib
+
+from django.core.cache import cache
+from django.db.models import Prefetch
+from django.template.loader import render_to_string
+
+from .models import Order, OrderItem
+
+EMAIL_CACHE_TIMEOUT = 60 * 60 * 24 * 7
+
+
+def document_orders():
+    """
+    Orders with everything the confirmation email, the invoice and the
+    order page show: user, address and coupon joined, and the items with
+    their variants and cakes in one prefetch. Two queries for any number
+    of orders and items.
+    """
+    return Order.objects.select_related('user', 'shipping_address', 'applied_coupon').prefetch_related(
+        Prefetch('items', queryset=OrderItem.objects.select_related('variant__cake').order_by('id')),
+    )
+
+
+def load_order_document(order_id):
+    return document_orders().get(pk=order_id)
+
+
+def order_document_context(order):
+    """Template context shared by the order documents; `order` comes from document_orders()."""
+    return {
+        'order': order,
+        'user': order.user,
+        'address': order.shipping_address,
+        'items': list(order.items.all()),
+    }
+
+
+def order_version(order):
+    """
+    Changes whenever anything the documents print changes: the order row
+    (updated_at), the buyer's name or the shipping address, which can be
+    edited after the order was placed.
+    """
+    address = order.shipping_address
+    parts = [
+        order.pk,
+        int(order.updated_at.timestamp() * 1_000_000),
+        order.user.get_full_name(),
+        *(getattr(address, field, '') for field in
+          ('name', 'phone', 'address_line_1', 'address_line_2', 'city', 'state', 'pincode')),
+    ]
+    return hashlib.sha1('|'.join(str(part) for part in parts).encode('utf-8')).hexdigest()[:16]
+
+
+def render_order_confirmation(order):
+    """HTML body of the confirmation email, rendered once per order version."""
+    key = f'emails:order_confirmation:{order.pk}:{order_version(order)}'
+    html = cache.get(key)
+    if html is None:
+        html = render_to_string('emails/order_confirmation.html', order_document_context(order))
+        cache.set(key, html, EMAIL_CACHE_TIMEOUT)
+    return html
@@ -0,0 +1,102 @@
+# orders/idempotency.py
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import IdempotencyKey
+
+MAX_CLIENT_KEY_LENGTH = 64
+
+
+class IdempotencyConflict(Exception):
+    """The same key is being processed by another request right now."""
+
+
+def client_key(request, field='idempotency_key'):
+    """The key sent in the Idempotency-Key header or a form field, if any."""
+    key = (request.headers.get('Idempotency-Key') or request.POST.get(field) or '').strip()
+    return key[:MAX_CLIENT_KEY_LENGTH] or None
+
+
+def _claim(key, ttl, lease):
+    """
+    Insert the claim row for `key`. Returns None when this request now owns
+    the key, or the existing row when another request got there first.
+
+    A claim whose request died without finishing is taken over once its
+    lease has run out, so a crash costs a retry `lease` seconds later
+    rather than blocking the key until the stored result would expire.
+    """
+    for _ in range(3):
+        now = timezone.now()
+        try:
+            with transaction.atomic():
+                IdempotencyKey.objects.create(
+                    key=key, locked_until=now + timedelta(seconds=lease), expires_at=now + timedelta(seconds=ttl),
+                )
+            return None
+        except IntegrityError:
+            record = IdempotencyKey.objects.filter(key=key).first()
+            if record is None:
+                continue
+            if record.expires_at <= now:
+                # Expired: clear it and claim again
+                IdempotencyKey.objects.filter(pk=record.pk, expires_at__lte=now).delete()
+                continue
+            if record.completed or (record.locked_until and record.locked_until > now):
+                return record
+            # Stale claim: take it over, unless another request just did
+            stale = IdempotencyKey.objects.filter(pk=record.pk, completed=False, locked_until=record.locked_until)
+            taken = stale.update(
+                locked_until=now + timedelta(seconds=lease), expires_at=now + timedelta(seconds=ttl),
+            )
+            if taken:
+                return None
+    raise IdempotencyConflict(key)
+
+
+def run_once(scope, key, action, ttl=None):
+    """
+    Run `action()` once per (scope, key) and return (result, replayed).
+
+    The first request inserts a claim row, runs the action and stores its
+    JSON-serializable result in the same transaction as the action's own
+    writes. A retry with the same key gets the stored result back with
+    replayed=True instead of running the action again. A retry that
+    arrives while the first request is still running raises
+    IdempotencyConflict; one that arrives after the claim's lease
+    (IDEMPOTENCY_CLAIM_LEASE) ran out runs the action itself, so the
+    action must tolerate a crashed earlier attempt. If the action raises,
+    the claim is dropped so the request can be retried.
+    """
+    key = f'{scope}:{key}'
+    ttl = ttl or settings.IDEMPOTENCY_KEY_TTL
+    record = _claim(key, ttl, settings.IDEMPOTENCY_CLAIM_LEASE)
+    if record is not None:
+        if not record.completed:
+            raise IdempotencyConflict(key)
+        return record.response, True
+
+    try:
+        with transaction.atomic():
+            result = action()
+            IdempotencyKey.objects.filter(key=key).update(response=result, completed=True, locked_until=None)
+    except BaseException:
+        IdempotencyKey.objects.filter(key=key, completed=False).delete()
+        raise
+    return result, False
+
+
+def purge_expired_keys(batch_size=1000):
+    """Delete expired keys in batches. Returns the count."""
+    purged = 0
+    while True:
+        ids = list(
+            IdempotencyKey.objects.filter(expires_at__lte=timezone.now())
+            .order_by('expires_at').values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return purged
+        purged += IdempotencyKey.objects.filter(pk__in=ids).delete()[0]
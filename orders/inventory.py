@@ -0,0 +1,242 @@
+# orders/inventory.py
+from collections import Counter
+from dataclasses import dataclass
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import Case, F, Max, Min, Sum, Value, When
+from django.utils import timezone
+
+from products.models import Cake, CakeVariant
+
+
+@dataclass(frozen=True)
+class Shortfall:
+    variant_id: int
+    requested: int
+    available: int
+
+    def __str__(self):
+        return f"variant {self.variant_id}: requested {self.requested}, available {self.available}"
+
+
+class InsufficientStock(Exception):
+    """Raised when one or more variants cannot cover the requested quantity."""
+
+    def __init__(self, shortfalls):
+        self.shortfalls = shortfalls
+        super().__init__("Insufficient stock for " + "; ".join(str(s) for s in shortfalls))
+
+
+def _quantities(lines):
+    """Sum (variant_id, quantity) pairs into {variant_id: quantity}."""
+    totals = Counter()
+    for variant_id, quantity in lines:
+        if quantity > 0:
+            totals[variant_id] += quantity
+    return dict(totals)
+
+
+def _quantity_case(quantities):
+    return Case(
+        *[When(pk=variant_id, then=Value(quantity)) for variant_id, quantity in quantities.items()],
+        output_field=models.PositiveIntegerField(),
+    )
+
+
+def _refresh_cakes(variant_ids):
+    """
+    Redo the CakeVariant.save() bookkeeping for variants changed with
+    update(): one grouped aggregate and one bulk_update however many cakes.
+    The stored values come back with the aggregate, so only cakes whose
+    stock flag or price range moved invalidate the catalog-wide listings.
+    """
+    from products.cache import invalidate_cake
+
+    stats = list(
+        CakeVariant.objects.filter(cake_id__in=CakeVariant.objects.filter(pk__in=variant_ids).values('cake_id'))
+        .values('cake_id', 'cake__category_id', 'cake__min_price', 'cake__max_price', 'cake__in_stock')
+        .annotate(min_price=Min('price'), max_price=Max('price'), max_stock=Max('stock'))
+    )
+    now = timezone.now()
+    Cake.objects.bulk_update([
+        Cake(pk=row['cake_id'], min_price=row['min_price'], max_price=row['max_price'],
+             in_stock=bool(row['max_stock']), updated_at=now)
+        for row in stats
+    ], ['min_price', 'max_price', 'in_stock', 'updated_at'])
+    invalidations = [
+        (row['cake_id'], [row['cake__category_id']],
+         (row['cake__min_price'], row['cake__max_price'], row['cake__in_stock'])
+         != (row['min_price'], row['max_price'], bool(row['max_stock'])))
+        for row in stats
+    ]
+    transaction.on_commit(lambda: [invalidate_cake(*args) for args in invalidations])
+
+
+def _shortfalls(quantities, stock):
+    return [
+        Shortfall(variant_id, quantity, stock.get(variant_id, 0))
+        for variant_id, quantity in sorted(quantities.items())
+        if stock.get(variant_id, 0) < quantity
+    ]
+
+
+def available_stock(variant_ids):
+    """
+    {variant_id: stock not held by a live reservation}. The holds are one
+    SUM grouped by variant over the (variant, expires_at, quantity) index.
+    """
+    from .models import StockReservation
+
+    available = dict(CakeVariant.objects.filter(pk__in=variant_ids).values_list('id', 'stock'))
+    held = (
+        StockReservation.objects.active().filter(variant_id__in=variant_ids)
+        .values('variant_id').annotate(total=Sum('quantity')).values_list('variant_id', 'total')
+    )
+    for variant_id, total in held:
+        if variant_id in available:
+            available[variant_id] = max(0, available[variant_id] - total)
+    return available
+
+
+def find_shortfalls(lines):
+    """Shortfalls the given lines would hit right now, without changing stock."""
+    quantities = _quantities(lines)
+    return _shortfalls(quantities, available_stock(quantities))
+
+
+def _raw_stock(variant_ids):
+    return dict(CakeVariant.objects.filter(pk__in=variant_ids).values_list('id', 'stock'))
+
+
+class _ShortUpdate(Exception):
+    pass
+
+
+def decrement_stock(lines, attempts=3):
+    """
+    Take `lines` ((variant_id, quantity) pairs) out of stock, all or nothing.
+
+    A single conditional UPDATE decrements every variant whose stock still
+    covers its quantity; if fewer rows than variants were updated, some
+    variant fell short, the savepoint is rolled back and InsufficientStock
+    is raised with the shortfalls read after the rollback. Stock never goes
+    negative and concurrent decrements cannot overwrite each other.
+    """
+    quantities = _quantities(lines)
+    if not quantities:
+        return
+    for _ in range(attempts):
+        try:
+            with transaction.atomic():
+                quantity = _quantity_case(quantities)
+                updated = CakeVariant.objects.filter(pk__in=quantities, stock__gte=quantity).update(
+                    stock=F('stock') - quantity,
+                )
+                if updated != len(quantities):
+                    raise _ShortUpdate
+                _refresh_cakes(quantities)
+                return
+        except _ShortUpdate:
+            shortfalls = _shortfalls(quantities, _raw_stock(quantities))
+            if shortfalls:
+                raise InsufficientStock(shortfalls) from None
+            # Restocked between the UPDATE and the read: try again
+    raise InsufficientStock(_shortfalls(quantities, _raw_stock(quantities)))
+
+
+def restock(lines):
+    """Put `lines` back into stock with one UPDATE."""
+    quantities = _quantities(lines)
+    if not quantities:
+        return
+    with transaction.atomic():
+        quantity = _quantity_case(quantities)
+        CakeVariant.objects.filter(pk__in=quantities).update(stock=F('stock') + quantity)
+        _refresh_cakes(quantities)
+
+
+def order_lines(order):
+    return order.items.values_list('variant_id', 'quantity')
+
+
+def reserve_order_stock(order, ttl=None):
+    """
+    Hold stock for every item of `order` until now + `ttl` seconds
+    (STOCK_RESERVATION_TTL by default), replacing any earlier hold of the
+    order. The variant rows are locked in id order so concurrent
+    reservations and decrements of the same variants queue up instead of
+    both seeing the last cake as free. Raises InsufficientStock.
+    """
+    from .models import StockReservation
+
+    if ttl is None:
+        ttl = settings.STOCK_RESERVATION_TTL
+    quantities = _quantities(order_lines(order))
+    with transaction.atomic():
+        list(CakeVariant.objects.select_for_update().filter(pk__in=quantities).order_by('id').values_list('id'))
+        StockReservation.objects.filter(order=order).delete()
+        shortfalls = _shortfalls(quantities, available_stock(quantities))
+        if shortfalls:
+            raise InsufficientStock(shortfalls)
+        expires_at = timezone.now() + timedelta(seconds=ttl)
+        StockReservation.objects.bulk_create([
+            StockReservation(order=order, variant_id=variant_id, quantity=quantity, expires_at=expires_at)
+            for variant_id, quantity in quantities.items()
+        ])
+    return expires_at
+
+
+def release_expired_reservations(batch_size=1000):
+    """Delete expired holds, oldest first, one batch per transaction. Returns the count."""
+    from .models import StockReservation
+
+    released = 0
+    while True:
+        ids = list(
+            StockReservation.objects.expired().order_by('expires_at').values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return released
+        with transaction.atomic():
+            released += StockReservation.objects.filter(pk__in=ids).delete()[0]
+
+
+def commit_order_stock(order):
+    """
+    Decrement stock for every item of `order` once and drop its hold. The
+    order row is locked so a repeated payment callback or a racing
+    cancellation cannot take or return the same stock twice. An order
+    without a live hold (COD, or a payment after the hold expired) is
+    reserved first so it cannot take stock held for someone else.
+    Raises InsufficientStock.
+    """
+    from .models import Order, StockReservation
+
+    with transaction.atomic():
+        locked = Order.objects.select_for_update().only('id', 'stock_committed').get(pk=order.pk)
+        if locked.stock_committed:
+            return False
+        if not StockReservation.objects.active().filter(order=order).exists():
+            reserve_order_stock(order)
+        decrement_stock(order_lines(order))
+        StockReservation.objects.filter(order=order).delete()
+        Order.objects.filter(pk=order.pk).update(stock_committed=True)
+    order.stock_committed = True
+    return True
+
+
+def release_order_stock(order):
+    """Return the stock taken or held by `order`, if any. Safe to call more than once."""
+    from .models import Order, StockReservation
+
+    with transaction.atomic():
+        locked = Order.objects.select_for_update().only('id', 'stock_committed').get(pk=order.pk)
+        StockReservation.objects.filter(order=order).delete()
+        if not locked.stock_committed:
+            return False
+        restock(order_lines(order))
+        Order.objects.filter(pk=order.pk).update(stock_committed=False)
+    order.stock_committed = False
+    return True
@@ -0,0 +1,23 @@
+from django.db import migrations, models
+
+
+def mark_paid_orders(apps, schema_editor):
+    # Paid orders already had their stock reduced by payment_success
+    Order = apps.get_model('orders', 'Order')
+    Order.objects.filter(is_paid=True).exclude(status='cancelled').update(stock_committed=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='stock_committed',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.RunPython(mark_paid_orders, migrations.RunPython.noop),
+    ]
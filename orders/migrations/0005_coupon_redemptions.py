@@ -0,0 +1,62 @@
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def normalize_codes(apps, schema_editor):
+    Coupon = apps.get_model('orders', 'Coupon')
+    codes = {}
+    for pk, code in Coupon.objects.values_list('pk', 'code'):
+        codes.setdefault(code.strip().upper(), []).append((pk, code))
+    # Codes differing only in case or spacing would break the unique index
+    # once upper-cased; which coupon keeps the code is for a person to decide
+    collisions = [', '.join(repr(code) for _, code in group) for group in codes.values() if len(group) > 1]
+    if collisions:
+        raise RuntimeError(
+            "Cannot normalize coupon codes, these only differ in case or spacing: "
+            + "; ".join(collisions) + ". Rename or delete all but one of each and migrate again."
+        )
+    for code, ((pk, old_code),) in codes.items():
+        if code != old_code:
+            Coupon.objects.filter(pk=pk).update(code=code)
+
+
+def backfill_redemptions(apps, schema_editor):
+    Order = apps.get_model('orders', 'Order')
+    CouponRedemption = apps.get_model('orders', 'CouponRedemption')
+    CouponRedemption.objects.bulk_create([
+        CouponRedemption(coupon_id=coupon_id, user_id=user_id, order_id=order_id)
+        for order_id, coupon_id, user_id in Order.objects.filter(applied_coupon__isnull=False)
+        .exclude(status='cancelled').values_list('id', 'applied_coupon_id', 'user_id').iterator()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('orders', '0004_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='coupon',
+            name='per_user_limit',
+            field=models.PositiveIntegerField(blank=True, help_text='Redemptions allowed per buyer; empty for no limit', null=True),
+        ),
+        migrations.CreateModel(
+            name='CouponRedemption',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('coupon', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='redemptions', to='orders.coupon')),
+                ('order', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='coupon_redemption', to='orders.order')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='coupon_redemptions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['coupon', 'user'], name='orders_redemption_user')],
+            },
+        ),
+        migrations.RunPython(normalize_codes, migrations.RunPython.noop),
+        migrations.RunPython(backfill_redemptions, migrations.RunPython.noop),
+    ]
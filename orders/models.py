@@ -41,6 +41,8 @@ class Coupon(models.Model):
     valid_from = models.DateTimeField()
     valid_until = models.DateTimeField()
     usage_limit = models.PositiveIntegerField(null=True, blank=True)
+    per_user_limit = models.PositiveIntegerField(null=True, blank=True,
+                                                 help_text="Redemptions allowed per buyer; empty for no limit")
     used_count = models.PositiveIntegerField(default=0)
     is_active = models.BooleanField(default=True)
     
@@ -48,6 +50,23 @@ class Coupon(models.Model):
     seller = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, 
                               limit_choices_to={'role': 'seller'})
     
+    @staticmethod
+    def normalize_code(code):
+        return (code or '').strip().upper()
+    
+    def save(self, *args, **kwargs):
+        # Stored upper case so lookups hit the unique index without iexact
+        self.code = self.normalize_code(self.code)
+        super().save(*args, **kwargs)
+        from .coupons import invalidate_coupons
+        invalidate_coupons()
+    
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        from .coupons import invalidate_coupons
+        invalidate_coupons()
+        return result
+    
     def is_valid(self, order_amount=None):
         from django.utils import timezone
         
@@ -104,13 +123,18 @@ class Order(models.Model):
     
     # Payment
     payment_method = models.CharField(max_length=10, choices=PAYMENT_METHODS)
-    razorpay_order_id = models.CharField(max_length=100, blank=True)
+    # Indexed for payment callbacks, webhooks and reconciliation lookups
+    razorpay_order_id = models.CharField(max_length=100, blank=True, db_index=True)
     razorpay_payment_id = models.CharField(max_length=100, blank=True)
     razorpay_signature = models.CharField(max_length=200, blank=True)
     is_paid = models.BooleanField(default=False)
+    # A payment was captured for the order after it was cancelled (payments.services)
+    refund_due = models.BooleanField(default=False)
     
     # Order tracking
     status = models.CharField(max_length=15, choices=STATUS_CHOICES, default='placed')
+    # Set while the items' quantities are taken out of variant stock (orders.inventory)
+    stock_committed = models.BooleanField(default=False, editable=False)
     estimated_delivery = models.DateField(null=True, blank=True)
     
     # Audit
@@ -138,9 +162,64 @@ class OrderItem(models.Model):
     def get_total_price(self):
         return self.price * self.quantity
 
+class CouponRedemption(models.Model):
+    """One use of a coupon by an order; the ledger behind Coupon.used_count."""
+    coupon = models.ForeignKey(Coupon, on_delete=models.CASCADE, related_name='redemptions')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='coupon_redemptions')
+    order = models.OneToOneField(Order, on_delete=models.CASCADE, related_name='coupon_redemption')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['coupon', 'user'], name='orders_redemption_user'),
+        ]
+
 class OrderStatusHistory(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='status_history')
     status = models.CharField(max_length=15, choices=Order.STATUS_CHOICES)
     notes = models.TextField(blank=True)
     updated_by = models.ForeignKey(User, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
+
+class StockReservationQuerySet(models.QuerySet):
+    def active(self):
+        from django.utils import timezone
+        return self.filter(expires_at__gt=timezone.now())
+
+    def expired(self):
+        from django.utils import timezone
+        return self.filter(expires_at__lte=timezone.now())
+
+class StockReservation(models.Model):
+    """Stock held for an unpaid order until it is paid, cancelled or expires."""
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='reservations')
+    variant = models.ForeignKey(CakeVariant, on_delete=models.CASCADE, related_name='reservations')
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField(db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = StockReservationQuerySet.as_manager()
+
+    class Meta:
+        unique_together = ['order', 'variant']
+        indexes = [
+            # Covers the "live holds per variant" aggregate behind available stock
+            models.Index(fields=['variant', 'expires_at', 'quantity'], name='orders_resv_variant_live'),
+        ]
+
+class IdempotencyKey(models.Model):
+    """
+    Outcome of a request that must run at most once per client key
+    (see orders/idempotency.py). A row without `completed` is a claim held
+    by the request still running, until `locked_until`; after that another
+    request may take it over.
+    """
+    key = models.CharField(max_length=255, unique=True)
+    response = models.JSONField(null=True, blank=True)
+    completed = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return self.key
@@ -0,0 +1,90 @@
+# orders/services.py
+from decimal import Decimal
+
+from django.db import transaction
+
+from .coupons import CouponUnavailable, get_coupon, redeem_coupon
+from .inventory import commit_order_stock, reserve_order_stock
+from .models import Cart, Order, OrderItem
+
+DELIVERY_CHARGE = Decimal('50.00')
+
+
+class CheckoutError(Exception):
+    """A checkout that cannot go ahead; the message is shown to the buyer."""
+
+
+class EmptyCart(CheckoutError):
+    pass
+
+
+class CouponError(CheckoutError):
+    pass
+
+
+def place_order(user, address, payment_method, coupon_code=''):
+    """
+    Turn the user's cart into an order in one transaction.
+
+    The cart row is locked so two submissions of the same cart queue up
+    and the second finds it empty. Items and variants come from a single
+    query, the OrderItems are written with one bulk_create, and stock,
+    coupon usage and the cart clear commit or roll back together, so the
+    query count does not grow with the size of the cart.
+
+    Raises CheckoutError, or inventory.InsufficientStock when the stock
+    cannot cover the cart.
+    """
+    if payment_method not in dict(Order.PAYMENT_METHODS):
+        raise CheckoutError("Please choose a payment method")
+
+    with transaction.atomic():
+        cart = Cart.objects.select_for_update().filter(user=user).first()
+        items = list(cart.items.select_related('variant').order_by('id')) if cart else []
+        if not items:
+            raise EmptyCart("Your cart is empty")
+
+        subtotal = sum((item.variant.price * item.quantity for item in items), Decimal('0.00'))
+        coupon_discount = Decimal('0.00')
+        coupon = None
+        if coupon_code:
+            coupon = get_coupon(coupon_code)
+            if coupon is None:
+                raise CouponError("Invalid coupon code")
+            is_valid, message = coupon.is_valid(subtotal)
+            if not is_valid:
+                raise CouponError(f"Coupon error: {message}")
+            coupon_discount = coupon.calculate_discount(subtotal)
+
+        order = Order.objects.create(
+            user=user,
+            shipping_address=address,
+            subtotal=subtotal,
+            delivery_charge=DELIVERY_CHARGE,
+            coupon_discount=coupon_discount,
+            total_amount=subtotal + DELIVERY_CHARGE - coupon_discount,
+            payment_method=payment_method,
+            applied_coupon=coupon,
+            # COD needs no payment step to be confirmed
+            status='placed' if payment_method == 'razorpay' else 'confirmed',
+        )
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, variant=item.variant, quantity=item.quantity, price=item.variant.price)
+            for item in items
+        ])
+
+        # COD orders take their stock now; online payments hold it
+        # until the payment is captured or the hold expires
+        if payment_method == 'razorpay':
+            reserve_order_stock(order)
+        else:
+            commit_order_stock(order)
+
+        if coupon:
+            try:
+                redeem_coupon(coupon, user, order)
+            except CouponUnavailable as e:
+                raise CouponError(f"Coupon error: {e}")
+
+        cart.items.all().delete()
+    return order
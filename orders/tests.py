@@ -1,3 +1,365 @@
-from django.test import TestCase
+from datetime import timedelta
+from importlib import import_module
+from decimal import Decimal
 
-# Create your tests here.
+from django.apps import apps
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import Address, User
+from products.models import Cake, CakeVariant, Category
+from .coupons import CouponUnavailable, redeem_coupon
+from .documents import document_orders, order_document_context, render_order_confirmation
+from .idempotency import IdempotencyConflict, run_once
+from .inventory import (
+    InsufficientStock, available_stock, commit_order_stock, decrement_stock,
+    release_expired_reservations, reserve_order_stock,
+)
+from .models import Cart, CartItem, Coupon, CouponRedemption, IdempotencyKey, Order, OrderItem, StockReservation
+from .services import place_order
+
+
+class ShopFixtures:
+    """A buyer with an address and one cake in stock; shared with the payments tests."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user(
+            email='seller@example.com', username='seller', password='x', role='seller',
+        )
+        cls.buyer = User.objects.create_user(email='buyer@example.com', username='buyer', password='x')
+        cls.address = Address.objects.create(
+            user=cls.buyer, name='Buyer', phone='9999999999', address_line_1='1 Main St',
+            city='Pune', state='MH', pincode='411001',
+        )
+        cls.category = Category.objects.create(name='Birthday')
+        cls.cake = Cake.objects.create(
+            seller=cls.seller, title='Truffle', description='Chocolate', category=cls.category,
+            flavor='Chocolate', dietary='eggless',
+        )
+
+    def setUp(self):
+        self.variant = CakeVariant.objects.create(cake=self.cake, weight='1', price=Decimal('500.00'), stock=3)
+
+    def stock(self, variant=None):
+        return CakeVariant.objects.values_list('stock', flat=True).get(pk=(variant or self.variant).pk)
+
+    def make_order(self, quantity=2, payment_method='razorpay', **fields):
+        subtotal = self.variant.price * quantity
+        order = Order.objects.create(
+            user=self.buyer, shipping_address=self.address, subtotal=subtotal,
+            total_amount=subtotal + Decimal('50.00'), payment_method=payment_method, **fields,
+        )
+        OrderItem.objects.create(order=order, variant=self.variant, quantity=quantity, price=self.variant.price)
+        return order
+
+    def more_variants(self, count):
+        cakes = [
+            Cake.objects.create(seller=self.seller, title=f'Cake {i}', category=self.category,
+                                flavor='Vanilla', dietary='veg')
+            for i in range(count)
+        ]
+        return [CakeVariant.objects.create(cake=cake, weight='1', price=Decimal('300.00'), stock=5) for cake in cakes]
+
+
+class DecrementStockTests(ShopFixtures, TestCase):
+    def test_rejects_oversell(self):
+        with self.assertRaises(InsufficientStock) as raised:
+            decrement_stock([(self.variant.pk, 4)])
+        shortfall, = raised.exception.shortfalls
+        self.assertEqual((shortfall.requested, shortfall.available), (4, 3))
+        self.assertEqual(self.stock(), 3)
+
+    def test_all_or_nothing(self):
+        other = CakeVariant.objects.create(cake=self.cake, weight='2', price=Decimal('900.00'), stock=1)
+        with self.assertRaises(InsufficientStock):
+            decrement_stock([(self.variant.pk, 2), (other.pk, 2)])
+        self.assertEqual((self.stock(), self.stock(other)), (3, 1))
+
+    def test_takes_exact_stock(self):
+        decrement_stock([(self.variant.pk, 1), (self.variant.pk, 2)])
+        self.assertEqual(self.stock(), 0)
+        self.assertFalse(Cake.objects.get(pk=self.cake.pk).in_stock)
+
+
+class ReservationTests(ShopFixtures, TestCase):
+    def test_reservation_holds_stock(self):
+        reserve_order_stock(self.make_order(quantity=2))
+        self.assertEqual(available_stock([self.variant.pk]), {self.variant.pk: 1})
+        with self.assertRaises(InsufficientStock):
+            reserve_order_stock(self.make_order(quantity=2))
+
+    def test_expired_reservation_releases_stock(self):
+        order = self.make_order(quantity=3)
+        reserve_order_stock(order)
+        self.assertEqual(available_stock([self.variant.pk]), {self.variant.pk: 0})
+
+        StockReservation.objects.filter(order=order).update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(available_stock([self.variant.pk]), {self.variant.pk: 3})
+        self.assertEqual(release_expired_reservations(), 1)
+        self.assertFalse(StockReservation.objects.exists())
+        self.assertEqual(self.stock(), 3)
+
+
+class CommitOrderStockTests(ShopFixtures, TestCase):
+    def test_commit_twice_is_a_no_op(self):
+        order = self.make_order(quantity=2)
+        reserve_order_stock(order)
+        self.assertTrue(commit_order_stock(order))
+        self.assertFalse(commit_order_stock(order))
+        self.assertEqual(self.stock(), 1)
+        self.assertFalse(StockReservation.objects.filter(order=order).exists())
+        self.assertTrue(Order.objects.get(pk=order.pk).stock_committed)
+
+    def test_commit_without_hold_cannot_take_held_stock(self):
+        reserve_order_stock(self.make_order(quantity=2))
+        with self.assertRaises(InsufficientStock):
+            commit_order_stock(self.make_order(quantity=2, payment_method='cod'))
+        self.assertEqual(self.stock(), 3)
+
+    def test_cancel_returns_stock(self):
+        order = self.make_order(quantity=2, status='confirmed')
+        commit_order_stock(order)
+        self.assertEqual(self.stock(), 1)
+
+        self.client.force_login(self.buyer)
+        self.client.post(reverse('cancel_order', args=[order.pk]))
+
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'cancelled')
+        self.assertFalse(order.stock_committed)
+        self.assertEqual(self.stock(), 3)
+
+    def test_cancel_drops_hold(self):
+        order = self.make_order(quantity=3)
+        reserve_order_stock(order)
+
+        self.client.force_login(self.buyer)
+        self.client.post(reverse('cancel_order', args=[order.pk]))
+
+        self.assertFalse(StockReservation.objects.filter(order=order).exists())
+        self.assertEqual(available_stock([self.variant.pk]), {self.variant.pk: 3})
+
+
+@override_settings(IDEMPOTENCY_KEY_TTL=3600, IDEMPOTENCY_CLAIM_LEASE=60)
+class RunOnceTests(TestCase):
+    def setUp(self):
+        self.calls = 0
+
+    def action(self):
+        self.calls += 1
+        return {'calls': self.calls}
+
+    def test_replays_stored_result(self):
+        self.assertEqual(run_once('test', 'k', self.action), ({'calls': 1}, False))
+        self.assertEqual(run_once('test', 'k', self.action), ({'calls': 1}, True))
+        self.assertEqual(self.calls, 1)
+
+    def test_scopes_do_not_share_keys(self):
+        run_once('test', 'k', self.action)
+        self.assertEqual(run_once('other', 'k', self.action), ({'calls': 2}, False))
+
+    def test_live_claim_conflicts(self):
+        now = timezone.now()
+        IdempotencyKey.objects.create(
+            key='test:k', locked_until=now + timedelta(seconds=30), expires_at=now + timedelta(hours=1),
+        )
+        with self.assertRaises(IdempotencyConflict):
+            run_once('test', 'k', self.action)
+        self.assertEqual(self.calls, 0)
+
+    def test_stale_claim_is_taken_over(self):
+        now = timezone.now()
+        IdempotencyKey.objects.create(
+            key='test:k', locked_until=now - timedelta(seconds=1), expires_at=now + timedelta(hours=1),
+        )
+        self.assertEqual(run_once('test', 'k', self.action), ({'calls': 1}, False))
+        record = IdempotencyKey.objects.get(key='test:k')
+        self.assertTrue(record.completed)
+        self.assertIsNone(record.locked_until)
+
+    def test_failed_action_releases_key(self):
+        def fail():
+            raise ValueError('boom')
+
+        with self.assertRaises(ValueError):
+            run_once('test', 'k', fail)
+        self.assertFalse(IdempotencyKey.objects.filter(key='test:k').exists())
+        self.assertEqual(run_once('test', 'k', self.action), ({'calls': 1}, False))
+
+
+class PlaceOrderTests(ShopFixtures, TestCase):
+    def fill_cart(self, *lines):
+        cart, _ = Cart.objects.get_or_create(user=self.buyer)
+        CartItem.objects.bulk_create([CartItem(cart=cart, variant=variant, quantity=quantity) for variant, quantity in lines])
+        return cart
+
+    def test_cod_order_takes_stock_and_clears_cart(self):
+        cart = self.fill_cart((self.variant, 2))
+        order = place_order(self.buyer, self.address, 'cod')
+        self.assertEqual((order.status, order.subtotal, order.total_amount),
+                         ('confirmed', Decimal('1000.00'), Decimal('1050.00')))
+        self.assertEqual(list(order.items.values_list('variant_id', 'quantity')), [(self.variant.pk, 2)])
+        self.assertEqual(self.stock(), 1)
+        self.assertFalse(cart.items.exists())
+
+    def test_stock_out_rolls_everything_back(self):
+        other, = self.more_variants(1)
+        cart = self.fill_cart((other, 1), (self.variant, 4))
+        with self.assertRaises(InsufficientStock):
+            place_order(self.buyer, self.address, 'cod')
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(OrderItem.objects.exists())
+        self.assertEqual((self.stock(), self.stock(other)), (3, 5))
+        self.assertEqual(cart.items.count(), 2)
+
+    def test_held_stock_rolls_back_online_order(self):
+        reserve_order_stock(self.make_order(quantity=2))
+        self.fill_cart((self.variant, 2))
+        with self.assertRaises(InsufficientStock):
+            place_order(self.buyer, self.address, 'razorpay')
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(StockReservation.objects.count(), 1)
+
+    def test_query_count_does_not_grow_with_cart(self):
+        variants = self.more_variants(5)
+        self.fill_cart((self.variant, 1))
+        with CaptureQueriesContext(connection) as one_line:
+            place_order(self.buyer, self.address, 'razorpay')
+
+        self.fill_cart(*((variant, 1) for variant in variants))
+        with self.assertNumQueries(len(one_line)):
+            order = place_order(self.buyer, self.address, 'razorpay')
+        self.assertEqual(order.items.count(), 5)
+
+
+class CouponTests(ShopFixtures, TestCase):
+    def make_coupon(self, code='SAVE10', **fields):
+        now = timezone.now()
+        return Coupon.objects.create(
+            code=code, coupon_type='fixed', value=Decimal('100.00'),
+            valid_from=now - timedelta(days=1), valid_until=now + timedelta(days=1), **fields,
+        )
+
+    def used_count(self, coupon):
+        return Coupon.objects.values_list('used_count', flat=True).get(pk=coupon.pk)
+
+    def test_total_usage_limit(self):
+        coupon = self.make_coupon(usage_limit=2)
+        other = User.objects.create_user(email='other@example.com', username='other', password='x')
+        redeem_coupon(coupon, self.buyer, self.make_order())
+        redeem_coupon(coupon, other, self.make_order())
+        with self.assertRaisesMessage(CouponUnavailable, "Coupon usage limit exceeded"):
+            redeem_coupon(coupon, other, self.make_order())
+        self.assertEqual(self.used_count(coupon), 2)
+        self.assertEqual(CouponRedemption.objects.count(), 2)
+
+    def test_per_user_limit(self):
+        coupon = self.make_coupon(per_user_limit=1)
+        other = User.objects.create_user(email='other@example.com', username='other', password='x')
+        redeem_coupon(coupon, self.buyer, self.make_order())
+        with self.assertRaisesMessage(CouponUnavailable, "You have already used this coupon"):
+            redeem_coupon(coupon, self.buyer, self.make_order())
+        redeem_coupon(coupon, other, self.make_order())
+        self.assertEqual(self.used_count(coupon), 2)
+
+    def test_inactive_coupon_not_redeemed(self):
+        coupon = self.make_coupon(is_active=False)
+        with self.assertRaises(CouponUnavailable):
+            redeem_coupon(coupon, self.buyer, self.make_order())
+        self.assertEqual(self.used_count(coupon), 0)
+
+    def test_cancel_gives_the_use_back(self):
+        coupon = self.make_coupon(usage_limit=1)
+        order = self.make_order(applied_coupon=coupon, status='confirmed')
+        redeem_coupon(coupon, self.buyer, order)
+
+        self.client.force_login(self.buyer)
+        self.client.post(reverse('cancel_order', args=[order.pk]))
+        self.assertEqual(self.used_count(coupon), 0)
+        redeem_coupon(coupon, self.buyer, self.make_order())
+
+
+class NormalizeCouponCodesMigrationTests(TestCase):
+    migration = import_module('orders.migrations.0005_coupon_redemptions')
+
+    def make_coupon(self, code):
+        now = timezone.now()
+        return Coupon.objects.create(code=code, coupon_type='fixed', value=Decimal('100.00'),
+                                     valid_from=now, valid_until=now + timedelta(days=1))
+
+    def test_codes_upper_cased(self):
+        coupon = self.make_coupon('SAVE10')
+        Coupon.objects.filter(pk=coupon.pk).update(code=' save10')
+        self.migration.normalize_codes(apps, None)
+        self.assertEqual(Coupon.objects.get(pk=coupon.pk).code, 'SAVE10')
+
+    def test_colliding_codes_fail_clearly(self):
+        self.make_coupon('SAVE10')
+        coupon = self.make_coupon('OTHER')
+        Coupon.objects.filter(pk=coupon.pk).update(code=' save10')
+        with self.assertRaisesMessage(RuntimeError, "only differ in case or spacing") as raised:
+            self.migration.normalize_codes(apps, None)
+        self.assertIn("' save10'", str(raised.exception))
+        self.assertEqual(Coupon.objects.get(pk=coupon.pk).code, ' save10')
+
+
+class OrderDocumentTests(ShopFixtures, TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def make_orders(self, count, extra_items):
+        variants = self.more_variants(extra_items)
+        orders = [self.make_order(quantity=1) for _ in range(count)]
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, variant=variant, quantity=2, price=variant.price)
+            for order in orders for variant in variants
+        ])
+        return orders
+
+    def test_documents_load_in_two_queries(self):
+        self.make_orders(3, extra_items=2)
+        with self.assertNumQueries(2):
+            for order in document_orders():
+                context = order_document_context(order)
+                (context['user'].get_full_name(), context['address'].city, order.applied_coupon,
+                 [(item.variant.cake.title, item.variant.weight, item.get_total_price()) for item in context['items']])
+                self.assertEqual(len(context['items']), 3)
+
+    def test_confirmation_renders_without_queries(self):
+        order, = self.make_orders(1, extra_items=3)
+        order = document_orders().get(pk=order.pk)
+        with self.assertNumQueries(0):
+            html = render_order_confirmation(order)
+        self.assertIn('Cake 2', html)
+        self.assertIn(order.order_number, html)
+
+    def test_confirmation_cached_per_order_version(self):
+        order, = self.make_orders(1, extra_items=0)
+        html = render_order_confirmation(document_orders().get(pk=order.pk))
+        self.assertIn('Pune', html)
+
+        self.address.city = 'Mumbai'
+        self.address.save()
+        html = render_order_confirmation(document_orders().get(pk=order.pk))
+        self.assertIn('Mumbai', html)
+        self.assertNotIn('Pune', html)
+
+    def test_order_page_query_count_does_not_grow(self):
+        small, = self.make_orders(1, extra_items=0)
+        large, = self.make_orders(1, extra_items=5)
+        self.client.force_login(self.buyer)
+        self.client.get(reverse('order_detail', args=[small.pk]))  # warm the category cache
+
+        counts = []
+        for order in (small, large):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(reverse('order_detail', args=[order.pk]))
+            self.assertEqual(response.status_code, 200)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
@@ -2,18 +2,38 @@
 
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse, FileResponse, Http404
+from django.http import JsonResponse, Http404
 from django.views.decorators.http import require_POST
 from django.contrib import messages
-from django.conf import settings
-
-from decimal import Decimal
-import os
-
-from .models import Cart, CartItem, Order, OrderItem, Coupon
+from django.db import transaction
+
+import logging
+import uuid
+
+from .coupons import release_coupon
+from .documents import document_orders, order_document_context
+from .idempotency import IdempotencyConflict, client_key, run_once
+from .inventory import InsufficientStock, available_stock, release_order_stock
+from .models import Cart, CartItem, Order
+from .services import CheckoutError, EmptyCart, place_order
+from cakeshop.files import send_file
+from cakeshop.pagination import KeysetPaginator
+from payments.invoices import ensure_invoice, invoice_filename
 from products.models import CakeVariant
 from accounts.models import Address
 
+logger = logging.getLogger(__name__)
+
+
+def stock_error_message(shortfalls):
+    variants = CakeVariant.objects.select_related('cake').in_bulk([s.variant_id for s in shortfalls])
+    parts = []
+    for shortfall in shortfalls:
+        variant = variants.get(shortfall.variant_id)
+        name = str(variant) if variant else f"Item {shortfall.variant_id}"
+        parts.append(f"{name} (only {shortfall.available} left, you asked for {shortfall.requested})")
+    return "Insufficient stock: " + ", ".join(parts)
+
 
 @login_required
 def add_to_cart(request):
@@ -22,9 +42,10 @@ def add_to_cart(request):
         quantity = int(request.POST.get('quantity', 1))
 
         variant = get_object_or_404(CakeVariant, id=variant_id)
+        available = available_stock([variant.id]).get(variant.id, 0)
 
-        if quantity > variant.stock:
-            return JsonResponse({'success': False, 'message': 'Insufficient stock'})
+        if quantity > available:
+            return JsonResponse({'success': False, 'message': 'Insufficient stock', 'available': available})
 
         cart, _ = Cart.objects.get_or_create(user=request.user)
         cart_item, created = CartItem.objects.get_or_create(
@@ -35,8 +56,8 @@ def add_to_cart(request):
 
         if not created:
             new_quantity = cart_item.quantity + quantity
-            if new_quantity > variant.stock:
-                return JsonResponse({'success': False, 'message': 'Insufficient stock'})
+            if new_quantity > available:
+                return JsonResponse({'success': False, 'message': 'Insufficient stock', 'available': available})
             cart_item.quantity = new_quantity
             cart_item.save()
 
@@ -78,8 +99,9 @@ def update_cart_item(request):
         cart_item.delete()
         return JsonResponse({'success': True, 'message': 'Item removed from cart'})
 
-    if quantity > cart_item.variant.stock:
-        return JsonResponse({'success': False, 'message': 'Insufficient stock'})
+    available = available_stock([cart_item.variant_id]).get(cart_item.variant_id, 0)
+    if quantity > available:
+        return JsonResponse({'success': False, 'message': 'Insufficient stock', 'available': available})
 
     cart_item.quantity = quantity
     cart_item.save()
@@ -94,15 +116,6 @@ def update_cart_item(request):
 
 @login_required
 def checkout(request):
-    try:
-        cart = request.user.cart
-        if not cart.items.exists():
-            messages.error(request, 'Your cart is empty')
-            return redirect('cart_detail')
-    except Cart.DoesNotExist:
-        messages.error(request, 'Your cart is empty')
-        return redirect('cart_detail')
-
     if request.method == 'POST':
         address_id = request.POST.get('address_id')
         payment_method = request.POST.get('payment_method')
@@ -110,70 +123,55 @@ def checkout(request):
 
         address = get_object_or_404(Address, id=address_id, user=request.user)
 
-        subtotal = cart.get_total_price()
-        delivery_charge = Decimal('50.00')  # Fixed delivery charge
-        coupon_discount = Decimal('0.00')
-        applied_coupon = None
-
-        if coupon_code:
-            try:
-                coupon = Coupon.objects.get(code__iexact=coupon_code)
-                is_valid, message = coupon.is_valid(subtotal)
-                if is_valid:
-                    coupon_discount = coupon.calculate_discount(subtotal)
-                    applied_coupon = coupon
-                else:
-                    messages.error(request, f"Coupon error: {message}")
-                    return redirect('checkout')
-            except Coupon.DoesNotExist:
-                messages.error(request, "Invalid coupon code")
-                return redirect('checkout')
-
-        total_amount = subtotal + delivery_charge - coupon_discount
-
-        # Create order
-        order = Order.objects.create(
-            user=request.user,
-            shipping_address=address,
-            subtotal=subtotal,
-            delivery_charge=delivery_charge,
-            coupon_discount=coupon_discount,
-            total_amount=total_amount,
-            payment_method=payment_method,
-            applied_coupon=applied_coupon
-        )
+        def place():
+            order = place_order(request.user, address, payment_method, coupon_code)
+            return {'order_id': order.id, 'payment_method': order.payment_method}
+
+        # A double-click or a retried POST carries the same key and gets the first order back
+        key = client_key(request)
+        try:
+            if key:
+                placed, replayed = run_once(f'checkout:{request.user.id}', key, place)
+            else:
+                placed, replayed = place(), False
+        except IdempotencyConflict:
+            messages.info(request, 'Your order is already being placed.')
+            return redirect('order_list')
+        except EmptyCart as e:
+            messages.error(request, str(e))
+            return redirect('cart_detail')
+        except CheckoutError as e:
+            messages.error(request, str(e))
+            return redirect('checkout')
+        except InsufficientStock as e:
+            messages.error(request, stock_error_message(e.shortfalls))
+            return redirect('cart_detail')
 
-        # Create order items
-        for cart_item in cart.items.all():
-            OrderItem.objects.create(
-                order=order,
-                variant=cart_item.variant,
-                quantity=cart_item.quantity,
-                price=cart_item.variant.price
-            )
-
-        # Update coupon usage count
-        if applied_coupon:
-            applied_coupon.used_count += 1
-            applied_coupon.save()
-
-        # Clear cart
-        cart.items.all().delete()
-
-        if payment_method == 'razorpay':
-            return redirect('initiate_payment', order_id=order.id)
+        if placed['payment_method'] == 'razorpay':
+            return redirect('initiate_payment', order_id=placed['order_id'])
         else:  # COD
-            order.status = 'confirmed'
-            order.save()
             # TODO: send order confirmation email here
-            messages.success(request, 'Order placed successfully!')
-            return redirect('order_success', order_id=order.id)
+            if not replayed:
+                messages.success(request, 'Order placed successfully!')
+            return redirect('order_success', order_id=placed['order_id'])
+
+    # Checked after the POST branch so a retried submission of a placed
+    # order is answered from its idempotency key, not with "cart is empty"
+    try:
+        cart = request.user.cart
+        if not cart.items.exists():
+            messages.error(request, 'Your cart is empty')
+            return redirect('cart_detail')
+    except Cart.DoesNotExist:
+        messages.error(request, 'Your cart is empty')
+        return redirect('cart_detail')
 
     addresses = request.user.addresses.all()
 
     context = {
         'cart': cart,
         'addresses': addresses,
+        'idempotency_key': uuid.uuid4().hex,
     }
     return render(request, 'orders/checkout.html', context)
 
@@ -181,12 +179,15 @@ def checkout(request):
 @login_required
 def order_list(request):
     """
-    List all orders of the logged-in buyer, ordered by newest first.
+    List the orders of the logged-in buyer, newest first, one cursor page at a time.
     """
-    orders = Order.objects.filter(user=request.user).order_by('-created_at')
+    orders = Order.objects.filter(user=request.user)
+    paginator = KeysetPaginator(orders, 10, ordering=('-created_at', '-id'))
+    page_obj = paginator.get_page(request.GET.get('cursor'))
 
     context = {
-        'orders': orders,
+        'orders': page_obj,
+        'page_obj': page_obj,
     }
     return render(request, 'orders/order_list.html', context)
 
@@ -197,7 +198,7 @@ from decimal import Decimal
 
 @login_required
 def order_detail(request, order_id):
-    order = get_object_or_404(Order, id=order_id, user=request.user)
+    order = get_object_or_404(document_orders(), id=order_id, user=request.user)
     
     # Handle order cancellation POST request
     if request.method == 'POST':
@@ -206,8 +207,11 @@ def order_detail(request, order_id):
             if order.can_be_cancelled():
                 reason = request.POST.get('cancel_reason', '').strip()
                 if reason:
-                    order.status = 'cancelled'
-                    order.save()
+                    with transaction.atomic():
+                        release_order_stock(order)
+                        release_coupon(order)
+                        order.status = 'cancelled'
+                        order.save()
                     # Optionally: send email notification about cancellation here
                     messages.success(request, 'Order cancelled successfully.')
                     # Refund logic can be added if applicable
@@ -217,10 +221,7 @@ def order_detail(request, order_id):
             else:
                 messages.error(request, 'Order cannot be cancelled at this stage.')
     
-    context = {
-        'order': order,
-    }
-    return render(request, 'orders/order_detail.html', context)
+    return render(request, 'orders/order_detail.html', order_document_context(order))
 
 
 @login_required
@@ -230,12 +231,13 @@ def download_invoice(request, order_id):
         # Restrict invoice download before payment completion
         raise Http404("Invoice not available for unpaid orders")
     
-    pdf_path = os.path.join(settings.MEDIA_ROOT, 'invoices', f'invoice_{order.order_number}.pdf')
-    if not os.path.exists(pdf_path):
-        raise Http404("Invoice file not found")
-    
-    return FileResponse(open(pdf_path, 'rb'), content_type='application/pdf', 
-                        as_attachment=True, filename=f'invoice_{order.order_number}.pdf')
+    try:
+        pdf_path = ensure_invoice(order)
+    except Exception:
+        logger.exception("Could not render invoice of order %s", order.order_number)
+        raise Http404("Invoice not available right now")
+
+    return send_file(request, pdf_path, invoice_filename(order.order_number), content_type='application/pdf')
 
 
 @login_required
@@ -248,8 +250,11 @@ def cancel_order(request, order_id):
 
     if request.method == "POST":
         reason = request.POST.get('cancel_reason', '')  # Can be saved/logged if needed
-        order.status = 'cancelled'
-        order.save()
+        with transaction.atomic():
+            release_order_stock(order)
+            release_coupon(order)
+            order.status = 'cancelled'
+            order.save()
         # TODO: add notification, refund logic if applicable
         messages.success(request, "Order cancelled successfully.")
         return redirect('order_list')
@@ -1,3 +1,11 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import WebhookEvent
+
+
+@admin.register(WebhookEvent)
+class WebhookEventAdmin(admin.ModelAdmin):
+    list_display = ['event_id', 'event', 'received_at', 'processed_at', 'attempts']
+    list_filter = ['event', 'processed_at']
+    search_fields = ['event_id']
+    readonly_fields = ('event_id', 'event', 'body', 'received_at', 'processed_at', 'attempts', 'error')
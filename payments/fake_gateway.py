@@ -0,0 +1,198 @@
+# payments/fake_gateway.py
+import base64
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from .gateway import RazorpayGateway
+
+
+class FakeGateway:
+    """
+    In-memory stand-in for the parts of the Razorpay API the shop uses:
+    orders, payments and the payment signature. `latency` (seconds) and
+    `failure_rate` (share of requests answered 503) simulate a slow or
+    flaky gateway; `fail_next(n)` answers exactly the next n requests with
+    503 for deterministic tests. `requests` counts the requests served.
+    """
+
+    def __init__(self, key_id='rzp_test_fake', key_secret='fake_secret', latency=0.0, failure_rate=0.0):
+        self.key_id = key_id
+        self.key_secret = key_secret
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.orders = {}
+        self.payments = {}
+        self.requests = 0
+        self.pending_failures = 0
+        self.lock = threading.Lock()
+        self.signer = RazorpayGateway(key_id, key_secret)
+
+    def fail_next(self, count=1):
+        with self.lock:
+            self.pending_failures = count
+
+    def should_fail(self):
+        with self.lock:
+            self.requests += 1
+            if self.pending_failures:
+                self.pending_failures -= 1
+                return True
+        return bool(self.failure_rate) and random.random() < self.failure_rate
+
+    def create_order(self, data):
+        order = {
+            'id': f'order_{uuid.uuid4().hex[:14]}',
+            'entity': 'order',
+            'amount': int(data.get('amount', 0)),
+            'amount_paid': 0,
+            'currency': data.get('currency', 'INR'),
+            'receipt': data.get('receipt'),
+            'notes': data.get('notes') or {},
+            'status': 'created',
+            'created_at': int(time.time()),
+        }
+        with self.lock:
+            self.orders[order['id']] = order
+        return order
+
+    def capture(self, order_id, status='captured'):
+        """
+        Pay a fake order as the checkout widget would. Returns the fields
+        the browser posts to payment_success, signature included.
+        """
+        with self.lock:
+            order = self.orders[order_id]
+            payment = {
+                'id': f'pay_{uuid.uuid4().hex[:14]}',
+                'entity': 'payment',
+                'amount': order['amount'],
+                'currency': order['currency'],
+                'status': status,
+                'order_id': order_id,
+                'captured': status == 'captured',
+                'created_at': int(time.time()),
+            }
+            self.payments[payment['id']] = payment
+            if status == 'captured':
+                order['amount_paid'] = order['amount']
+                order['status'] = 'paid'
+        return {
+            'razorpay_order_id': order_id,
+            'razorpay_payment_id': payment['id'],
+            'razorpay_signature': self.signer.payment_signature(order_id, payment['id']),
+        }
+
+    def list_payments(self, query):
+        since = int(query.get('from', 0))
+        until = int(query.get('to', 2 ** 40))
+        count = min(int(query.get('count', 10)), 100)
+        skip = int(query.get('skip', 0))
+        with self.lock:
+            items = sorted(
+                (p for p in self.payments.values() if since <= p['created_at'] <= until),
+                key=lambda p: p['created_at'], reverse=True,
+            )[skip:skip + count]
+        return {'entity': 'collection', 'count': len(items), 'items': items}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    gateway = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _error(self, status, description):
+        self._send(status, {'error': {'code': 'BAD_REQUEST_ERROR', 'description': description}})
+
+    def _prepare(self):
+        gateway = self.gateway
+        if gateway.latency:
+            time.sleep(gateway.latency)
+        if gateway.should_fail():
+            self._error(503, "Simulated gateway failure")
+            return False
+        expected = 'Basic ' + base64.b64encode(f'{gateway.key_id}:{gateway.key_secret}'.encode()).decode()
+        if self.headers.get('Authorization') != expected:
+            self._error(401, "The api key provided is invalid")
+            return False
+        return True
+
+    def do_POST(self):
+        if not self._prepare():
+            return
+        if urlparse(self.path).path.rstrip('/') != '/v1/orders':
+            return self._error(404, "The requested URL was not found on the server.")
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            data = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            return self._error(400, "Invalid JSON")
+        if int(data.get('amount') or 0) < 100:
+            return self._error(400, "Order amount less than minimum amount allowed")
+        self._send(200, self.gateway.create_order(data))
+
+    def do_GET(self):
+        if not self._prepare():
+            return
+        url = urlparse(self.path)
+        parts = url.path.strip('/').split('/')
+        if parts[:2] == ['v1', 'payments'] and len(parts) == 2:
+            query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+            return self._send(200, self.gateway.list_payments(query))
+        if len(parts) == 3 and parts[0] == 'v1' and parts[1] in ('orders', 'payments'):
+            store = self.gateway.orders if parts[1] == 'orders' else self.gateway.payments
+            with self.gateway.lock:
+                entity = store.get(parts[2])
+            if entity is None:
+                return self._error(400, "The id provided does not exist")
+            return self._send(200, entity)
+        self._error(404, "The requested URL was not found on the server.")
+
+
+class FakeGatewayServer:
+    """
+    Serves a FakeGateway over HTTP on a background thread:
+
+        with FakeGatewayServer() as server:
+            gateway = RazorpayGateway(server.gateway.key_id, server.gateway.key_secret, server.url)
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, **options):
+        self.gateway = FakeGateway(**options)
+        handler = type('Handler', (_Handler,), {'gateway': self.gateway})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}/v1'
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name='fake-gateway', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
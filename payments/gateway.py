@@ -0,0 +1,194 @@
+# payments/gateway.py
+import hashlib
+import hmac
+import logging
+import threading
+import time
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+
+class GatewayError(Exception):
+    """The gateway refused or failed a request."""
+
+    def __init__(self, message, status=None, payload=None):
+        super().__init__(message)
+        self.status = status
+        self.payload = payload or {}
+
+
+class GatewayUnavailable(GatewayError):
+    """The gateway cannot be reached right now (timeouts, 5xx, or the circuit is open)."""
+
+
+class SignatureError(GatewayError):
+    """A payment or webhook signature does not match."""
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and rejects calls
+    for `reset_timeout` seconds, so a gateway outage costs one fast error
+    per request instead of a full timeout. After that one trial call is let
+    through: success closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self.lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half-open'
+        return 'open'
+
+    def before_call(self):
+        with self.lock:
+            state = self.state
+            if state == 'open' or (state == 'half-open' and self.trial_running):
+                raise GatewayUnavailable("Payment gateway circuit is open")
+            if state == 'half-open':
+                self.trial_running = True
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_running = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.trial_running = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                if self.opened_at is None:
+                    logger.error("Payment gateway circuit opened after %s failures", self.failures)
+                self.opened_at = time.monotonic()
+
+
+class RazorpayGateway:
+    """
+    Razorpay REST client over one pooled requests.Session.
+
+    Every call has a connect and a read timeout. Idempotent reads are
+    retried on connection errors, 429 and 5xx with backoff. Creates are
+    only retried when the connection could not be opened, so a request
+    the gateway may have processed is never sent twice. All calls go
+    through a circuit breaker.
+    """
+
+    def __init__(self, key_id, key_secret, base_url='https://api.razorpay.com/v1',
+                 connect_timeout=3.05, read_timeout=10.0, max_retries=2, pool_size=10, breaker=None):
+        self.key_id = key_id
+        self.key_secret = key_secret
+        self.base_url = base_url.rstrip('/')
+        self.timeout = (connect_timeout, read_timeout)
+        self.breaker = breaker or CircuitBreaker()
+
+        retry = Retry(
+            total=max_retries,
+            connect=max_retries,
+            read=max_retries,
+            status=max_retries,
+            backoff_factor=0.3,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset({'GET'}),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.auth = (key_id, key_secret)
+        self.session.headers['Content-Type'] = 'application/json'
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def _request(self, method, path, params=None, json=None):
+        self.breaker.before_call()
+        try:
+            response = self.session.request(
+                method, f'{self.base_url}{path}', params=params, json=json, timeout=self.timeout,
+            )
+        except requests.RequestException as e:
+            self.breaker.record_failure()
+            raise GatewayUnavailable(f"Payment gateway request failed: {e}") from e
+
+        if response.status_code >= 500 or response.status_code == 429:
+            self.breaker.record_failure()
+            raise GatewayUnavailable(f"Payment gateway answered {response.status_code}", response.status_code)
+        # A 4xx is our request's fault, not the gateway's: the circuit stays closed
+        self.breaker.record_success()
+        try:
+            payload = response.json()
+        except ValueError:
+            payload = {}
+        if response.status_code >= 400:
+            error = payload.get('error', {}) if isinstance(payload, dict) else {}
+            raise GatewayError(error.get('description') or f"Payment gateway answered {response.status_code}",
+                               response.status_code, payload)
+        return payload
+
+    def create_order(self, amount, currency='INR', receipt=None, notes=None):
+        """Create a gateway order for `amount` in paise."""
+        data = {'amount': amount, 'currency': currency, 'payment_capture': 1}
+        if receipt:
+            data['receipt'] = receipt
+        if notes:
+            data['notes'] = notes
+        return self._request('POST', '/orders', json=data)
+
+    def fetch_order(self, order_id):
+        return self._request('GET', f'/orders/{order_id}')
+
+    def fetch_payment(self, payment_id):
+        return self._request('GET', f'/payments/{payment_id}')
+
+    def list_payments(self, since=None, until=None, count=100, skip=0):
+        """One page of payments created between two UNIX timestamps, newest first."""
+        params = {'count': count, 'skip': skip}
+        if since is not None:
+            params['from'] = int(since)
+        if until is not None:
+            params['to'] = int(until)
+        return self._request('GET', '/payments', params=params)
+
+    def payment_signature(self, order_id, payment_id):
+        message = f'{order_id}|{payment_id}'.encode('utf-8')
+        return hmac.new(self.key_secret.encode('utf-8'), message, hashlib.sha256).hexdigest()
+
+    def verify_payment_signature(self, order_id, payment_id, signature):
+        if not hmac.compare_digest(self.payment_signature(order_id, payment_id), signature or ''):
+            raise SignatureError("Payment signature mismatch")
+
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def get_gateway():
+    """The process-wide gateway client, built from settings on first use."""
+    global _gateway
+    with _gateway_lock:
+        if _gateway is None:
+            _gateway = RazorpayGateway(
+                settings.RAZORPAY_KEY_ID,
+                settings.RAZORPAY_KEY_SECRET,
+                base_url=settings.RAZORPAY_API_URL,
+                connect_timeout=settings.RAZORPAY_CONNECT_TIMEOUT,
+                read_timeout=settings.RAZORPAY_READ_TIMEOUT,
+                max_retries=settings.RAZORPAY_MAX_RETRIES,
+                pool_size=settings.RAZORPAY_POOL_SIZE,
+                breaker=CircuitBreaker(settings.RAZORPAY_BREAKER_THRESHOLD, settings.RAZORPAY_BREAKER_RESET),
+            )
+    return _gateway
@@ -0,0 +1,223 @@
+# payments/invoices.py
+import logging
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to a per-process lock
+    fcntl = None
+
+from django.conf import settings
+from django.db import close_old_connections
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.lib.units import inch
+from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+from orders.documents import document_orders
+
+logger = logging.getLogger(__name__)
+
+INVOICE_DIR = 'invoices'
+
+
+def invoice_filename(order_number):
+    return f'invoice_{order_number}.pdf'
+
+
+def invoice_path(order_number):
+    return os.path.join(settings.MEDIA_ROOT, INVOICE_DIR, invoice_filename(order_number))
+
+
+@lru_cache(maxsize=None)
+def invoice_styles():
+    """
+    Paragraph and table styles of the invoice, built once per process.
+    Building the sample stylesheet is a large part of rendering a small
+    invoice, and the styles are never mutated, so every render shares them.
+    """
+    styles = getSampleStyleSheet()
+    return {
+        'title': ParagraphStyle(
+            'Title',
+            parent=styles['Heading1'],
+            fontSize=24,
+            textColor=colors.HexColor("#2c3e50"),
+            alignment=1,  # center
+        ),
+        'heading': styles['Heading3'],
+        'normal': styles['Normal'],
+        'order_table': TableStyle([
+            ('BACKGROUND', (0, 0), (0, -1), colors.HexColor("#ecf0f1")),
+            ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+            ('FONTSIZE', (0, 0), (-1, -1), 12),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 12),
+            ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ]),
+        'items_table': TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor("#3498db")),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+            ('FONTSIZE', (0, 0), (-1, 0), 12),
+            ('FONTSIZE', (0, 1), (-1, -1), 10),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+            ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ]),
+        'totals_table': TableStyle([
+            ('ALIGN', (0, 0), (-1, -1), 'RIGHT'),
+            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+            ('FONTSIZE', (0, 0), (-1, -1), 12),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 12),
+            ('LINEBELOW', (0, -1), (-1, -1), 2, colors.black),
+        ]),
+    }
+
+
+def invoice_orders():
+    """Orders with everything an invoice prints, in a fixed number of queries for any batch."""
+    return document_orders()
+
+
+def _order_items(order):
+    if 'items' in getattr(order, '_prefetched_objects_cache', {}):
+        return list(order.items.all())
+    return list(order.items.select_related('variant__cake').order_by('id'))
+
+
+def build_story(order, items):
+    styles = invoice_styles()
+    story = [Paragraph("CAKE SHOP INVOICE", styles['title']), Spacer(1, 20)]
+
+    order_table = Table([
+        ['Invoice Number:', order.order_number],
+        ['Order Date:', order.created_at.strftime('%B %d, %Y')],
+        ['Payment Method:', order.get_payment_method_display()],
+        ['Status:', order.get_status_display()],
+    ], colWidths=[2 * inch, 3 * inch])
+    order_table.setStyle(styles['order_table'])
+    story += [order_table, Spacer(1, 20)]
+
+    story.append(Paragraph("<b>Billing Address:</b>", styles['heading']))
+    address = order.shipping_address
+    if address:
+        addr_lines = [address.name or '', address.address_line_1 or '']
+        if address.address_line_2:
+            addr_lines.append(address.address_line_2)
+        addr_lines.append(f"{address.city or ''}, {address.state or ''} - {address.pincode or ''}")
+        addr_lines.append(f"Phone: {address.phone or ''}")
+        story += [Paragraph(line, styles['normal']) for line in addr_lines if line.strip()]
+    story.append(Spacer(1, 20))
+
+    story.append(Paragraph("<b>Ordered Items:</b>", styles['heading']))
+    items_data = [['Item', 'Weight', 'Quantity', 'Price', 'Total']]
+    for item in items:
+        items_data.append([
+            item.variant.cake.title,
+            f"{item.variant.weight} kg",
+            str(item.quantity),
+            f"Rs {item.price:.2f}",
+            f"Rs {item.get_total_price():.2f}",
+        ])
+    items_table = Table(items_data, colWidths=[2.5 * inch, inch, inch, inch, inch])
+    items_table.setStyle(styles['items_table'])
+    story += [items_table, Spacer(1, 30)]
+
+    totals_data = [
+        ['Subtotal:', f"Rs {order.subtotal:.2f}"],
+        ['Delivery Charge:', f"Rs {order.delivery_charge:.2f}"],
+    ]
+    if order.coupon_discount > 0:
+        totals_data.append(['Coupon Discount:', f"- Rs {order.coupon_discount:.2f}"])
+    totals_data.append(['Total:', f"Rs {order.total_amount:.2f}"])
+    totals_table = Table(totals_data, colWidths=[4 * inch, 2 * inch])
+    totals_table.setStyle(styles['totals_table'])
+    story.append(totals_table)
+
+    story.append(Paragraph("Thank you for shopping with Cake Shop!", styles['normal']))
+    return story
+
+
+def render_invoice(order, path=None):
+    """
+    Write the invoice PDF of `order` and return its path. The file is built
+    next to its final name and renamed into place, so a reader never sees
+    a half-written invoice.
+    """
+    path = path or invoice_path(order.order_number)
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.invoice-', suffix='.pdf')
+    try:
+        with os.fdopen(fd, 'wb') as tmp:
+            SimpleDocTemplate(tmp, pagesize=A4).build(build_story(order, _order_items(order)))
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return path
+
+
+def render_invoice_batch(order_ids):
+    """
+    Render the invoices of `order_ids` with one bulk load. Runs in the
+    render_invoices process pool; returns (rendered, [(order id, error)]).
+    """
+    close_old_connections()
+    rendered, failures = 0, []
+    try:
+        for order in invoice_orders().filter(pk__in=order_ids):
+            try:
+                render_invoice(order)
+                rendered += 1
+            except Exception as e:
+                logger.exception("Failed to render invoice of order %s", order.order_number)
+                failures.append((order.pk, str(e)))
+    finally:
+        close_old_connections()
+    return rendered, failures
+
+
+_render_lock = threading.Lock()
+
+
+@contextmanager
+def _invoice_lock(path):
+    """Exclusive lock on `path` shared by every process on this host."""
+    if fcntl is None:
+        with _render_lock:
+            yield
+        return
+    lock_path = os.path.join(os.path.dirname(path), '.' + os.path.basename(path) + '.lock')
+    with open(lock_path, 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def ensure_invoice(order):
+    """
+    Path of the invoice PDF of `order`, rendering it first if it is missing.
+    Concurrent requests for the same missing invoice wait on one lock and
+    the first renders it; the others find the file when they get the lock.
+    """
+    path = invoice_path(order.order_number)
+    if os.path.exists(path):
+        return path
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with _invoice_lock(path):
+        if not os.path.exists(path):
+            logger.info("Rendering missing invoice of order %s", order.order_number)
+            render_invoice(invoice_orders().get(pk=order.pk), path)
+    return path
@@ -0,0 +1,73 @@
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from orders.models import Order
+from payments.gateway import GatewayError, get_gateway
+from payments.reconciliation import FIXABLE, PAGE_SIZE, apply_fixes, fetch_payments, find_mismatches
+
+
+def _parse_since(value):
+    try:
+        since = datetime.fromisoformat(value)
+    except ValueError:
+        raise CommandError("--since must be YYYY-MM-DD or an ISO date and time")
+    return timezone.make_aware(since) if timezone.is_naive(since) else since
+
+
+class Command(BaseCommand):
+    help = "Check orders against the payments captured by Razorpay and fix or report the differences"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help="Start of the window, YYYY-MM-DD or ISO date and time "
+                                            "(default: 24 hours ago)")
+        parser.add_argument('--fix', action='store_true',
+                            help="Mark captured orders paid and fill in missing payment ids")
+        parser.add_argument('--workers', type=int, default=settings.RAZORPAY_POOL_SIZE,
+                            help="Payment pages fetched concurrently")
+        parser.add_argument('--page-size', type=int, default=PAGE_SIZE)
+
+    def handle(self, *args, **options):
+        until = timezone.now()
+        since = _parse_since(options['since']) if options['since'] else until - timedelta(days=1)
+        if since >= until:
+            raise CommandError("--since must be in the past")
+        # Never more threads than pooled connections, or they queue on the pool anyway
+        workers = max(1, min(options['workers'], settings.RAZORPAY_POOL_SIZE))
+        page_size = max(1, min(options['page_size'], PAGE_SIZE))
+
+        started = time.monotonic()
+        try:
+            payments = fetch_payments(get_gateway(), since.timestamp(), until.timestamp(), workers, page_size)
+        except GatewayError as e:
+            raise CommandError(f"Could not list payments: {e}")
+        self.stdout.write(f"Fetched {len(payments)} payments since {since:%Y-%m-%d %H:%M} "
+                          f"in {time.monotonic() - started:.1f}s")
+
+        expected_paid = Order.objects.filter(
+            payment_method='razorpay', is_paid=True, created_at__gte=since, created_at__lt=until,
+        )
+        mismatches = find_mismatches(payments, expected_paid)
+        if not mismatches:
+            self.stdout.write(self.style.SUCCESS("All payments reconcile"))
+            return
+
+        if options['fix']:
+            remaining = apply_fixes(mismatches)
+            fixed = len(mismatches) - len(remaining)
+            self.stdout.write(self.style.SUCCESS(f"Fixed {fixed} of {len(mismatches)} mismatches"))
+        else:
+            remaining = mismatches
+            fixable = sum(1 for m in mismatches if m.kind in FIXABLE)
+            if fixable:
+                self.stdout.write(f"{fixable} mismatches can be fixed with --fix")
+
+        for m in sorted(remaining, key=lambda m: (m.kind, m.order_number)):
+            self.stdout.write(str(m))
+        counts = ', '.join(f"{kind}: {count}" for kind, count in sorted(Counter(m.kind for m in remaining).items()))
+        if remaining:
+            self.stdout.write(self.style.WARNING(f"{len(remaining)} mismatches ({counts})"))
@@ -0,0 +1,79 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from orders.models import Order
+from payments.invoices import invoice_path, render_invoice_batch
+
+
+def _init_worker():
+    # Under the spawn start method the child starts with a bare interpreter
+    import django
+    django.setup()
+
+
+class Command(BaseCommand):
+    help = "Render invoice PDFs in bulk on a process pool (backfills, re-issues, month-end batches)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--order', action='append', dest='orders', default=[],
+                            help="Order number to render; repeat for several")
+        parser.add_argument('--since', help="Only orders created on or after this date (YYYY-MM-DD)")
+        parser.add_argument('--until', help="Only orders created before this date (YYYY-MM-DD)")
+        parser.add_argument('--include-unpaid', action='store_true', help="Also render unpaid orders")
+        parser.add_argument('--missing', action='store_true', help="Skip orders that already have a PDF")
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--chunk-size', type=int, default=50, help="Orders loaded and rendered per task")
+
+    def handle(self, *args, **options):
+        orders = Order.objects.all()
+        if options['orders']:
+            orders = orders.filter(order_number__in=options['orders'])
+        if not options['include_unpaid']:
+            orders = orders.filter(is_paid=True)
+        for option, lookup in (('since', 'created_at__date__gte'), ('until', 'created_at__date__lt')):
+            if options[option]:
+                try:
+                    orders = orders.filter(**{lookup: datetime.strptime(options[option], '%Y-%m-%d').date()})
+                except ValueError:
+                    raise CommandError(f"--{option} must be YYYY-MM-DD")
+
+        rows = orders.order_by('id').values_list('id', 'order_number')
+        ids = [
+            order_id for order_id, order_number in rows.iterator(chunk_size=5000)
+            if not (options['missing'] and os.path.exists(invoice_path(order_number)))
+        ]
+        if not ids:
+            self.stdout.write("No invoices to render")
+            return
+
+        chunk_size = max(1, options['chunk_size'])
+        chunks = [ids[i:i + chunk_size] for i in range(0, len(ids), chunk_size)]
+        workers = max(1, min(options['workers'], len(chunks)))
+        self.stdout.write(f"Rendering {len(ids)} invoices in {len(chunks)} batches on {workers} processes")
+
+        # Forked children must not share the parent's database socket
+        connections.close_all()
+        started = time.monotonic()
+        rendered, failures = 0, []
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            futures = [pool.submit(render_invoice_batch, chunk) for chunk in chunks]
+            for done, future in enumerate(as_completed(futures), start=1):
+                batch_rendered, batch_failures = future.result()
+                rendered += batch_rendered
+                failures += batch_failures
+                if done % 10 == 0 or done == len(futures):
+                    elapsed = time.monotonic() - started
+                    self.stdout.write(f"  {rendered}/{len(ids)} rendered, {rendered / elapsed:.1f} invoices/s")
+
+        elapsed = time.monotonic() - started
+        for order_id, error in failures[:20]:
+            self.stderr.write(f"order {order_id}: {error}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Rendered {rendered} invoices in {elapsed:.1f}s ({rendered / elapsed:.1f} invoices/s), "
+            f"{len(failures)} failed"
+        ))
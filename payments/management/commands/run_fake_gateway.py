@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from payments.fake_gateway import FakeGatewayServer
+
+
+class Command(BaseCommand):
+    help = "Serve an in-memory fake Razorpay API for offline payment flow and load testing"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--key-id', default='rzp_test_fake')
+        parser.add_argument('--key-secret', default='fake_secret')
+        parser.add_argument('--latency', type=float, default=0.0, help="Seconds added to every request")
+        parser.add_argument('--failure-rate', type=float, default=0.0, help="Share of requests answered 503")
+
+    def handle(self, *args, **options):
+        server = FakeGatewayServer(
+            options['host'], options['port'],
+            key_id=options['key_id'], key_secret=options['key_secret'],
+            latency=options['latency'], failure_rate=options['failure_rate'],
+        ).start()
+        self.stdout.write(self.style.SUCCESS(f"Fake gateway listening on {server.url}"))
+        self.stdout.write(
+            f"Run the shop with RAZORPAY_API_URL={server.url} RAZORPAY_KEY_ID={options['key_id']} "
+            f"RAZORPAY_KEY_SECRET={options['key_secret']}"
+        )
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            server.stop()
@@ -1,3 +1,25 @@
 from django.db import models
 
-# Create your models here.
+
+class WebhookEvent(models.Model):
+    """
+    A gateway webhook delivery exactly as received. Rows are never edited
+    apart from the processing bookkeeping; a redelivered event id is
+    dropped on insert.
+    """
+    event_id = models.CharField(max_length=100, unique=True)
+    event = models.CharField(max_length=100)
+    body = models.TextField()
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            # Pending events are read as processed_at IS NULL ORDER BY id
+            models.Index(fields=['processed_at', 'id'], name='payments_webhook_pending'),
+        ]
+
+    def __str__(self):
+        return f"{self.event} {self.event_id}"
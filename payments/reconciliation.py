@@ -0,0 +1,157 @@
+# payments/reconciliation.py
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+from django.db import transaction
+
+from orders.idempotency import IdempotencyConflict, run_once
+from orders.models import Order
+from .services import capture_payment
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 100  # the most the payments API returns per page
+MATCH_CHUNK = 1000
+
+# Mismatch kinds: the first two are fixed by apply_fixes, the rest need a person
+UNPAID = 'unpaid'                  # captured at the gateway, order not marked paid
+MISSING_PAYMENT_ID = 'payment_id'  # paid order without the captured payment's id
+WRONG_AMOUNT = 'amount'            # captured amount differs from the order total
+DUPLICATE = 'duplicate'            # more than one captured payment for the order
+CANCELLED = 'cancelled'            # captured payment for a cancelled order not yet flagged refund_due
+UNKNOWN_ORDER = 'unknown'          # captured payment for a gateway order we have no record of
+NOT_CAPTURED = 'not_captured'      # order marked paid, no captured payment found
+FIXABLE = (UNPAID, MISSING_PAYMENT_ID)
+
+
+@dataclass
+class Mismatch:
+    kind: str
+    razorpay_order_id: str
+    payment_id: str = ''
+    order_id: int = None
+    order_number: str = ''
+    detail: str = ''
+
+    def __str__(self):
+        order = self.order_number or self.razorpay_order_id
+        return f"{self.kind:<13} {order:<22} {self.payment_id:<20} {self.detail}".rstrip()
+
+
+def fetch_payments(gateway, since, until, workers=4, page_size=PAGE_SIZE):
+    """
+    Every payment created in [since, until] (UNIX timestamps), fetched
+    `workers` pages at a time. The window is fixed up front so payments
+    made during the run cannot shift the skip offsets. Returns
+    {payment_id: payment}, which also drops any row seen on two pages.
+    """
+    payments = {}
+    skip = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while True:
+            offsets = [skip + i * page_size for i in range(workers)]
+            pages = list(pool.map(
+                lambda offset: gateway.list_payments(since, until, count=page_size, skip=offset)['items'],
+                offsets,
+            ))
+            for items in pages:
+                for payment in items:
+                    payments[payment['id']] = payment
+            if any(len(items) < page_size for items in pages):
+                return payments
+            skip += workers * page_size
+
+
+def _paise(amount):
+    return int(amount * 100)
+
+
+def find_mismatches(payments, orders):
+    """
+    Compare captured payments with local orders. `orders` is the queryset of
+    orders expected to be paid in the window; they are also checked for a
+    captured payment. Orders are loaded by razorpay_order_id in chunks.
+    """
+    captured = {}
+    for payment in payments.values():
+        if payment.get('status') == 'captured' and payment.get('order_id'):
+            captured.setdefault(payment['order_id'], []).append(payment)
+
+    fields = ('id', 'order_number', 'razorpay_order_id', 'razorpay_payment_id', 'is_paid', 'status', 'total_amount',
+              'refund_due')
+    gateway_ids = list(captured)
+    known = {}
+    for i in range(0, len(gateway_ids), MATCH_CHUNK):
+        for row in Order.objects.filter(razorpay_order_id__in=gateway_ids[i:i + MATCH_CHUNK]).values(*fields):
+            known[row['razorpay_order_id']] = row
+
+    mismatches = []
+    for gateway_order_id, captures in captured.items():
+        order = known.get(gateway_order_id)
+        payment = captures[0]
+        if order is None:
+            mismatches.append(Mismatch(UNKNOWN_ORDER, gateway_order_id, payment['id'],
+                                       detail=f"{payment.get('amount')} paise"))
+            continue
+        found = dict(razorpay_order_id=gateway_order_id, order_id=order['id'], order_number=order['order_number'])
+        if len(captures) > 1:
+            ids = ', '.join(p['id'] for p in captures)
+            mismatches.append(Mismatch(DUPLICATE, payment_id=payment['id'], detail=f"payments {ids}", **found))
+            continue
+        if payment.get('amount') != _paise(order['total_amount']):
+            mismatches.append(Mismatch(WRONG_AMOUNT, payment_id=payment['id'], **found,
+                                       detail=f"captured {payment.get('amount')}, "
+                                              f"expected {_paise(order['total_amount'])} paise"))
+        elif order['status'] == 'cancelled' and not order['is_paid']:
+            # Already flagged by the capture itself: the refund is on record
+            if not order['refund_due']:
+                mismatches.append(Mismatch(CANCELLED, payment_id=payment['id'], detail="refund due", **found))
+        elif not order['is_paid']:
+            mismatches.append(Mismatch(UNPAID, payment_id=payment['id'], **found))
+        elif order['razorpay_payment_id'] != payment['id']:
+            kind = MISSING_PAYMENT_ID if not order['razorpay_payment_id'] else DUPLICATE
+            mismatches.append(Mismatch(kind, payment_id=payment['id'], **found,
+                                       detail=f"order has {order['razorpay_payment_id'] or 'no payment id'}"))
+
+    # Streamed in chunks and checked against the captured ids here, rather
+    # than sending every captured id to the database in one NOT IN list
+    for row in orders.order_by('id').values(*fields).iterator(chunk_size=MATCH_CHUNK):
+        if row['razorpay_order_id'] not in captured:
+            mismatches.append(Mismatch(NOT_CAPTURED, row['razorpay_order_id'], row['razorpay_payment_id'],
+                                       row['id'], row['order_number']))
+    return mismatches
+
+
+def apply_fixes(mismatches):
+    """
+    Fix what can be fixed: missing payment ids in one bulk_update, unpaid
+    orders through capture_payment under the same idempotency key as the
+    payment callback and the webhook. Returns the mismatches left over.
+    """
+    backfill = [m for m in mismatches if m.kind == MISSING_PAYMENT_ID]
+    with transaction.atomic():
+        Order.objects.bulk_update(
+            [Order(pk=m.order_id, razorpay_payment_id=m.payment_id) for m in backfill],
+            ['razorpay_payment_id'], batch_size=MATCH_CHUNK,
+        )
+
+    remaining = [m for m in mismatches if m.kind not in FIXABLE]
+    for m in (m for m in mismatches if m.kind == UNPAID):
+        try:
+            result, _ = run_once(
+                'payment_success', m.payment_id, lambda: capture_payment(m.razorpay_order_id, m.payment_id),
+            )
+        except IdempotencyConflict:
+            m.detail = "capture in progress elsewhere"
+            remaining.append(m)
+            continue
+        except Exception as e:
+            logger.exception("Reconciliation could not capture order %s", m.order_number)
+            m.detail = f"fix failed: {e}"
+            remaining.append(m)
+            continue
+        if result.get('status') != "Payment successful":
+            m.detail = result.get('status', '')
+            remaining.append(m)
+    return remaining
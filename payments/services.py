@@ -0,0 +1,56 @@
+# payments/services.py
+import logging
+
+from orders.inventory import InsufficientStock, commit_order_stock
+from orders.models import Order
+from .tasks import generate_invoice
+
+logger = logging.getLogger(__name__)
+
+
+def capture_payment(razorpay_order_id, payment_id, signature=''):
+    """
+    Mark the order paid, take its stock and queue the confirmation. Shared
+    by the browser callback and the webhook, which both run it under the
+    payment id's idempotency key. A payment for an order cancelled in the
+    meantime is recorded and flagged for refund instead of reviving the
+    order. Returns the JSON answer for the callback.
+    """
+    order = Order.objects.select_for_update().get(razorpay_order_id=razorpay_order_id)
+    if order.is_paid:
+        return {"status": "Payment successful"}
+    if order.status == 'cancelled':
+        # The buyer cancelled before the payment landed: its stock and coupon
+        # are already released, so keep it cancelled and flag the refund
+        logger.error(f"Payment {payment_id} captured for cancelled order {order.order_number}; refund due")
+        order.razorpay_payment_id = payment_id
+        if signature:
+            order.razorpay_signature = signature
+        order.refund_due = True
+        order.save(update_fields=["razorpay_payment_id", "razorpay_signature", "refund_due", "updated_at"])
+        return {"status": "Order was cancelled, the payment will be refunded"}
+    order.razorpay_payment_id = payment_id
+    if signature:
+        order.razorpay_signature = signature
+    order.is_paid = True
+
+    try:
+        commit_order_stock(order)
+        order.status = "confirmed"
+    except InsufficientStock as e:
+        # The payment is captured but the order cannot be fulfilled as is:
+        # keep it unconfirmed for the seller to resolve or refund
+        logger.error(f"Paid order {order.order_number} is short of stock: {e}")
+        order.save(update_fields=["razorpay_payment_id", "razorpay_signature", "is_paid", "updated_at"])
+        return {
+            "status": "Payment received but some items are out of stock",
+            "shortfalls": [
+                {"variant_id": s.variant_id, "requested": s.requested, "available": s.available}
+                for s in e.shortfalls
+            ],
+        }
+    order.save()
+    # Written in the capture's transaction: the worker picks it up once the
+    # payment is recorded, and the callback does not wait for SMTP or ReportLab
+    generate_invoice.enqueue(order_id=order.id)
+    return {"status": "Payment successful"}
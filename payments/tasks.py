@@ -0,0 +1,36 @@
+# payments/tasks.py
+from jobs.queue import task
+from orders.documents import load_order_document
+
+
+def _confirm_without_invoice(payload, error):
+    # The buyer still gets the confirmation, just without the PDF attached
+    send_order_confirmation.enqueue(order_id=payload['order_id'])
+
+
+@task(name='payments.generate_invoice', on_dead=_confirm_without_invoice)
+def generate_invoice(order_id):
+    """Render the invoice PDF, then queue the confirmation email that attaches it."""
+    from .invoices import render_invoice
+
+    render_invoice(load_order_document(order_id))
+    send_order_confirmation.enqueue(order_id=order_id)
+
+
+@task(name='payments.send_order_confirmation')
+def send_order_confirmation(order_id):
+    from .utils import send_order_confirmation_email
+
+    order = load_order_document(order_id)
+    if not send_order_confirmation_email(order):
+        raise RuntimeError(f"Order confirmation email for {order.order_number} was not sent")
+
+
+@task(name='payments.process_webhook_events')
+def process_webhook_events():
+    from .webhooks import process_pending_events
+
+    processed, failed = process_pending_events()
+    if failed:
+        # Retry the run with backoff; the failed events are still pending
+        raise RuntimeError(f"{failed} webhook events failed ({processed} processed)")
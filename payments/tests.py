@@ -1,3 +1,456 @@
-from django.test import TestCase
+import hashlib
+import hmac
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from orders.inventory import release_order_stock, reserve_order_stock
+from orders.models import IdempotencyKey, Order
+from orders.tests import ShopFixtures
+from .fake_gateway import FakeGatewayServer
+from .gateway import CircuitBreaker, GatewayError, GatewayUnavailable, RazorpayGateway, SignatureError
+from .invoices import ensure_invoice, invoice_path, render_invoice_batch
+from .models import WebhookEvent
+from .reconciliation import (
+    CANCELLED, DUPLICATE, MISSING_PAYMENT_ID, NOT_CAPTURED, UNKNOWN_ORDER, UNPAID, WRONG_AMOUNT,
+    apply_fixes, find_mismatches,
+)
+from .webhooks import MAX_ATTEMPTS, process_pending_events
+
+
+class GatewayTestMixin:
+    """A RazorpayGateway pointed at a fake gateway served on a local port."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = FakeGatewayServer().start()
+        cls.addClassCleanup(cls.server.stop)
+
+    def setUp(self):
+        self.fake = self.server.gateway
+        self.fake.fail_next(0)
+        self.fake.latency = 0.0
+
+    def gateway_client(self, **options):
+        options.setdefault('max_retries', 0)
+        return RazorpayGateway(self.fake.key_id, self.fake.key_secret, self.server.url, **options)
+
+    def requests_during(self, call, *args):
+        before = self.fake.requests
+        try:
+            return call(*args)
+        finally:
+            self.served = self.fake.requests - before
+
+
+class RazorpayGatewayTests(GatewayTestMixin, SimpleTestCase):
+    def test_create_and_fetch_order(self):
+        gateway = self.gateway_client()
+        order = gateway.create_order(50000, receipt='CO1234')
+        self.assertEqual(gateway.fetch_order(order['id'])['amount'], 50000)
+
+    def test_read_retried_on_5xx(self):
+        gateway = self.gateway_client(max_retries=2)
+        order = gateway.create_order(50000)
+        self.fake.fail_next(2)
+        self.assertEqual(self.requests_during(gateway.fetch_order, order['id'])['id'], order['id'])
+        self.assertEqual(self.served, 3)
+
+    def test_read_gives_up_after_max_retries(self):
+        gateway = self.gateway_client(max_retries=1)
+        self.fake.fail_next(5)
+        with self.assertRaises(GatewayUnavailable):
+            self.requests_during(gateway.fetch_order, 'order_missing')
+        self.assertEqual(self.served, 2)
+
+    def test_create_not_retried_on_5xx(self):
+        gateway = self.gateway_client(max_retries=2)
+        self.fake.fail_next(1)
+        with self.assertRaises(GatewayUnavailable):
+            self.requests_during(gateway.create_order, 50000)
+        self.assertEqual(self.served, 1)
+
+    def test_read_timeout(self):
+        gateway = self.gateway_client(read_timeout=0.1)
+        self.fake.latency = 0.5
+        with self.assertRaises(GatewayUnavailable):
+            gateway.fetch_order('order_missing')
+
+    def test_client_errors_are_not_outages(self):
+        gateway = self.gateway_client(breaker=CircuitBreaker(failure_threshold=1))
+        with self.assertRaises(GatewayError) as raised:
+            gateway.fetch_order('order_missing')
+        self.assertNotIsInstance(raised.exception, GatewayUnavailable)
+        self.assertEqual(raised.exception.status, 400)
+        self.assertEqual(gateway.breaker.state, 'closed')
+
+    def test_bad_credentials(self):
+        gateway = RazorpayGateway(self.fake.key_id, 'wrong', self.server.url, max_retries=0)
+        with self.assertRaises(GatewayError) as raised:
+            gateway.create_order(50000)
+        self.assertEqual(raised.exception.status, 401)
+
+    def test_list_payments_pages(self):
+        gateway = self.gateway_client()
+        order = gateway.create_order(50000)
+        paid = {self.fake.capture(order['id'])['razorpay_payment_id'] for _ in range(3)}
+        first = {payment['id'] for payment in gateway.list_payments(count=2)['items']}
+        second = {payment['id'] for payment in gateway.list_payments(count=2, skip=2)['items']}
+        everything = {payment['id'] for payment in gateway.list_payments(count=100)['items']}
+        self.assertEqual(len(first), 2)
+        self.assertFalse(first & second)
+        self.assertLessEqual(paid, everything)
+
+
+@override_settings(RAZORPAY_BREAKER_THRESHOLD=3, RAZORPAY_BREAKER_RESET=0.2)
+class CircuitBreakerTests(GatewayTestMixin, SimpleTestCase):
+    def breaker(self):
+        return CircuitBreaker(settings.RAZORPAY_BREAKER_THRESHOLD, settings.RAZORPAY_BREAKER_RESET)
+
+    def test_opens_after_threshold_failures(self):
+        gateway = self.gateway_client(breaker=self.breaker())
+        self.fake.fail_next(100)
+        for _ in range(settings.RAZORPAY_BREAKER_THRESHOLD):
+            with self.assertRaises(GatewayUnavailable):
+                gateway.fetch_order('order_missing')
+        self.assertEqual(gateway.breaker.state, 'open')
+
+        # Open: rejected without a request reaching the gateway
+        with self.assertRaises(GatewayUnavailable):
+            self.requests_during(gateway.fetch_order, 'order_missing')
+        self.assertEqual(self.served, 0)
+
+    def test_trial_call_closes_circuit(self):
+        gateway = self.gateway_client(breaker=self.breaker())
+        order = gateway.create_order(50000)
+        self.fake.fail_next(settings.RAZORPAY_BREAKER_THRESHOLD)
+        for _ in range(settings.RAZORPAY_BREAKER_THRESHOLD):
+            with self.assertRaises(GatewayUnavailable):
+                gateway.fetch_order(order['id'])
+
+        time.sleep(settings.RAZORPAY_BREAKER_RESET)
+        self.assertEqual(gateway.breaker.state, 'half-open')
+        self.assertEqual(gateway.fetch_order(order['id'])['id'], order['id'])
+        self.assertEqual(gateway.breaker.state, 'closed')
+
+    def test_failed_trial_reopens_circuit(self):
+        gateway = self.gateway_client(breaker=self.breaker())
+        self.fake.fail_next(100)
+        for _ in range(settings.RAZORPAY_BREAKER_THRESHOLD):
+            with self.assertRaises(GatewayUnavailable):
+                gateway.fetch_order('order_missing')
+
+        time.sleep(settings.RAZORPAY_BREAKER_RESET)
+        with self.assertRaises(GatewayUnavailable):
+            gateway.fetch_order('order_missing')
+        self.assertEqual(gateway.breaker.state, 'open')
+
+
+class PaymentSignatureTests(GatewayTestMixin, SimpleTestCase):
+    def test_signature_from_checkout_verifies(self):
+        gateway = self.gateway_client()
+        order = gateway.create_order(50000)
+        paid = self.fake.capture(order['id'])
+        gateway.verify_payment_signature(paid['razorpay_order_id'], paid['razorpay_payment_id'],
+                                         paid['razorpay_signature'])
+
+    def test_tampered_signature_rejected(self):
+        gateway = self.gateway_client()
+        order = gateway.create_order(50000)
+        paid = self.fake.capture(order['id'])
+        for order_id, payment_id, signature in (
+            (paid['razorpay_order_id'], 'pay_other', paid['razorpay_signature']),
+            (paid['razorpay_order_id'], paid['razorpay_payment_id'], paid['razorpay_signature'][::-1]),
+            (paid['razorpay_order_id'], paid['razorpay_payment_id'], ''),
+        ):
+            with self.assertRaises(SignatureError):
+                gateway.verify_payment_signature(order_id, payment_id, signature)
+
+    def test_signature_depends_on_secret(self):
+        other = RazorpayGateway(self.fake.key_id, 'another_secret', self.server.url)
+        order = self.gateway_client().create_order(50000)
+        paid = self.fake.capture(order['id'])
+        with self.assertRaises(SignatureError):
+            other.verify_payment_signature(paid['razorpay_order_id'], paid['razorpay_payment_id'],
+                                           paid['razorpay_signature'])
+
+
+@override_settings(RAZORPAY_WEBHOOK_SECRET='whsec_test', IDEMPOTENCY_CLAIM_LEASE=60)
+class WebhookTests(ShopFixtures, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.order = self.make_order(quantity=2, razorpay_order_id='order_test1')
+        reserve_order_stock(self.order)
+
+    def deliver(self, amount=None, payment_id='pay_test1', event_id='evt_1', signature=None):
+        body = json.dumps({
+            'event': 'payment.captured',
+            'payload': {'payment': {'entity': {
+                'id': payment_id,
+                'order_id': self.order.razorpay_order_id,
+                'amount': int(self.order.total_amount * 100) if amount is None else amount,
+                'status': 'captured',
+            }}},
+        }).encode()
+        if signature is None:
+            signature = hmac.new(b'whsec_test', body, hashlib.sha256).hexdigest()
+        return self.client.post(
+            reverse('razorpay_webhook'), body, content_type='application/json',
+            HTTP_X_RAZORPAY_SIGNATURE=signature, HTTP_X_RAZORPAY_EVENT_ID=event_id,
+        )
+
+    def test_bad_signature_rejected(self):
+        response = self.deliver(signature='0' * 64)
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(WebhookEvent.objects.exists())
+
+    def test_redelivery_is_stored_once(self):
+        self.assertEqual(self.deliver().json()['status'], 'ok')
+        self.assertEqual(self.deliver().json()['status'], 'duplicate')
+        self.assertEqual(WebhookEvent.objects.count(), 1)
+
+    def test_capture_marks_order_paid(self):
+        self.deliver()
+        self.assertEqual(process_pending_events(), (1, 0))
+        self.order.refresh_from_db()
+        self.assertTrue(self.order.is_paid)
+        self.assertEqual(self.order.status, 'confirmed')
+        self.assertEqual(self.order.razorpay_payment_id, 'pay_test1')
+        self.assertEqual(self.stock(), 1)
+        self.assertIsNotNone(WebhookEvent.objects.get().processed_at)
+
+    def test_second_event_for_same_payment_is_a_no_op(self):
+        self.deliver(event_id='evt_1')
+        self.deliver(event_id='evt_2')
+        self.assertEqual(process_pending_events(), (2, 0))
+        self.assertEqual(self.stock(), 1)
+
+    def test_amount_mismatch_does_not_pay(self):
+        self.deliver(amount=100)
+        process_pending_events()
+        self.order.refresh_from_db()
+        self.assertFalse(self.order.is_paid)
+        self.assertEqual(self.stock(), 3)
+
+    def test_capture_after_cancel_flags_refund(self):
+        release_order_stock(self.order)
+        Order.objects.filter(pk=self.order.pk).update(status='cancelled')
+
+        self.deliver()
+        process_pending_events()
+
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'cancelled')
+        self.assertFalse(self.order.is_paid)
+        self.assertFalse(self.order.stock_committed)
+        self.assertTrue(self.order.refund_due)
+        self.assertEqual(self.order.razorpay_payment_id, 'pay_test1')
+        self.assertEqual(self.stock(), 3)
+
+    def test_failures_retried_up_to_max_attempts(self):
+        self.deliver()
+        with mock.patch('payments.webhooks.handle_event', side_effect=RuntimeError('boom')):
+            for attempt in range(1, MAX_ATTEMPTS + 1):
+                self.assertEqual(process_pending_events(), (0, 1))
+                event = WebhookEvent.objects.get()
+                self.assertEqual((event.attempts, event.error), (attempt, 'boom'))
+            self.assertEqual(process_pending_events(), (0, 0))
+        self.assertIsNone(WebhookEvent.objects.get().processed_at)
+
+    def test_live_capture_elsewhere_does_not_use_attempts(self):
+        now = timezone.now()
+        IdempotencyKey.objects.create(
+            key='payment_success:pay_test1', locked_until=now + timedelta(seconds=30),
+            expires_at=now + timedelta(hours=1),
+        )
+        self.deliver()
+        self.assertEqual(process_pending_events(), (0, 1))
+        event = WebhookEvent.objects.get()
+        self.assertEqual(event.attempts, 0)
+        self.assertIsNone(event.processed_at)
+
+    def test_stale_capture_claim_is_taken_over(self):
+        now = timezone.now()
+        IdempotencyKey.objects.create(
+            key='payment_success:pay_test1', locked_until=now - timedelta(seconds=1),
+            expires_at=now + timedelta(hours=1),
+        )
+        self.deliver()
+        self.assertEqual(process_pending_events(), (1, 0))
+        self.order.refresh_from_db()
+        self.assertTrue(self.order.is_paid)
+
+
+class InvoiceMediaMixin:
+    """Invoices written under a throwaway MEDIA_ROOT."""
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        media = self.settings(MEDIA_ROOT=directory.name)
+        media.enable()
+        self.addCleanup(media.disable)
+
+    def assertIsPdf(self, path):
+        with open(path, 'rb') as file:
+            self.assertEqual(file.read(5), b'%PDF-')
+
+
+# close_old_connections() would close the test case's connection mid-transaction
+@mock.patch('payments.invoices.close_old_connections')
+class InvoiceRenderTests(InvoiceMediaMixin, ShopFixtures, TestCase):
+    def test_batch_renders_each_order(self, _):
+        orders = [self.make_order(quantity=1, is_paid=True) for _ in range(3)]
+        with self.assertNumQueries(2):
+            self.assertEqual(render_invoice_batch([order.pk for order in orders]), (3, []))
+        for order in orders:
+            self.assertIsPdf(invoice_path(order.order_number))
+        directory = os.path.dirname(invoice_path(orders[0].order_number))
+        self.assertFalse([name for name in os.listdir(directory) if name.startswith('.invoice-')])
+
+    def test_ensure_invoice_renders_once(self, _):
+        order = self.make_order(quantity=1, is_paid=True)
+        path = ensure_invoice(order)
+        self.assertIsPdf(path)
+        with self.assertNumQueries(0):
+            self.assertEqual(ensure_invoice(order), path)
+
+
+@skipUnless(multiprocessing.get_start_method() == 'fork',
+            "pool workers only see the test database when forked from the test process")
+class InvoicePoolTests(InvoiceMediaMixin, ShopFixtures, TransactionTestCase):
+    def setUp(self):
+        # Rows must be committed for the pool's processes to read them
+        self.setUpTestData()
+        super().setUp()
+
+    def test_render_invoices_on_a_pool(self):
+        orders = [self.make_order(quantity=1, is_paid=True) for _ in range(3)]
+        unpaid = self.make_order(quantity=1)
+        stdout = StringIO()
+        call_command('render_invoices', '--workers', '2', '--chunk-size', '2', stdout=stdout, stderr=StringIO())
+        self.assertIn('Rendered 3 invoices', stdout.getvalue())
+        self.assertIn('0 failed', stdout.getvalue())
+        for order in orders:
+            self.assertIsPdf(invoice_path(order.order_number))
+        self.assertFalse(os.path.exists(invoice_path(unpaid.order_number)))
+
+
+class ReconciliationTests(ShopFixtures, TestCase):
+    def order(self, name, **fields):
+        fields.setdefault('is_paid', True)
+        fields.setdefault('status', 'confirmed')
+        return self.make_order(quantity=1, razorpay_order_id=f'order_{name}', **fields)
+
+    def payments(self, *captures):
+        """{payment id: payment} for (order, payment id[, amount in paise]) captures."""
+        payments = {}
+        for order, payment_id, *amount in captures:
+            gateway_order_id = order if isinstance(order, str) else order.razorpay_order_id
+            total = amount[0] if amount else int(order.total_amount * 100)
+            payments[payment_id] = {'id': payment_id, 'order_id': gateway_order_id, 'amount': total,
+                                    'status': 'captured'}
+        return payments
+
+    def expected_paid(self):
+        return Order.objects.filter(payment_method='razorpay', is_paid=True)
+
+    def kinds(self, mismatches):
+        return {(m.kind, m.razorpay_order_id) for m in mismatches}
+
+    def test_matching_payments_reconcile(self):
+        order = self.order('ok', razorpay_payment_id='pay_ok')
+        failed = self.payments((self.order('x', is_paid=False, status='placed'), 'pay_failed'))
+        failed['pay_failed']['status'] = 'failed'
+        self.assertEqual(find_mismatches({**self.payments((order, 'pay_ok')), **failed}, self.expected_paid()), [])
+
+    def test_each_mismatch_kind(self):
+        unpaid = self.order('unpaid', is_paid=False, status='placed')
+        missing_id = self.order('missing_id')
+        wrong_amount = self.order('amount', razorpay_payment_id='pay_amount')
+        twice = self.order('twice', razorpay_payment_id='pay_twice1')
+        other_payment = self.order('other', razorpay_payment_id='pay_other_old')
+        cancelled = self.order('cancelled', is_paid=False, status='cancelled')
+        not_captured = self.order('not_captured', razorpay_payment_id='pay_lost')
+        payments = self.payments(
+            (unpaid, 'pay_unpaid'), (missing_id, 'pay_missing_id'), (wrong_amount, 'pay_amount', 100),
+            (twice, 'pay_twice1'), (twice, 'pay_twice2'), (other_payment, 'pay_other_new'),
+            (cancelled, 'pay_cancelled'), ('order_stranger', 'pay_stranger', 50000),
+        )
+        self.assertEqual(self.kinds(find_mismatches(payments, self.expected_paid())), {
+            (UNPAID, 'order_unpaid'),
+            (MISSING_PAYMENT_ID, 'order_missing_id'),
+            (WRONG_AMOUNT, 'order_amount'),
+            (DUPLICATE, 'order_twice'),
+            (DUPLICATE, 'order_other'),
+            (CANCELLED, 'order_cancelled'),
+            (UNKNOWN_ORDER, 'order_stranger'),
+            (NOT_CAPTURED, 'order_not_captured'),
+        })
+
+    def test_cancelled_order_flagged_for_refund_is_skipped(self):
+        order = self.order('cancelled', is_paid=False, status='cancelled', refund_due=True,
+                           razorpay_payment_id='pay_cancelled')
+        self.assertEqual(find_mismatches(self.payments((order, 'pay_cancelled')), self.expected_paid()), [])
+
+    def test_fix_marks_paid_and_backfills_ids(self):
+        unpaid = self.order('unpaid', is_paid=False, status='placed')
+        missing_id = self.order('missing_id')
+        cancelled = self.order('cancelled', is_paid=False, status='cancelled')
+        mismatches = find_mismatches(self.payments(
+            (unpaid, 'pay_unpaid'), (missing_id, 'pay_missing_id'), (cancelled, 'pay_cancelled'),
+        ), self.expected_paid())
+
+        remaining = apply_fixes(mismatches)
+        self.assertEqual(self.kinds(remaining), {(CANCELLED, 'order_cancelled')})
+        unpaid.refresh_from_db()
+        self.assertEqual((unpaid.is_paid, unpaid.status, unpaid.razorpay_payment_id),
+                         (True, 'confirmed', 'pay_unpaid'))
+        self.assertEqual(self.stock(), 2)
+        self.assertEqual(Order.objects.get(pk=missing_id.pk).razorpay_payment_id, 'pay_missing_id')
+        self.assertEqual(find_mismatches(self.payments(
+            (unpaid, 'pay_unpaid'), (missing_id, 'pay_missing_id'),
+        ), self.expected_paid()), [])
+
+    def test_fix_skips_capture_in_progress(self):
+        unpaid = self.order('unpaid', is_paid=False, status='placed')
+        now = timezone.now()
+        IdempotencyKey.objects.create(
+            key='payment_success:pay_unpaid', locked_until=now + timedelta(seconds=30),
+            expires_at=now + timedelta(hours=1),
+        )
+        remaining, = apply_fixes(find_mismatches(self.payments((unpaid, 'pay_unpaid')), self.expected_paid()))
+        self.assertEqual(remaining.detail, "capture in progress elsewhere")
+        self.assertFalse(Order.objects.get(pk=unpaid.pk).is_paid)
+
+    @mock.patch('payments.management.commands.reconcile_payments.get_gateway')
+    @mock.patch('payments.management.commands.reconcile_payments.fetch_payments')
+    def test_command_reports_and_fixes(self, fetch_payments, _):
+        unpaid = self.order('unpaid', is_paid=False, status='placed')
+        stranger = self.payments(('order_stranger', 'pay_stranger', 50000))
+        fetch_payments.return_value = {**self.payments((unpaid, 'pay_unpaid')), **stranger}
+
+        stdout = StringIO()
+        call_command('reconcile_payments', stdout=stdout)
+        self.assertIn('1 mismatches can be fixed with --fix', stdout.getvalue())
+        self.assertIn('2 mismatches (unknown: 1, unpaid: 1)', stdout.getvalue())
+        self.assertFalse(Order.objects.get(pk=unpaid.pk).is_paid)
+
+        stdout = StringIO()
+        call_command('reconcile_payments', '--fix', stdout=stdout)
+        self.assertIn('Fixed 1 of 2 mismatches', stdout.getvalue())
+        self.assertIn('1 mismatches (unknown: 1)', stdout.getvalue())
+        self.assertTrue(Order.objects.get(pk=unpaid.pk).is_paid)
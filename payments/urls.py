@@ -6,5 +6,6 @@ from . import views
 urlpatterns = [
     path('pay/<int:order_id>/', views.initiate_payment, name='initiate_payment'),
     path('payment-success/', views.payment_success, name='payment_success'),
+    path('webhooks/razorpay/', views.razorpay_webhook, name='razorpay_webhook'),
     path('order-success/<int:order_id>/', views.order_success, name='order_success'),
 ]
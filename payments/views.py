@@ -1,17 +1,19 @@
 import logging
-import razorpay
 from django.conf import settings
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
 from django.http import JsonResponse
 from django.contrib import messages
+from orders.idempotency import IdempotencyConflict, run_once
 from orders.models import Order
+from .gateway import GatewayError, SignatureError, get_gateway
+from .services import capture_payment
+from .webhooks import record_event
 
 logger = logging.getLogger(__name__)
 
-razorpay_client = razorpay.Client(auth=(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET))
-
 
 @login_required
 def initiate_payment(request, order_id):
@@ -21,26 +23,33 @@ def initiate_payment(request, order_id):
         messages.info(request, "This order is already paid")
         return redirect("order_detail", order_id=order.id)
 
+    def create_gateway_order():
+        razorpay_order = get_gateway().create_order(
+            amount=int(order.total_amount * 100),  # amount in paise
+            currency="INR",
+            receipt=order.order_number,
+        )
+        order.razorpay_order_id = razorpay_order["id"]
+        order.save()
+        logger.debug(f"Razorpay order created: {razorpay_order['id']} for order {order.order_number}")
+        return {"razorpay_order_id": razorpay_order["id"], "amount": int(order.total_amount * 100)}
+
+    # Reloading the payment page reuses the gateway order instead of creating another
     try:
-        razorpay_order = razorpay_client.order.create({
-            "amount": int(order.total_amount * 100),  # amount in paise
-            "currency": "INR",
-            "payment_capture": "1",
-        })
-    except Exception as e:
+        payment, _ = run_once("initiate_payment", f"{order.id}:{order.total_amount}", create_gateway_order)
+    except IdempotencyConflict:
+        messages.info(request, "Payment is already being set up, please try again in a moment.")
+        return redirect("order_detail", order_id=order.id)
+    except GatewayError as e:
         logger.error(f"Failed to create Razorpay order for order {order.order_number}: {e}")
         messages.error(request, "Failed to initiate payment. Please try again later.")
         return redirect("order_detail", order_id=order.id)
 
-    order.razorpay_order_id = razorpay_order["id"]
-    order.save()
-    logger.debug(f"Razorpay order created: {razorpay_order['id']} for order {order.order_number}")
-
     context = {
         "order": order,
         "razorpay_key_id": settings.RAZORPAY_KEY_ID,
-        "razorpay_order_id": razorpay_order["id"],
-        "amount": int(order.total_amount * 100),
+        "razorpay_order_id": payment["razorpay_order_id"],
+        "amount": payment["amount"],
     }
     return render(request, "payments/payment_page.html", context)
 
@@ -55,46 +64,23 @@ def payment_success(request):
         logger.debug(f"Payment success called with razorpay_order_id={order_id}, "
                      f"razorpay_payment_id={payment_id}, signature={signature}")
 
-        params = {
-            "razorpay_order_id": order_id,
-            "razorpay_payment_id": payment_id,
-            "razorpay_signature": signature,
-        }
-
         try:
-            razorpay_client.utility.verify_payment_signature(params)
+            get_gateway().verify_payment_signature(order_id, payment_id, signature)
             logger.info(f"Payment signature verified for order {order_id}")
 
-            order = Order.objects.get(razorpay_order_id=order_id)
-            order.razorpay_payment_id = payment_id
-            order.razorpay_signature = signature
-            order.is_paid = True
-            order.status = "confirmed"
-            order.save()
-
-            for item in order.items.all():
-                variant = item.variant
-                logger.debug(f"Reducing stock of variant {variant.id} by {item.quantity}")
-                variant.stock = max(0, variant.stock - item.quantity)
-                variant.save()
-
-            from .utils import send_order_confirmation_email, generate_invoice_pdf
+            # A repeated callback for the same payment gets the first answer
+            # back without re-running the stock, email and invoice work
+            result, replayed = run_once(
+                "payment_success", payment_id, lambda: capture_payment(order_id, payment_id, signature),
+            )
+            if replayed:
+                logger.info(f"Replayed payment_success for payment {payment_id}")
+            return JsonResponse(result)
 
-            try:
-                send_order_confirmation_email(order)
-                logger.debug(f"Order confirmation email sent for order {order.order_number}")
-            except Exception as e:
-                logger.error(f"Failed to send email for order {order.order_number}: {e}")
+        except IdempotencyConflict:
+            return JsonResponse({"status": "Payment is being processed"}, status=409)
 
-            try:
-                generate_invoice_pdf(order)
-                logger.debug(f"Invoice PDF generated for order {order.order_number}")
-            except Exception as e:
-                logger.error(f"Failed to generate invoice PDF for order {order.order_number}: {e}")
-
-            return JsonResponse({"status": "Payment successful"})
-
-        except razorpay.errors.SignatureVerificationError as sve:
+        except SignatureError as sve:
             logger.error(f"Payment signature verification failed: {sve}")
             return JsonResponse({"status": "Payment verification failed"})
 
@@ -110,6 +96,27 @@ def payment_success(request):
     return JsonResponse({"status": "Invalid request"})
 
 
+@csrf_exempt
+@require_POST
+def razorpay_webhook(request):
+    """
+    Gateway webhook: verify, store and acknowledge. The payment is applied
+    by the job worker, so the gateway gets its 200 without waiting.
+    """
+    try:
+        created = record_event(
+            request.body,
+            request.headers.get("X-Razorpay-Signature", ""),
+            request.headers.get("X-Razorpay-Event-Id"),
+        )
+    except SignatureError as e:
+        logger.warning(f"Rejected webhook: {e}")
+        return JsonResponse({"status": "Invalid signature"}, status=400)
+    except ValueError:
+        return JsonResponse({"status": "Invalid payload"}, status=400)
+    return JsonResponse({"status": "ok" if created else "duplicate"})
+
+
 @login_required
 def order_success(request, order_id):
     order = get_object_or_404(Order, id=order_id, user=request.user)
@@ -0,0 +1,121 @@
+# payments/webhooks.py
+import hashlib
+import hmac
+import json
+import logging
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+
+from jobs.models import Job
+from orders.idempotency import IdempotencyConflict, run_once
+from orders.models import Order
+from .gateway import SignatureError
+from .models import WebhookEvent
+from .services import capture_payment
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 5
+BATCH_SIZE = 100
+CAPTURE_EVENTS = {'payment.captured', 'order.paid'}
+
+
+def verify_signature(body, signature):
+    secret = settings.RAZORPAY_WEBHOOK_SECRET
+    if not secret:
+        raise SignatureError("RAZORPAY_WEBHOOK_SECRET is not configured")
+    expected = hmac.new(secret.encode('utf-8'), body, hashlib.sha256).hexdigest()
+    if not hmac.compare_digest(expected, signature or ''):
+        raise SignatureError("Webhook signature mismatch")
+
+
+def record_event(body, signature, event_id=None):
+    """
+    Verify and store one delivery. Returns False when the event id was
+    already stored, so redeliveries are acknowledged without new work.
+    Raises SignatureError, or ValueError for a body that is not JSON.
+    """
+    verify_signature(body, signature)
+    data = json.loads(body)
+    if not isinstance(data, dict):
+        raise ValueError("Webhook body is not a JSON object")
+    event_id = event_id or hashlib.sha256(body).hexdigest()
+    try:
+        with transaction.atomic():
+            WebhookEvent.objects.create(
+                event_id=event_id[:100], event=str(data.get('event', ''))[:100], body=body.decode('utf-8'),
+            )
+    except IntegrityError:
+        return False
+    schedule_processing()
+    return True
+
+
+def schedule_processing():
+    """Queue a processing run unless one is already waiting; each run drains every pending event."""
+    from .tasks import process_webhook_events
+
+    if not Job.objects.filter(task=process_webhook_events.name, status='queued').exists():
+        process_webhook_events.enqueue()
+
+
+def handle_event(event):
+    data = json.loads(event.body)
+    if event.event not in CAPTURE_EVENTS:
+        return
+    payment = (data.get('payload', {}).get('payment') or {}).get('entity') or {}
+    if payment.get('status') != 'captured' or not payment.get('order_id'):
+        return
+    order = Order.objects.filter(razorpay_order_id=payment['order_id']).only('id', 'total_amount').first()
+    if order is None:
+        logger.warning("Webhook %s: no order for gateway order %s", event.event_id, payment['order_id'])
+        return
+    if payment.get('amount') != int(order.total_amount * 100):
+        logger.error("Webhook %s: captured %s paise for order %s, expected %s", event.event_id,
+                     payment.get('amount'), order.pk, int(order.total_amount * 100))
+        return
+    # Same key as the browser callback, so whichever arrives second is a no-op
+    run_once('payment_success', payment['id'], lambda: capture_payment(payment['order_id'], payment['id']))
+
+
+def process_pending_events(batch_size=BATCH_SIZE):
+    """
+    Apply pending events in id order, one locked batch per transaction.
+    A failing event keeps its row pending with the error and is retried on
+    a later run, up to MAX_ATTEMPTS. An event whose payment is being
+    captured by another request right now is retried without using up an
+    attempt. Returns (processed, failed).
+    """
+    processed = failed = 0
+    last_id = 0
+    while True:
+        with transaction.atomic():
+            pending = WebhookEvent.objects.filter(
+                processed_at__isnull=True, attempts__lt=MAX_ATTEMPTS, id__gt=last_id,
+            ).order_by('id')
+            if connection.features.has_select_for_update_skip_locked:
+                pending = pending.select_for_update(skip_locked=True)
+            else:
+                pending = pending.select_for_update()
+            events = list(pending[:batch_size])
+            if not events:
+                return processed, failed
+            for event in events:
+                try:
+                    with transaction.atomic():
+                        handle_event(event)
+                    event.processed_at = timezone.now()
+                    event.error = ''
+                    processed += 1
+                except IdempotencyConflict as e:
+                    event.error = f"Payment capture in progress elsewhere: {e}"
+                    failed += 1
+                except Exception as e:
+                    logger.exception("Failed to process webhook event %s", event.event_id)
+                    event.attempts += 1
+                    event.error = str(e)
+                    failed += 1
+            WebhookEvent.objects.bulk_update(events, ['processed_at', 'attempts', 'error'])
+            last_id = events[-1].id
@@ -1,6 +1,6 @@
 # products/admin.py
 from django.contrib import admin
-from .models import Category, Cake, CakeVariant, CakeImage
+from .models import Category, Cake, CakeVariant, CakeImage, Tag
 
 class CakeImageInline(admin.TabularInline):
     model = CakeImage
@@ -17,11 +17,18 @@ class CategoryAdmin(admin.ModelAdmin):
     list_filter = ['is_active', 'parent']
     search_fields = ['name', 'description']
 
+@admin.register(Tag)
+class TagAdmin(admin.ModelAdmin):
+    list_display = ['name', 'slug']
+    search_fields = ['name', 'slug']
+    prepopulated_fields = {'slug': ('name',)}
+
 @admin.register(Cake)
 class CakeAdmin(admin.ModelAdmin):
     list_display = ['title', 'seller', 'category', 'dietary', 'is_active', 'is_todays_special', 'created_at', 'updated_at']
     list_filter = ['category', 'dietary', 'is_active', 'is_todays_special', 'created_at']
-    search_fields = ['title', 'description', 'tags', 'flavor']
+    search_fields = ['title', 'description', 'tags__name', 'flavor']
+    autocomplete_fields = ['tags']
     inlines = [CakeVariantInline, CakeImageInline]
     
     def get_queryset(self, request):
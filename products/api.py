@@ -0,0 +1,169 @@
+# products/api.py
+import hashlib
+
+from django.core.cache import cache
+from django.db.models import Prefetch
+from django.http import Http404
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework.decorators import api_view, renderer_classes
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from cakeshop.pagination import KeysetPaginator
+from orders.inventory import available_stock
+from .cache import get_versions
+from .categories import category_descendant_ids, get_category_tree
+from .models import Cake, CakeImage, CakeVariant
+from .serializers import CakeSerializer
+
+API_CACHE_TIMEOUT = 60 * 60 * 24
+API_PAGE_SIZE = 20
+
+
+def _version_stamp(updated_at):
+    return int(updated_at.timestamp() * 1_000_000)
+
+
+def _cake_cache_key(cake_id, updated_at):
+    return f'api:v1:cake_data:{cake_id}:{_version_stamp(updated_at)}'
+
+
+def make_etag(*parts):
+    digest = hashlib.sha1('|'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+    return f'"{digest}"'
+
+
+def conditional(request, data, etag, last_modified=None):
+    """
+    Answer with 304 when the client's validators still match, otherwise
+    with `data` (a value or a zero-argument callable building it) and the
+    ETag / Last-Modified headers.
+    """
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if response is None:
+        response = Response(data() if callable(data) else data)
+    response['ETag'] = etag
+    if timestamp is not None:
+        response['Last-Modified'] = http_date(timestamp)
+    response['Cache-Control'] = 'public, max-age=0, must-revalidate'
+    return response
+
+
+def serialized_cakes(rows):
+    """
+    Serialized representation of each (id, updated_at) row, in order.
+    Each cake is serialized once per updated_at and then served from the
+    cache; all misses are loaded together in one prefetching query.
+    """
+    keys = {cake_id: _cake_cache_key(cake_id, updated_at) for cake_id, updated_at in rows}
+    found = cache.get_many(list(keys.values()))
+    missing = [cake_id for cake_id, key in keys.items() if key not in found]
+    if missing:
+        cakes = Cake.objects.filter(id__in=missing).prefetch_related(
+            'tags',
+            Prefetch('variants', queryset=CakeVariant.objects.order_by('id')),
+            Prefetch('images', queryset=CakeImage.objects.order_by('id')),
+        )
+        fresh = {}
+        for cake in cakes:
+            fresh[_cake_cache_key(cake.id, cake.updated_at)] = CakeSerializer(cake).data
+        cache.set_many(fresh, API_CACHE_TIMEOUT)
+        found.update(fresh)
+    return [found[keys[cake_id]] for cake_id, _ in rows if keys[cake_id] in found]
+
+
+def variants_in_stock(cake_ids):
+    """
+    {variant_id: bool} for every variant of the given cakes, from the
+    stock not held by a live reservation, as the cake detail page shows it.
+    """
+    variant_ids = CakeVariant.objects.filter(cake_id__in=cake_ids).values('id')
+    return {variant_id: available > 0 for variant_id, available in available_stock(variant_ids).items()}
+
+
+def with_availability(results, in_stock):
+    """Copies of the serialized cakes with `in_stock` set on each variant."""
+    return [
+        {**data, 'variants': [
+            {**variant, 'in_stock': in_stock.get(variant['id'], False)} for variant in data['variants']
+        ]}
+        for data in results
+    ]
+
+
+def _stock_etag_part(in_stock):
+    return 'stock:' + ','.join(str(variant_id) for variant_id in sorted(in_stock) if in_stock[variant_id])
+
+
+def _cake_row(cake_id):
+    row = Cake.objects.filter(id=cake_id, is_active=True).values_list('id', 'updated_at').first()
+    if row is None:
+        raise Http404("No Cake matches the given query.")
+    return row
+
+
+@api_view(['GET'])
+@renderer_classes([JSONRenderer])
+def cake_list(request):
+    cakes = Cake.objects.filter(is_active=True)
+    category_id = request.GET.get('category')
+    if category_id:
+        cakes = cakes.filter(category_id__in=category_descendant_ids(category_id) or [])
+    dietary = request.GET.get('dietary')
+    if dietary:
+        cakes = cakes.filter(dietary=dietary)
+
+    paginator = KeysetPaginator(cakes.only('id', 'created_at', 'updated_at'), API_PAGE_SIZE)
+    page = paginator.get_page(request.GET.get('cursor'))
+    rows = [(cake.id, cake.updated_at) for cake in page]
+    in_stock = variants_in_stock([cake_id for cake_id, _ in rows])
+
+    etag = make_etag('cakes', request.GET.urlencode(), *(f'{i}:{_version_stamp(u)}' for i, u in rows),
+                     _stock_etag_part(in_stock))
+    last_modified = max((updated_at for _, updated_at in rows), default=None)
+    return conditional(request, lambda: {
+        'results': with_availability(serialized_cakes(rows), in_stock),
+        'next': page.next_token,
+        'previous': page.previous_token,
+    }, etag, last_modified)
+
+
+@api_view(['GET'])
+@renderer_classes([JSONRenderer])
+def cake_detail(request, cake_id):
+    row = _cake_row(cake_id)
+    in_stock = variants_in_stock([row[0]])
+    etag = make_etag('cake', row[0], _version_stamp(row[1]), _stock_etag_part(in_stock))
+    return conditional(request, lambda: with_availability(serialized_cakes([row]), in_stock)[0], etag, row[1])
+
+
+@api_view(['GET'])
+@renderer_classes([JSONRenderer])
+def cake_variants(request, cake_id):
+    row = _cake_row(cake_id)
+    in_stock = variants_in_stock([row[0]])
+    etag = make_etag('variants', row[0], _version_stamp(row[1]), _stock_etag_part(in_stock))
+    return conditional(
+        request, lambda: with_availability(serialized_cakes([row]), in_stock)[0]['variants'], etag, row[1],
+    )
+
+
+@api_view(['GET'])
+@renderer_classes([JSONRenderer])
+def category_list(request):
+    version = get_versions('categories')[0]
+
+    def build():
+        def node_data(node):
+            return {
+                'id': node['id'],
+                'name': node['name'],
+                'parent': node['parent_id'],
+                'is_active': node['is_active'],
+                'children': [node_data(child) for child in node['children']],
+            }
+        return [node_data(node) for node in get_category_tree()['roots']]
+
+    return conditional(request, build, make_etag('categories', version))
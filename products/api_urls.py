@@ -0,0 +1,10 @@
+# products/api_urls.py
+from django.urls import path
+from . import api
+
+urlpatterns = [
+    path('cakes/', api.cake_list, name='api_cake_list'),
+    path('cakes/<int:cake_id>/', api.cake_detail, name='api_cake_detail'),
+    path('cakes/<int:cake_id>/variants/', api.cake_variants, name='api_cake_variants'),
+    path('categories/', api.category_list, name='api_category_list'),
+]
@@ -0,0 +1,93 @@
+# products/cache.py
+import time
+
+from django.core.cache import cache
+
+PAGE_CACHE_TIMEOUT = 60 * 15
+HOME_CAKE_IDS_KEY = 'products:home_cake_ids'
+
+
+def _version_key(name):
+    return f'version:{name}'
+
+
+def _fresh_version():
+    # Time based so a version lost to eviction never reuses an old number
+    return int(time.time() * 1000)
+
+
+def get_versions(*names):
+    """Current version of each name, in one cache round trip."""
+    keys = [_version_key(name) for name in names]
+    found = cache.get_many(keys)
+    versions = []
+    for key in keys:
+        version = found.get(key)
+        if version is None:
+            version = _fresh_version()
+            if not cache.add(key, version, None):
+                version = cache.get(key, version)
+        versions.append(version)
+    return versions
+
+
+def bump_version(*names):
+    for name in names:
+        key = _version_key(name)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _fresh_version(), None)
+
+
+def versioned_key(prefix, *names):
+    versions = get_versions(*names)
+    return prefix + ':' + ':'.join(f'{name}.{version}' for name, version in zip(names, versions))
+
+
+def get_or_build(prefix, depends_on, builder, timeout=PAGE_CACHE_TIMEOUT):
+    """
+    Return the cached value for `prefix` built against the current versions
+    of `depends_on`, calling `builder()` on a miss. Bumping any of the
+    versions makes the old entry unreachable; it then simply expires.
+    """
+    key = versioned_key(prefix, *depends_on)
+    value = cache.get(key)
+    if value is None:
+        value = builder()
+        cache.set(key, value, timeout)
+    return value
+
+
+def remember_home_cakes(cake_ids):
+    cache.set(HOME_CAKE_IDS_KEY, set(cake_ids), None)
+
+
+def invalidate_cake(cake_id, category_ids=(), listing_changed=False):
+    """
+    Drop the cached pages that show a cake: its detail page, the related
+    cakes blocks of its categories, and the home page when the cake is on
+    it. `listing_changed` says a field the listings filter or count on
+    changed (price range, stock flag, category, ...); only then are the
+    catalog-wide facet counts and the home page dropped as well, so a sale
+    that leaves the cake in stock does not empty the whole cache.
+    """
+    names = [f'cake:{cake_id}']
+    names += [f'category:{category_id}' for category_id in category_ids if category_id]
+    if listing_changed:
+        names.append('catalog')
+    if listing_changed or cake_id in (cache.get(HOME_CAKE_IDS_KEY) or ()):
+        names.append('home')
+    bump_version(*names)
+
+
+def invalidate_categories():
+    bump_version('categories')
+
+
+def invalidate_cake_by_id(cake_id, listing_changed=False):
+    """Like invalidate_cake, for callers that only hold the cake id."""
+    from .models import Cake
+
+    category_id = Cake.objects.filter(pk=cake_id).values_list('category_id', flat=True).first()
+    invalidate_cake(cake_id, [category_id], listing_changed)
@@ -0,0 +1,339 @@
+# products/catalog_io.py
+import csv
+import json
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from accounts.models import User
+from .cache import bump_version, invalidate_cake
+from .models import Cake, CakeImage, CakeVariant, Category, SearchTerm, Tag
+from .search import build_terms
+
+# One row per variant; cake columns repeat on every variant row of a cake.
+# `images` is a "|" separated list of media paths, main image first.
+CATALOG_FIELDS = [
+    'seller', 'title', 'description', 'category', 'flavor', 'dietary', 'tags',
+    'is_active', 'is_todays_special', 'weight', 'price', 'stock', 'images',
+]
+REQUIRED_FIELDS = ['seller', 'title', 'category', 'flavor', 'dietary', 'weight', 'price', 'stock']
+# bulk_update() skips auto_now, so updated_at (the API's ETag and cache key) is set by hand
+CAKE_UPDATE_FIELDS = ['description', 'category', 'flavor', 'dietary', 'is_active', 'is_todays_special', 'updated_at']
+
+DIETARY_VALUES = {value for value, _ in Cake.DIETARY_CHOICES}
+WEIGHT_VALUES = {value for value, _ in CakeVariant.WEIGHT_CHOICES}
+TRUE_VALUES = {'1', 'true', 'yes', 'y'}
+
+
+class RowError(ValueError):
+    pass
+
+
+def read_rows(file, fmt):
+    """Yield (line number, dict) from a CSV or JSON Lines file without loading it whole."""
+    if fmt == 'csv':
+        reader = csv.DictReader(file)
+        for row in reader:
+            yield reader.line_num, row
+    else:
+        for line_no, line in enumerate(file, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield line_no, json.loads(line)
+            except json.JSONDecodeError as e:
+                yield line_no, RowError(f"invalid JSON: {e}")
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _bool(value, default):
+    if value in (None, ''):
+        return default
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in TRUE_VALUES
+
+
+class CatalogImporter:
+    """
+    Upsert cakes, variants, tags and images from rows in batches.
+
+    Cakes are matched on (seller, title) and variants on (cake, weight).
+    Each batch is validated first, then written with bulk_create /
+    bulk_update inside one transaction, so a batch costs a fixed number
+    of queries however many rows it has. The per-row work that the
+    model save() methods normally do (price range, main image, search
+    index, cache versions) is redone in bulk for the touched cakes.
+    """
+
+    def __init__(self, batch_size=500, dry_run=False):
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.sellers = {
+            email.lower(): user_id
+            for email, user_id in User.objects.filter(role='seller').values_list('email', 'id')
+        }
+        self.categories = {}
+        for category_id, name in Category.objects.values_list('id', 'name'):
+            self.categories[str(category_id)] = category_id
+            self.categories.setdefault(name.strip().lower(), category_id)
+        self.errors = []
+        self.stats = {'rows': 0, 'cakes_created': 0, 'cakes_updated': 0,
+                      'variants_created': 0, 'variants_updated': 0, 'images_created': 0}
+
+    def run(self, rows):
+        for chunk in chunked(rows, self.batch_size):
+            valid = []
+            for line_no, row in chunk:
+                self.stats['rows'] += 1
+                try:
+                    if isinstance(row, Exception):
+                        raise row
+                    valid.append((line_no, self.clean_row(row)))
+                except RowError as e:
+                    self.errors.append((line_no, str(e)))
+            if valid:
+                with transaction.atomic():
+                    self.write_batch(valid)
+                    if self.dry_run:
+                        transaction.set_rollback(True)
+        return self.stats
+
+    def clean_row(self, row):
+        missing = [field for field in REQUIRED_FIELDS if str(row.get(field) or '').strip() == '']
+        if missing:
+            raise RowError(f"missing {', '.join(missing)}")
+
+        seller_id = self.sellers.get(str(row['seller']).strip().lower())
+        if seller_id is None:
+            raise RowError(f"unknown seller {row['seller']!r}")
+        category_id = self.categories.get(str(row['category']).strip().lower())
+        if category_id is None:
+            raise RowError(f"unknown category {row['category']!r}")
+        dietary = str(row['dietary']).strip()
+        if dietary not in DIETARY_VALUES:
+            raise RowError(f"dietary must be one of {', '.join(sorted(DIETARY_VALUES))}")
+        weight = str(row['weight']).strip()
+        if weight not in WEIGHT_VALUES:
+            raise RowError(f"weight must be one of {', '.join(sorted(WEIGHT_VALUES))}")
+        try:
+            price = Decimal(str(row['price']).strip())
+            if not price.is_finite():
+                raise InvalidOperation
+            price = price.quantize(Decimal('0.01'))
+        except InvalidOperation:
+            raise RowError(f"invalid price {row['price']!r}")
+        if price < 0 or price >= Decimal('1000000'):
+            raise RowError(f"price out of range {price}")
+        try:
+            stock = int(str(row['stock']).strip())
+        except ValueError:
+            raise RowError(f"invalid stock {row['stock']!r}")
+        if stock < 0:
+            raise RowError("stock cannot be negative")
+
+        title = str(row['title']).strip()[:200]
+        tags = row.get('tags') or ''
+        if isinstance(tags, str):
+            tags = tags.split(',')
+        images = row.get('images') or ''
+        if isinstance(images, str):
+            images = images.split('|')
+
+        return {
+            'seller_id': seller_id,
+            'title': title,
+            'description': str(row.get('description') or ''),
+            'category_id': category_id,
+            'flavor': str(row['flavor']).strip()[:100],
+            'dietary': dietary,
+            'is_active': _bool(row.get('is_active'), True),
+            'is_todays_special': _bool(row.get('is_todays_special'), False),
+            'tags': [Tag.normalize(tag) for tag in tags if tag.strip()],
+            'images': [path.strip() for path in images if path.strip()],
+            'weight': weight,
+            'price': price,
+            'stock': stock,
+        }
+
+    def write_batch(self, rows):
+        # Cakes: one row per (seller, title), last row wins for cake fields
+        cake_rows = {}
+        for _, row in rows:
+            cake_rows[(row['seller_id'], row['title'])] = row
+
+        existing = {
+            (cake.seller_id, cake.title): cake
+            for cake in Cake.objects.filter(
+                seller_id__in={key[0] for key in cake_rows},
+                title__in={key[1] for key in cake_rows},
+            )
+        }
+        to_create, to_update = [], []
+        now = timezone.now()
+        for key, row in cake_rows.items():
+            cake = existing.get(key)
+            if cake is None:
+                cake = Cake(seller_id=row['seller_id'], title=row['title'])
+                to_create.append(cake)
+            else:
+                to_update.append(cake)
+            cake.description = row['description']
+            cake.category_id = row['category_id']
+            cake.flavor = row['flavor']
+            cake.dietary = row['dietary']
+            cake.is_active = row['is_active']
+            cake.is_todays_special = row['is_todays_special']
+            cake.updated_at = now
+            existing[key] = cake
+        Cake.objects.bulk_create(to_create)
+        if to_update:
+            Cake.objects.bulk_update(to_update, CAKE_UPDATE_FIELDS)
+        if to_create and to_create[0].pk is None:
+            # Backends that do not return ids from bulk_create: look them up
+            created = Cake.objects.filter(
+                seller_id__in={cake.seller_id for cake in to_create},
+                title__in={cake.title for cake in to_create},
+            ).values_list('seller_id', 'title', 'id')
+            for seller_id, title, cake_id in created:
+                existing[(seller_id, title)].pk = cake_id
+        self.stats['cakes_created'] += len(to_create)
+        self.stats['cakes_updated'] += len(to_update)
+        cakes = {key: existing[key] for key in cake_rows}
+        cake_ids = [cake.pk for cake in cakes.values()]
+
+        # Variants: upsert on (cake, weight)
+        variants = {
+            (variant.cake_id, variant.weight): variant
+            for variant in CakeVariant.objects.filter(cake_id__in=cake_ids)
+        }
+        new_variants, changed_variants = {}, {}
+        for _, row in rows:
+            cake_id = cakes[(row['seller_id'], row['title'])].pk
+            key = (cake_id, row['weight'])
+            variant = variants.get(key)
+            if variant is None:
+                variant = new_variants.setdefault(key, CakeVariant(cake_id=cake_id, weight=row['weight']))
+            else:
+                changed_variants[key] = variant
+            variant.price = row['price']
+            variant.stock = row['stock']
+        CakeVariant.objects.bulk_create(new_variants.values())
+        if changed_variants:
+            CakeVariant.objects.bulk_update(changed_variants.values(), ['price', 'stock'])
+        self.stats['variants_created'] += len(new_variants)
+        self.stats['variants_updated'] += len(changed_variants)
+
+        self._write_tags(cakes, cake_rows)
+        self._write_images(cakes, cake_rows)
+        self._refresh_denormalized(cake_ids)
+        for cake in cakes.values():
+            invalidate_cake(cake.pk, [cake.category_id], listing_changed=True)
+        bump_version('tags')
+
+    def _write_tags(self, cakes, cake_rows):
+        slugs = {slug: name for row in cake_rows.values() for name, slug in row['tags'] if slug}
+        Tag.objects.bulk_create([Tag(name=name, slug=slug) for slug, name in slugs.items()],
+                                ignore_conflicts=True)
+        tag_ids = dict(Tag.objects.filter(slug__in=slugs).values_list('slug', 'id'))
+        Through = Cake.tags.through
+        Through.objects.filter(cake_id__in=[cake.pk for cake in cakes.values()]).delete()
+        Through.objects.bulk_create([
+            Through(cake_id=cakes[key].pk, tag_id=tag_ids[slug])
+            for key, row in cake_rows.items()
+            for slug in dict.fromkeys(slug for _, slug in row['tags'] if slug in tag_ids)
+        ])
+
+    def _write_images(self, cakes, cake_rows):
+        cake_ids = [cake.pk for cake in cakes.values()]
+        have = set(CakeImage.objects.filter(cake_id__in=cake_ids).values_list('cake_id', 'image'))
+        new_images = []
+        main_paths = {}
+        for key, row in cake_rows.items():
+            cake_id = cakes[key].pk
+            if row['images']:
+                main_paths[cake_id] = row['images'][0]
+            for path in dict.fromkeys(row['images']):
+                if (cake_id, path) not in have:
+                    new_images.append(CakeImage(cake_id=cake_id, image=path))
+        CakeImage.objects.bulk_create(new_images)
+        self.stats['images_created'] += len(new_images)
+        if main_paths:
+            # Exactly one main image per cake that listed images: the first one
+            main_ids = {}
+            for image_id, cake_id, path in CakeImage.objects.filter(
+                cake_id__in=main_paths, image__in=set(main_paths.values())
+            ).order_by('id').values_list('id', 'cake_id', 'image'):
+                if main_paths[cake_id] == path:
+                    main_ids.setdefault(cake_id, image_id)
+            CakeImage.objects.filter(cake_id__in=main_paths).update(is_main=False)
+            CakeImage.objects.filter(pk__in=main_ids.values()).update(is_main=True)
+        if new_images:
+            from .images import schedule_derivatives
+            for image in CakeImage.objects.filter(cake_id__in=cake_ids, derivatives={}).values_list('id', flat=True):
+                schedule_derivatives(image)
+
+    def _refresh_denormalized(self, cake_ids):
+        stats = {
+            row['cake_id']: row
+            for row in CakeVariant.objects.filter(cake_id__in=cake_ids).values('cake_id').annotate(
+                low=Min('price'), high=Max('price'), max_stock=Max('stock'),
+            )
+        }
+        mains = dict(CakeImage.objects.filter(cake_id__in=cake_ids, is_main=True).values_list('cake_id', 'id'))
+        cakes = list(Cake.objects.filter(id__in=cake_ids).prefetch_related('tags'))
+        # Every cake of the batch may have new variants, tags or images even
+        # when its own fields did not change
+        now = timezone.now()
+        for cake in cakes:
+            row = stats.get(cake.pk, {})
+            cake.updated_at = now
+            cake.min_price = row.get('low')
+            cake.max_price = row.get('high')
+            cake.in_stock = bool(row.get('max_stock'))
+            cake.main_image_id = mains.get(cake.pk)
+        Cake.objects.bulk_update(cakes, ['min_price', 'max_price', 'in_stock', 'main_image', 'updated_at'])
+
+        SearchTerm.objects.filter(cake_id__in=cake_ids).delete()
+        SearchTerm.objects.bulk_create([
+            SearchTerm(cake_id=cake.pk, term=term, weight=min(weight, 32767))
+            for cake in cakes
+            for term, weight in build_terms(cake).items()
+        ], batch_size=2000)
+
+
+def export_rows(queryset=None, chunk_size=500):
+    """Yield one CATALOG_FIELDS dict per variant, streaming the cakes in chunks."""
+    if queryset is None:
+        queryset = Cake.objects.all()
+    cakes = queryset.order_by('id').select_related('seller', 'category').prefetch_related(
+        'tags', 'variants', 'images',
+    )
+    for cake in cakes.iterator(chunk_size=chunk_size):
+        images = sorted(cake.images.all(), key=lambda image: (not image.is_main, image.id))
+        base = {
+            'seller': cake.seller.email,
+            'title': cake.title,
+            'description': cake.description,
+            'category': cake.category.name,
+            'flavor': cake.flavor,
+            'dietary': cake.dietary,
+            'tags': ', '.join(tag.name for tag in cake.tags.all()),
+            'is_active': cake.is_active,
+            'is_todays_special': cake.is_todays_special,
+            'images': '|'.join(image.image.name for image in images),
+        }
+        for variant in sorted(cake.variants.all(), key=lambda variant: variant.id):
+            yield dict(base, weight=variant.weight, price=str(variant.price), stock=variant.stock)
@@ -0,0 +1,99 @@
+# products/categories.py
+from django.core.cache import cache
+
+CATEGORY_TREE_CACHE_KEY = 'products:category_tree'
+
+
+def _build_category_tree():
+    """
+    Load every category in one query, ordered by materialized path so
+    parents always come before their children.
+    """
+    from .models import Category
+
+    nodes = {}
+    roots = []
+    for category in Category.objects.order_by('path').only('id', 'name', 'parent_id', 'path', 'is_active'):
+        node = {
+            'id': category.id,
+            'name': category.name,
+            'parent_id': category.parent_id,
+            'path': category.path,
+            'depth': category.depth,
+            'is_active': category.is_active,
+            'children': [],
+        }
+        nodes[category.id] = node
+        parent = nodes.get(category.parent_id)
+        if parent is not None:
+            parent['children'].append(node)
+        else:
+            roots.append(node)
+    return {'roots': roots, 'nodes': nodes}
+
+
+def get_category_tree():
+    """Return the cached category tree, building it on first use."""
+    tree = cache.get(CATEGORY_TREE_CACHE_KEY)
+    if tree is None:
+        tree = _build_category_tree()
+        cache.set(CATEGORY_TREE_CACHE_KEY, tree, None)
+    return tree
+
+
+def invalidate_category_tree():
+    cache.delete(CATEGORY_TREE_CACHE_KEY)
+
+
+def active_category_nav():
+    """
+    Flat, depth-first list of active categories for menus. A category is
+    hidden when it or any of its ancestors is inactive.
+    """
+    result = []
+
+    def walk(nodes):
+        for node in nodes:
+            if node['is_active']:
+                result.append(node)
+                walk(node['children'])
+
+    walk(get_category_tree()['roots'])
+    return result
+
+
+def category_descendant_ids(category_id):
+    """
+    Ids of a category and all of its sub-categories, resolved from the
+    cached tree. Returns None for an unknown id.
+    """
+    try:
+        node = get_category_tree()['nodes'].get(int(category_id))
+    except (TypeError, ValueError):
+        return None
+    if node is None:
+        return None
+    ids = set()
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        ids.add(current['id'])
+        stack.extend(current['children'])
+    return ids
+
+
+def rollup_category_counts(counts):
+    """
+    Turn per-category counts into counts that include every
+    sub-category, matching what filtering by a category returns.
+    """
+    totals = {}
+    for node_id, node in get_category_tree()['nodes'].items():
+        for ancestor in _ancestor_ids(node):
+            totals[ancestor] = totals.get(ancestor, 0) + counts.get(node_id, 0)
+    return totals
+
+
+def _ancestor_ids(node):
+    """Ids on the node's materialized path, root first, the node itself last."""
+    return [int(part) for part in node['path'].split('/') if part]
@@ -0,0 +1,7 @@
+# products/context_processors.py
+from .categories import active_category_nav
+
+
+def category_navigation(request):
+    """Expose the cached category tree to every template for the navbar."""
+    return {'category_nav': active_category_nav}
@@ -0,0 +1,138 @@
+# products/facets.py
+import hashlib
+import json
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.db.models import Case, Count, IntegerField, Value, When
+
+# (label, lower bound inclusive, upper bound exclusive) on Cake.min_price
+PRICE_BUCKETS = [
+    ('Under ₹500', None, 500),
+    ('₹500 - ₹1000', 500, 1000),
+    ('₹1000 - ₹2000', 1000, 2000),
+    ('₹2000 and above', 2000, None),
+]
+
+FACET_FIELDS = ('category', 'dietary', 'flavor', 'price')
+FACET_CACHE_TIMEOUT = 300
+MAX_FLAVORS = 10
+
+
+def _price_bucket_expression():
+    whens = []
+    for index, (_, low, high) in enumerate(PRICE_BUCKETS):
+        bounds = {}
+        if low is not None:
+            bounds['min_price__gte'] = low
+        if high is not None:
+            bounds['min_price__lt'] = high
+        whens.append(When(then=Value(index), **bounds))
+    return Case(*whens, default=Value(None), output_field=IntegerField())
+
+
+def _fetch_groups(base_queryset):
+    """
+    One GROUP BY query over every facet dimension at once. Each row is
+    (category_id, dietary, flavor, price bucket, number of cakes).
+    """
+    rows = (
+        base_queryset.order_by()
+        .annotate(price_bucket=_price_bucket_expression())
+        .values_list('category_id', 'dietary', 'flavor', 'price_bucket')
+        .annotate(n=Count('id'))
+    )
+    return [tuple(row) for row in rows]
+
+
+def _cache_key(cache_params):
+    payload = json.dumps(cache_params, sort_keys=True, default=str)
+    return 'facets:' + hashlib.md5(payload.encode('utf-8')).hexdigest()
+
+
+def compute_facets(base_queryset, selected, cache_params=None):
+    """
+    Count cakes per category, dietary, flavor and price bucket.
+
+    `base_queryset` holds the filters that are not facets (search text,
+    price range, stock) and `selected` maps facet name to the chosen value.
+    The grouped rows are fetched once and each facet is then counted with
+    all *other* selected facets applied, so "Vegan (12)" is the number of
+    results the shopper gets by switching to Vegan. The grouped rows only
+    depend on the base filters, so they are cached under `cache_params`
+    and every facet combination on top of them is served from memory.
+    """
+    groups = None
+    key = None
+    if cache_params is not None:
+        key = _cache_key(cache_params)
+        groups = cache.get(key)
+    if groups is None:
+        groups = _fetch_groups(base_queryset)
+        if key is not None:
+            cache.set(key, groups, FACET_CACHE_TIMEOUT)
+
+    active = {name: value for name, value in selected.items() if value not in (None, '')}
+    counts = {name: defaultdict(int) for name in FACET_FIELDS}
+    for category_id, dietary, flavor, bucket, n in groups:
+        row = {'category': category_id, 'dietary': dietary, 'flavor': flavor, 'price': bucket}
+        for name in FACET_FIELDS:
+            if all(_matches(row[other], value) for other, value in active.items() if other != name):
+                counts[name][row[name]] += n
+    return counts
+
+
+def _matches(row_value, selected_value):
+    if isinstance(selected_value, (set, frozenset, list, tuple)):
+        return row_value in selected_value
+    return str(row_value) == str(selected_value)
+
+
+def facet_options(counts, choices, selected=None, params=None, name=None):
+    """
+    Turn {value: count} into a list of dicts for templates, in the order of
+    `choices` ((value, label) pairs). Values without results are kept so
+    the sidebar layout stays stable. When the request's GET `params` and
+    the facet's parameter `name` are given, each option also carries the
+    query string that toggles it.
+    """
+    options = []
+    for value, label in choices:
+        is_selected = selected not in (None, '') and str(value) == str(selected)
+        option = {
+            'value': value,
+            'label': label,
+            'count': counts.get(value, 0),
+            'selected': is_selected,
+        }
+        if params is not None and name is not None:
+            query = params.copy()
+            query.pop('cursor', None)
+            if is_selected:
+                query.pop(name, None)
+            else:
+                query[name] = value
+            option['query'] = '?' + query.urlencode()
+        options.append(option)
+    return options
+
+
+def flavor_choices(counts):
+    top = sorted((flavor for flavor in counts if flavor), key=lambda f: (-counts[f], f))
+    return [(flavor, flavor) for flavor in top[:MAX_FLAVORS]]
+
+
+def price_bucket_choices():
+    return [(index, label) for index, (label, _, _) in enumerate(PRICE_BUCKETS)]
+
+
+def price_bucket_bounds(index):
+    """Return the (min_price, max_price) filter values of a bucket index."""
+    try:
+        index = int(index)
+    except (ValueError, TypeError):
+        return None, None
+    if not 0 <= index < len(PRICE_BUCKETS):
+        return None, None
+    _, low, high = PRICE_BUCKETS[index]
+    return low, high
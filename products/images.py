@@ -0,0 +1,138 @@
+# products/images.py
+import io
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# name -> (width, height, crop). Cropped derivatives are filled to the exact
+# size, the others are scaled down to fit inside it.
+DERIVATIVES = {
+    'thumb': (120, 120, True),
+    'card': (480, 480, False),
+    'large': (1024, 1024, False),
+}
+
+FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'IMAGE_PIPELINE_WORKERS', 2),
+                thread_name_prefix='image-pipeline',
+            )
+    return _executor
+
+
+def derivative_name(image_id, name, fmt):
+    ext = 'jpg' if fmt == 'jpeg' else fmt
+    return f'products/derivatives/{image_id}/{name}.{ext}'
+
+
+def _load(file):
+    """Open an upload, apply its EXIF rotation and keep only the first frame."""
+    with Image.open(file) as source:
+        source.seek(0)
+        image = ImageOps.exif_transpose(source)
+        image.load()
+    if image.mode in ('LA', 'PA') or (image.mode == 'P' and 'transparency' in image.info):
+        image = image.convert('RGBA')
+    elif image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGB')
+    # Drop EXIF, ICC and comment data carried over from the upload
+    image.info = {}
+    return image
+
+
+def _resize(image, width, height, crop):
+    if crop:
+        return ImageOps.fit(image, (width, height), Image.LANCZOS)
+    resized = image.copy()
+    resized.thumbnail((width, height), Image.LANCZOS)
+    return resized
+
+
+def _encode(image, fmt):
+    pil_format, options = FORMATS[fmt]
+    if pil_format == 'JPEG' and image.mode != 'RGB':
+        # JPEG has no alpha channel: flatten onto white
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A') if image.mode == 'RGBA' else None)
+        image = background
+    buffer = io.BytesIO()
+    # No exif/icc_profile arguments: the encoded file carries no metadata
+    image.save(buffer, pil_format, **options)
+    return buffer.getvalue()
+
+
+def render_derivatives(file, image_id):
+    """
+    Write every derivative of one uploaded image to the default storage.
+    Returns {name: {fmt: storage name}}.
+    """
+    original = _load(file)
+    result = {}
+    for name, (width, height, crop) in DERIVATIVES.items():
+        resized = _resize(original, width, height, crop)
+        result[name] = {}
+        for fmt in FORMATS:
+            path = derivative_name(image_id, name, fmt)
+            if default_storage.exists(path):
+                default_storage.delete(path)
+            result[name][fmt] = default_storage.save(path, ContentFile(_encode(resized, fmt)))
+    return result
+
+
+def generate_derivatives(image_id):
+    """Build and record the derivatives of a CakeImage."""
+    from .models import Cake, CakeImage
+    from .cache import invalidate_cake_by_id
+
+    close_old_connections()
+    try:
+        image = CakeImage.objects.filter(pk=image_id).first()
+        if image is None or not image.image:
+            return None
+        with image.image.open('rb') as file:
+            derivatives = render_derivatives(file, image.pk)
+        # update() rather than save() so this does not schedule itself again
+        CakeImage.objects.filter(pk=image.pk, image=image.image.name).update(derivatives=derivatives)
+        Cake.objects.filter(pk=image.cake_id).update(updated_at=timezone.now())
+        invalidate_cake_by_id(image.cake_id)
+        return derivatives
+    except Exception:
+        logger.exception("Failed to generate derivatives for cake image %s", image_id)
+        return None
+    finally:
+        close_old_connections()
+
+
+def schedule_derivatives(image_id):
+    """Generate derivatives in the worker pool once the upload has committed."""
+    transaction.on_commit(lambda: _get_executor().submit(generate_derivatives, image_id))
+
+
+def delete_derivatives(derivatives):
+    for formats in (derivatives or {}).values():
+        for path in formats.values():
+            try:
+                default_storage.delete(path)
+            except OSError:
+                logger.warning("Could not delete image derivative %s", path)
@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from products.recommendations import DEFAULT_TOP_N, rebuild_recommendations
+
+
+class Command(BaseCommand):
+    help = "Rebuild co-purchase recommendations from order history"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=DEFAULT_TOP_N,
+                            help="Neighbours to keep per cake")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        cakes, rows = rebuild_recommendations(options['top'])
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Stored {rows} recommendations for {cakes} cakes in {elapsed:.1f}s"
+        ))
@@ -0,0 +1,40 @@
+import csv
+import json
+import sys
+
+from django.core.management.base import BaseCommand
+
+from products.catalog_io import CATALOG_FIELDS, export_rows
+from products.models import Cake
+
+
+class Command(BaseCommand):
+    help = "Stream the catalog as CSV or JSON Lines, one row per variant"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=['csv', 'jsonl'], default='csv')
+        parser.add_argument('--output', help="File to write, defaults to stdout")
+        parser.add_argument('--seller', help="Only export cakes of this seller (email)")
+
+    def handle(self, *args, **options):
+        cakes = Cake.objects.all()
+        if options['seller']:
+            cakes = cakes.filter(seller__email__iexact=options['seller'])
+
+        out = open(options['output'], 'w', newline='', encoding='utf-8') if options['output'] else sys.stdout
+        count = 0
+        try:
+            if options['format'] == 'csv':
+                writer = csv.DictWriter(out, fieldnames=CATALOG_FIELDS)
+                writer.writeheader()
+                for row in export_rows(cakes):
+                    writer.writerow(row)
+                    count += 1
+            else:
+                for row in export_rows(cakes):
+                    out.write(json.dumps(row, ensure_ascii=False) + '\n')
+                    count += 1
+        finally:
+            if out is not sys.stdout:
+                out.close()
+        self.stderr.write(self.style.SUCCESS(f"Exported {count} variant rows"))
@@ -0,0 +1,29 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from products.images import generate_derivatives
+from products.models import CakeImage
+
+
+class Command(BaseCommand):
+    help = "Generate resized WebP/JPEG copies of cake images"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help="Regenerate every image, not only those without derivatives")
+        parser.add_argument('--workers', type=int, default=4)
+
+    def handle(self, *args, **options):
+        images = CakeImage.objects.exclude(image='')
+        if not options['all']:
+            images = images.filter(derivatives={})
+        image_ids = list(images.values_list('id', flat=True))
+
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            results = list(executor.map(generate_derivatives, image_ids))
+
+        failed = sum(1 for result in results if result is None)
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated derivatives for {len(image_ids) - failed} images ({failed} failed)"
+        ))
@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from products.catalog_io import CatalogImporter, read_rows
+
+
+class Command(BaseCommand):
+    help = "Bulk import cakes, variants, tags and images from a CSV or JSON Lines file"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV or .jsonl file, one row per variant")
+        parser.add_argument('--format', choices=['csv', 'jsonl'],
+                            help="Defaults to the file extension")
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Validate and write each batch, then roll it back")
+        parser.add_argument('--max-errors', type=int, default=50,
+                            help="Row errors to print")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+        importer = CatalogImporter(batch_size=options['batch_size'], dry_run=options['dry_run'])
+
+        started = time.monotonic()
+        try:
+            with open(path, newline='', encoding='utf-8') as file:
+                stats = importer.run(read_rows(file, fmt))
+        except OSError as e:
+            raise CommandError(f"Cannot read {path}: {e}")
+        elapsed = time.monotonic() - started
+
+        for line_no, message in importer.errors[:options['max_errors']]:
+            self.stderr.write(f"line {line_no}: {message}")
+        if len(importer.errors) > options['max_errors']:
+            self.stderr.write(f"... and {len(importer.errors) - options['max_errors']} more errors")
+
+        summary = ", ".join(f"{key.replace('_', ' ')}: {value}" for key, value in stats.items())
+        rate = stats['rows'] / elapsed if elapsed else stats['rows']
+        prefix = "Dry run, nothing saved. " if options['dry_run'] else ""
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}{summary}, errors: {len(importer.errors)} ({elapsed:.1f}s, {rate:.0f} rows/s)"
+        ))
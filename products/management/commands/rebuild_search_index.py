@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from products.models import Cake
+from products.search import index_cake
+
+
+class Command(BaseCommand):
+    help = "Rebuild the catalog search index for all cakes"
+
+    def handle(self, *args, **options):
+        cakes = 0
+        terms = 0
+        for cake in Cake.objects.iterator(chunk_size=500):
+            terms += index_cake(cake)
+            cakes += 1
+        self.stdout.write(self.style.SUCCESS(f"Indexed {cakes} cakes ({terms} terms)"))
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max, Min
+
+from products.models import Cake, CakeVariant
+
+
+class Command(BaseCommand):
+    help = "Backfill Cake.min_price, max_price and in_stock from the variants"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        stats = {
+            row['cake_id']: row
+            for row in CakeVariant.objects.values('cake_id').annotate(
+                low=Min('price'), high=Max('price'), max_stock=Max('stock'),
+            )
+        }
+
+        updated = 0
+        batch = []
+        for cake in Cake.objects.only('id', 'min_price', 'max_price', 'in_stock').iterator(chunk_size=batch_size):
+            row = stats.get(cake.id, {})
+            cake.min_price = row.get('low')
+            cake.max_price = row.get('high')
+            cake.in_stock = bool(row.get('max_stock'))
+            batch.append(cake)
+            if len(batch) >= batch_size:
+                updated += self._flush(batch)
+                batch = []
+        if batch:
+            updated += self._flush(batch)
+
+        self.stdout.write(self.style.SUCCESS(f"Refreshed price ranges for {updated} cakes"))
+
+    def _flush(self, batch):
+        with transaction.atomic():
+            Cake.objects.bulk_update(batch, ['min_price', 'max_price', 'in_stock'])
+        return len(batch)
@@ -0,0 +1,34 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def build_search_index(apps, schema_editor):
+    from products.search import index_cake
+
+    Cake = apps.get_model('products', 'Cake')
+    SearchTerm = apps.get_model('products', 'SearchTerm')
+    for cake in Cake.objects.iterator():
+        index_cake(cake, term_model=SearchTerm)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64)),
+                ('weight', models.PositiveSmallIntegerField(default=1)),
+                ('cake', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='products.cake')),
+            ],
+            options={
+                'unique_together': {('term', 'cake')},
+            },
+        ),
+        migrations.RunPython(build_search_index, migrations.RunPython.noop),
+    ]
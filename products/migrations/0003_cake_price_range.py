@@ -0,0 +1,42 @@
+from django.db import migrations, models
+from django.db.models import Max, Min
+
+
+def backfill_price_ranges(apps, schema_editor):
+    Cake = apps.get_model('products', 'Cake')
+    CakeVariant = apps.get_model('products', 'CakeVariant')
+    stats = CakeVariant.objects.values('cake_id').annotate(
+        low=Min('price'), high=Max('price'), max_stock=Max('stock'),
+    )
+    for row in stats:
+        Cake.objects.filter(pk=row['cake_id']).update(
+            min_price=row['low'],
+            max_price=row['high'],
+            in_stock=bool(row['max_stock']),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0002_searchterm'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cake',
+            name='min_price',
+            field=models.DecimalField(blank=True, db_index=True, decimal_places=2, editable=False, max_digits=8, null=True),
+        ),
+        migrations.AddField(
+            model_name='cake',
+            name='max_price',
+            field=models.DecimalField(blank=True, db_index=True, decimal_places=2, editable=False, max_digits=8, null=True),
+        ),
+        migrations.AddField(
+            model_name='cake',
+            name='in_stock',
+            field=models.BooleanField(db_index=True, default=False, editable=False),
+        ),
+        migrations.RunPython(backfill_price_ranges, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_main_images(apps, schema_editor):
+    Cake = apps.get_model('products', 'Cake')
+    CakeImage = apps.get_model('products', 'CakeImage')
+    for image in CakeImage.objects.filter(is_main=True).order_by('id').iterator():
+        Cake.objects.filter(pk=image.cake_id).update(main_image=image)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0003_cake_price_range'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cake',
+            name='main_image',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='products.cakeimage'),
+        ),
+        migrations.RunPython(backfill_main_images, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+from django.db import migrations, models
+
+
+def build_category_paths(apps, schema_editor):
+    Category = apps.get_model('products', 'Category')
+    categories = {category.id: category for category in Category.objects.all()}
+
+    def path_of(category, seen=()):
+        if category.path:
+            return category.path
+        parent = categories.get(category.parent_id)
+        prefix = ''
+        if parent is not None and parent.id not in seen:
+            prefix = path_of(parent, seen + (category.id,))
+        category.path = f"{prefix}{category.id:08d}/"
+        return category.path
+
+    for category in categories.values():
+        path_of(category)
+    Category.objects.bulk_update(categories.values(), ['path'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0004_cake_main_image'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='path',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=255),
+        ),
+        migrations.RunPython(build_category_paths, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,59 @@
+from django.db import migrations, models
+from django.utils.text import slugify
+
+
+def split_cake_tags(apps, schema_editor):
+    Cake = apps.get_model('products', 'Cake')
+    Tag = apps.get_model('products', 'Tag')
+    Through = Cake.tag_set.through
+
+    cake_slugs = {}
+    names = {}
+    for cake_id, raw in Cake.objects.values_list('id', 'tags'):
+        slugs = []
+        for part in (raw or '').split(','):
+            name = ' '.join(part.split())[:50]
+            slug = slugify(name)[:60]
+            if slug and slug not in slugs:
+                slugs.append(slug)
+                names.setdefault(slug, name)
+        cake_slugs[cake_id] = slugs
+
+    Tag.objects.bulk_create([Tag(name=name, slug=slug) for slug, name in names.items()], batch_size=500)
+    tag_ids = dict(Tag.objects.values_list('slug', 'id'))
+    Through.objects.bulk_create([
+        Through(cake_id=cake_id, tag_id=tag_ids[slug])
+        for cake_id, slugs in cake_slugs.items()
+        for slug in slugs
+    ], batch_size=1000)
+
+
+def join_cake_tags(apps, schema_editor):
+    Cake = apps.get_model('products', 'Cake')
+    for cake in Cake.objects.prefetch_related('tag_set'):
+        cake.tags = ', '.join(tag.name for tag in cake.tag_set.all())[:500]
+        cake.save(update_fields=['tags'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_cakeimage_derivatives'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50)),
+                ('slug', models.SlugField(max_length=60, unique=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='cake',
+            name='tag_set',
+            field=models.ManyToManyField(blank=True, related_name='cakes', to='products.tag'),
+        ),
+        migrations.RunPython(split_cake_tags, join_cake_tags),
+    ]
@@ -0,0 +1,27 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0007_tag'),
+    ]
+
+    operations = [
+        # Give the old column a default first, so unapplying re-adds it to a
+        # table with rows; 0007's reverse then fills it from the Tag table
+        migrations.AlterField(
+            model_name='cake',
+            name='tags',
+            field=models.CharField(default='', help_text='Comma-separated tags', max_length=500),
+        ),
+        migrations.RemoveField(
+            model_name='cake',
+            name='tags',
+        ),
+        migrations.RenameField(
+            model_name='cake',
+            old_name='tag_set',
+            new_name='tags',
+        ),
+    ]
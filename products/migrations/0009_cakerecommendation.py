@@ -0,0 +1,25 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0008_replace_cake_tags'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CakeRecommendation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('cake', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recommendations', to='products.cake')),
+                ('recommended', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='products.cake')),
+            ],
+            options={
+                'unique_together': {('cake', 'rank')},
+            },
+        ),
+    ]
@@ -7,9 +7,88 @@ class Category(models.Model):
     parent = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True)
     description = models.TextField(blank=True)
     is_active = models.BooleanField(default=True)
+    # Materialized path of zero-padded ancestor ids, e.g. "00000001/00000004/"
+    path = models.CharField(max_length=255, db_index=True, editable=False, default='')
+    
+    PATH_STEP = 8
     
     def __str__(self):
         return self.name
+    
+    def clean(self):
+        from django.core.exceptions import ValidationError
+        if self.pk and self.parent_id:
+            parent_path = Category.objects.filter(pk=self.parent_id).values_list('path', flat=True).first() or ''
+            if self.parent_id == self.pk or (self.path and parent_path.startswith(self.path)):
+                raise ValidationError({'parent': "A category cannot be moved under itself or one of its sub-categories."})
+    
+    def save(self, *args, **kwargs):
+        from django.db import transaction
+        from django.db.models import Value
+        from django.db.models.functions import Concat, Substr
+        
+        old_path = self.path
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            parent_path = ''
+            if self.parent_id:
+                parent_path = Category.objects.filter(pk=self.parent_id).values_list('path', flat=True).first() or ''
+                if old_path and parent_path.startswith(old_path):
+                    raise ValueError("A category cannot be moved under itself or one of its sub-categories.")
+            new_path = f"{parent_path}{self.pk:0{self.PATH_STEP}d}/"
+            if new_path != old_path:
+                Category.objects.filter(pk=self.pk).update(path=new_path)
+                if old_path:
+                    # Re-root the whole subtree in one statement
+                    Category.objects.filter(path__startswith=old_path).exclude(pk=self.pk).update(
+                        path=Concat(Value(new_path), Substr('path', len(old_path) + 1))
+                    )
+                self.path = new_path
+        # The cached tree is dropped by the post_save receiver in products.signals
+    
+    @property
+    def depth(self):
+        return max(len(self.path) // (self.PATH_STEP + 1) - 1, 0)
+    
+    def get_descendants(self, include_self=True):
+        descendants = Category.objects.filter(path__startswith=self.path)
+        if not include_self:
+            descendants = descendants.exclude(pk=self.pk)
+        return descendants
+
+class Tag(models.Model):
+    name = models.CharField(max_length=50)
+    slug = models.SlugField(max_length=60, unique=True)
+    
+    def __str__(self):
+        return self.name
+    
+    @staticmethod
+    def normalize(name):
+        """Return (display name, slug) for a raw tag string."""
+        from django.utils.text import slugify
+        name = ' '.join(name.split())[:50]
+        return name, slugify(name)[:60]
+    
+    def save(self, *args, **kwargs):
+        if not self.slug:
+            self.name, self.slug = Tag.normalize(self.name)
+        super().save(*args, **kwargs)
+        from .cache import bump_version
+        bump_version('tags')
+
+class CakeQuerySet(models.QuerySet):
+    def for_listing(self):
+        """
+        Everything a cake card needs in a fixed number of queries: seller,
+        category and main image are joined in, the variants come from a
+        single prefetch (use `cake.variants.all.0` in templates, `.first`
+        would query again), and the price range is read from the
+        denormalized columns.
+        """
+        return self.select_related('seller', 'category', 'main_image').prefetch_related(
+            models.Prefetch('variants', queryset=CakeVariant.objects.order_by('id'))
+        )
 
 class Cake(models.Model):
     DIETARY_CHOICES = [
@@ -23,7 +102,7 @@ class Cake(models.Model):
     title = models.CharField(max_length=200)
     description = models.TextField()
     category = models.ForeignKey(Category, on_delete=models.CASCADE)
-    tags = models.CharField(max_length=500, help_text="Comma-separated tags")
+    tags = models.ManyToManyField(Tag, related_name='cakes', blank=True)
     flavor = models.CharField(max_length=100)
     dietary = models.CharField(max_length=10, choices=DIETARY_CHOICES)
     is_todays_special = models.BooleanField(default=False)
@@ -31,11 +110,58 @@ class Cake(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    # Denormalized from variants, kept current by CakeVariant.save/delete
+    min_price = models.DecimalField(max_digits=8, decimal_places=2, null=True, blank=True, db_index=True, editable=False)
+    max_price = models.DecimalField(max_digits=8, decimal_places=2, null=True, blank=True, db_index=True, editable=False)
+    in_stock = models.BooleanField(default=False, db_index=True, editable=False)
+    # Kept current by CakeImage.save; deleting the image clears it via SET_NULL
+    main_image = models.ForeignKey('CakeImage', on_delete=models.SET_NULL, null=True, blank=True,
+                                   related_name='+', editable=False)
+    
+    objects = CakeQuerySet.as_manager()
+    
     def __str__(self):
         return self.title
     
+    @classmethod
+    def refresh_price_range(cls, cake_id):
+        """
+        Recompute min/max price and stock flag of a cake from its variants.
+        Returns True when any of them changed, i.e. listings must refresh.
+        """
+        from django.db.models import Min, Max
+        from django.utils import timezone
+        
+        old = cls.objects.filter(pk=cake_id).values_list('min_price', 'max_price', 'in_stock').first()
+        stats = CakeVariant.objects.filter(cake_id=cake_id).aggregate(
+            min_price=Min('price'),
+            max_price=Max('price'),
+            max_stock=Max('stock'),
+        )
+        new = (stats['min_price'], stats['max_price'], bool(stats['max_stock']))
+        cls.objects.filter(pk=cake_id).update(
+            min_price=new[0],
+            max_price=new[1],
+            in_stock=new[2],
+            updated_at=timezone.now(),
+        )
+        return old != new
+    
+    def save(self, *args, **kwargs):
+        old_category_id = None
+        if self.pk:
+            old_category_id = Cake.objects.filter(pk=self.pk).values_list('category_id', flat=True).first()
+        super().save(*args, **kwargs)
+        # Keep the search index in step with the searchable fields
+        from .search import index_cake
+        from .cache import invalidate_cake
+        index_cake(self)
+        invalidate_cake(self.pk, {old_category_id, self.category_id}, listing_changed=True)
+    
+    # Deletes are invalidated by the post_delete receiver in products.signals
+    
     def get_main_image(self):
-        return self.images.filter(is_main=True).first()
+        return self.main_image
 
 class CakeVariant(models.Model):
     WEIGHT_CHOICES = [
@@ -55,6 +181,20 @@ class CakeVariant(models.Model):
     def __str__(self):
         return f"{self.cake.title} - {self.weight}kg"
     
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        listing_changed = Cake.refresh_price_range(self.cake_id)
+        from .cache import invalidate_cake_by_id
+        invalidate_cake_by_id(self.cake_id, listing_changed=listing_changed)
+    
+    def delete(self, *args, **kwargs):
+        cake_id = self.cake_id
+        result = super().delete(*args, **kwargs)
+        listing_changed = Cake.refresh_price_range(cake_id)
+        from .cache import invalidate_cake_by_id
+        invalidate_cake_by_id(cake_id, listing_changed=listing_changed)
+        return result
+    
     @property
     def is_in_stock(self):
         return self.stock > 0
@@ -64,9 +204,94 @@ class CakeImage(models.Model):
     image = models.ImageField(upload_to='products/')
     is_main = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Storage names of the resized copies, {name: {format: path}}; see products.images
+    derivatives = models.JSONField(default=dict, blank=True, editable=False)
     
     def save(self, *args, **kwargs):
         if self.is_main:
             # Ensure only one main image per cake
             CakeImage.objects.filter(cake=self.cake, is_main=True).update(is_main=False)
+        old_name = None
+        if self.pk:
+            old_name = CakeImage.objects.filter(pk=self.pk).values_list('image', flat=True).first()
+        image_changed = old_name != self.image.name
+        if image_changed and self.derivatives:
+            from .images import delete_derivatives
+            delete_derivatives(self.derivatives)
+            self.derivatives = {}
         super().save(*args, **kwargs)
+        from django.utils import timezone
+        if self.is_main:
+            Cake.objects.filter(pk=self.cake_id).update(main_image=self, updated_at=timezone.now())
+        else:
+            Cake.objects.filter(pk=self.cake_id, main_image=self).update(main_image=None, updated_at=timezone.now())
+        from .cache import invalidate_cake_by_id
+        invalidate_cake_by_id(self.cake_id)
+        if image_changed and self.image:
+            from .images import schedule_derivatives
+            schedule_derivatives(self.pk)
+    
+    def delete(self, *args, **kwargs):
+        cake_id = self.cake_id
+        derivatives = self.derivatives
+        result = super().delete(*args, **kwargs)
+        from .images import delete_derivatives
+        from .cache import invalidate_cake_by_id
+        delete_derivatives(derivatives)
+        invalidate_cake_by_id(cake_id)
+        return result
+    
+    def derivative_url(self, name, fmt='jpeg'):
+        """URL of a resized copy, falling back to the original upload until it exists."""
+        path = (self.derivatives or {}).get(name, {}).get(fmt)
+        if path:
+            from django.core.files.storage import default_storage
+            return default_storage.url(path)
+        if fmt == 'jpeg' and self.image:
+            return self.image.url
+        return None
+    
+    @property
+    def thumb_url(self):
+        return self.derivative_url('thumb')
+    
+    @property
+    def card_url(self):
+        return self.derivative_url('card')
+    
+    @property
+    def card_webp_url(self):
+        return self.derivative_url('card', 'webp')
+    
+    @property
+    def large_url(self):
+        return self.derivative_url('large')
+    
+    @property
+    def large_webp_url(self):
+        return self.derivative_url('large', 'webp')
+
+class SearchTerm(models.Model):
+    """Inverted index entry: one normalized term of a cake and its weight."""
+    cake = models.ForeignKey(Cake, on_delete=models.CASCADE, related_name='search_terms')
+    term = models.CharField(max_length=64)
+    weight = models.PositiveSmallIntegerField(default=1)
+    
+    class Meta:
+        unique_together = ['term', 'cake']
+    
+    def __str__(self):
+        return f"{self.term} -> {self.cake_id} ({self.weight})"
+
+class CakeRecommendation(models.Model):
+    """Top-N co-purchased cakes per cake, rebuilt by `manage.py build_recommendations`."""
+    cake = models.ForeignKey(Cake, on_delete=models.CASCADE, related_name='recommendations')
+    recommended = models.ForeignKey(Cake, on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField()
+    rank = models.PositiveSmallIntegerField()
+    
+    class Meta:
+        unique_together = ['cake', 'rank']
+    
+    def __str__(self):
+        return f"{self.cake_id} -> {self.recommended_id} ({self.score:.3f})"
@@ -0,0 +1,88 @@
+# products/recommendations.py
+import numpy as np
+from django.db import transaction
+from scipy import sparse
+
+DEFAULT_TOP_N = 8
+
+
+def co_purchase_neighbours(pairs, top_n=DEFAULT_TOP_N):
+    """
+    Compute the top-N co-purchased cakes of every cake.
+
+    `pairs` is an (n, 2) integer array of distinct (order_id, cake_id) rows.
+    The order x cake incidence matrix X and the co-occurrence matrix
+    C = X.T @ X are kept sparse, so memory follows the number of cake pairs
+    actually bought together rather than the square of the catalogue.
+    Scores are cosine similarities C[i, j] / sqrt(C[i, i] * C[j, j]), so
+    cakes that are simply popular do not dominate every list.
+
+    Returns (cake_ids, neighbour_ids, scores): for cake_ids[i],
+    neighbour_ids[i] and scores[i] hold up to top_n neighbours, best first,
+    padded with -1 / 0.0.
+    """
+    pairs = np.asarray(pairs, dtype=np.int64).reshape(-1, 2)
+    if len(pairs) == 0:
+        return np.empty(0, np.int64), np.empty((0, top_n), np.int64), np.empty((0, top_n), np.float32)
+
+    order_ids, order_index = np.unique(pairs[:, 0], return_inverse=True)
+    cake_ids, cake_index = np.unique(pairs[:, 1], return_inverse=True)
+    n_cakes = len(cake_ids)
+
+    incidence = sparse.csr_matrix(
+        (np.ones(len(pairs), dtype=np.float32), (order_index, cake_index)),
+        shape=(len(order_ids), n_cakes),
+    )
+    co = (incidence.T @ incidence).tocoo()
+    purchases = np.zeros(n_cakes, dtype=np.float32)
+    diagonal = co.row == co.col
+    purchases[co.row[diagonal]] = co.data[diagonal]
+
+    rows, cols = co.row[~diagonal], co.col[~diagonal]
+    scores = co.data[~diagonal] / np.sqrt(purchases[rows] * purchases[cols])
+
+    # Sort every cake's neighbours best first, then keep the first k of each row
+    order = np.lexsort((cols, -scores, rows))
+    rows, cols, scores = rows[order], cols[order], scores[order]
+    row_start = np.searchsorted(rows, np.arange(n_cakes))
+    rank = np.arange(len(rows)) - row_start[rows]
+    keep = rank < top_n
+
+    neighbour_ids = np.full((n_cakes, top_n), -1, dtype=np.int64)
+    neighbour_scores = np.zeros((n_cakes, top_n), dtype=np.float32)
+    neighbour_ids[rows[keep], rank[keep]] = cake_ids[cols[keep]]
+    neighbour_scores[rows[keep], rank[keep]] = scores[keep]
+    return cake_ids, neighbour_ids, neighbour_scores
+
+
+def load_purchase_pairs():
+    """Distinct (order_id, cake_id) rows of every order that was not cancelled."""
+    from orders.models import OrderItem
+
+    rows = (
+        OrderItem.objects.exclude(order__status='cancelled')
+        .values_list('order_id', 'variant__cake_id')
+        .distinct()
+    )
+    return np.fromiter(
+        (value for row in rows.iterator(chunk_size=5000) for value in row), dtype=np.int64,
+    ).reshape(-1, 2)
+
+
+def rebuild_recommendations(top_n=DEFAULT_TOP_N):
+    """Recompute and replace the whole CakeRecommendation table."""
+    from .models import CakeRecommendation
+    from .cache import bump_version
+
+    cake_ids, neighbour_ids, scores = co_purchase_neighbours(load_purchase_pairs(), top_n)
+    rows = [
+        CakeRecommendation(cake_id=int(cake_id), recommended_id=int(neighbour), score=float(score), rank=rank)
+        for cake_id, neighbours, row_scores in zip(cake_ids, neighbour_ids, scores)
+        for rank, (neighbour, score) in enumerate(zip(neighbours, row_scores))
+        if neighbour >= 0
+    ]
+    with transaction.atomic():
+        CakeRecommendation.objects.all().delete()
+        CakeRecommendation.objects.bulk_create(rows, batch_size=1000)
+    bump_version('recommendations')
+    return len(cake_ids), len(rows)
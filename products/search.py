@@ -0,0 +1,97 @@
+# products/search.py
+import re
+
+from django.db import transaction
+from django.db.models import Exists, Q, Sum, OuterRef, Subquery, Value, IntegerField
+
+# Relative weight of a term depending on which field it came from
+FIELD_WEIGHTS = {
+    'title': 8,
+    'tags': 4,
+    'flavor': 4,
+    'description': 1,
+}
+
+STOP_WORDS = {'a', 'an', 'and', 'the', 'of', 'with', 'for', 'in', 'on', 'to'}
+MAX_TERM_LENGTH = 64
+MAX_QUERY_TERMS = 8
+
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+
+def tokenize(text):
+    """
+    Split text into lowercase alphanumeric terms, dropping stop words
+    and single characters.
+    """
+    if not text:
+        return []
+    return [
+        token[:MAX_TERM_LENGTH]
+        for token in _TOKEN_RE.findall(text.lower())
+        if len(token) > 1 and token not in STOP_WORDS
+    ]
+
+
+def build_terms(cake):
+    """
+    Return {term: weight} for a cake. Works on model instances as well as
+    historical models inside migrations, it only reads plain attributes.
+    """
+    terms = {}
+    for field, weight in FIELD_WEIGHTS.items():
+        value = getattr(cake, field, '')
+        if hasattr(value, 'all'):
+            # Many-to-many tags: index the tag names
+            value = ' '.join(tag.name for tag in value.all()) if cake.pk else ''
+        for token in tokenize(value):
+            terms[token] = terms.get(token, 0) + weight
+    return terms
+
+
+def index_cake(cake, term_model=None):
+    """
+    Replace the index entries of one cake. Deleting a cake removes its
+    entries through the cascade on SearchTerm.cake.
+    """
+    if term_model is None:
+        from .models import SearchTerm as term_model
+
+    rows = [
+        term_model(cake_id=cake.pk, term=term, weight=min(weight, 32767))
+        for term, weight in build_terms(cake).items()
+    ]
+    with transaction.atomic():
+        term_model.objects.filter(cake_id=cake.pk).delete()
+        term_model.objects.bulk_create(rows)
+    return len(rows)
+
+
+def search_cakes(queryset, query):
+    """
+    Restrict a Cake queryset to cakes matching the query and annotate each
+    with `search_rank`. Every query word is matched as a term prefix so
+    results update while the shopper types, and a cake must match every
+    word, so adding a word narrows the results. The rank is the summed
+    weight of the matching terms. Ordering is left to the caller.
+    """
+    from .models import SearchTerm
+
+    words = list(dict.fromkeys(tokenize(query)))[:MAX_QUERY_TERMS]
+    if not words:
+        return queryset.none().annotate(search_rank=Value(0, output_field=IntegerField()))
+
+    match = Q()
+    for word in words:
+        match |= Q(term__startswith=word)
+        queryset = queryset.filter(
+            Exists(SearchTerm.objects.filter(cake_id=OuterRef('pk'), term__startswith=word))
+        )
+
+    rank = (
+        SearchTerm.objects.filter(match, cake_id=OuterRef('pk'))
+        .values('cake_id')
+        .annotate(rank=Sum('weight'))
+        .values('rank')
+    )
+    return queryset.annotate(search_rank=Subquery(rank, output_field=IntegerField()))
@@ -0,0 +1,38 @@
+# products/serializers.py
+from rest_framework import serializers
+
+from .models import Cake, CakeImage, CakeVariant
+
+
+class CakeVariantSerializer(serializers.ModelSerializer):
+    # No stock figures: the serialized cake is cached per updated_at, which
+    # checkouts do not touch. The API adds a live `in_stock` per variant.
+
+    class Meta:
+        model = CakeVariant
+        fields = ['id', 'weight', 'price']
+
+
+class CakeImageSerializer(serializers.ModelSerializer):
+    url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = CakeImage
+        fields = ['id', 'is_main', 'url', 'thumb_url', 'card_url', 'card_webp_url', 'large_url', 'large_webp_url']
+
+    def get_url(self, obj):
+        return obj.image.url if obj.image else None
+
+
+class CakeSerializer(serializers.ModelSerializer):
+    tags = serializers.SlugRelatedField(many=True, read_only=True, slug_field='slug')
+    variants = CakeVariantSerializer(many=True, read_only=True)
+    images = CakeImageSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = Cake
+        fields = [
+            'id', 'title', 'description', 'category', 'tags', 'flavor', 'dietary',
+            'is_todays_special', 'min_price', 'max_price', 'in_stock',
+            'variants', 'images', 'created_at', 'updated_at',
+        ]
@@ -0,0 +1,72 @@
+# products/signals.py
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Cake, Category
+
+
+@receiver(m2m_changed, sender=Cake.tags.through)
+def cake_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Cake.save cannot see tag changes (the admin saves many-to-many data
+    afterwards), so re-index and invalidate once the relation settles.
+    """
+    if action == 'pre_clear' and reverse:
+        # pk_set is empty for clear(), remember which cakes lose the tag
+        instance._cleared_cake_ids = list(instance.cakes.values_list('pk', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if action == 'post_clear' and reverse:
+        pk_set = getattr(instance, '_cleared_cake_ids', ())
+
+    from django.utils import timezone
+    from .search import index_cake
+    from .cache import bump_version, invalidate_cake
+
+    if reverse:
+        cakes = list(Cake.objects.filter(pk__in=pk_set or ()))
+    else:
+        cakes = [instance]
+    # The API versions cakes by updated_at, which save() did not see change
+    Cake.objects.filter(pk__in=[cake.pk for cake in cakes]).update(updated_at=timezone.now())
+    for cake in cakes:
+        index_cake(cake)
+        # Tags are searchable, and searched facet counts are catalog-wide entries
+        invalidate_cake(cake.pk, [cake.category_id], listing_changed=True)
+    bump_version('tags')
+
+
+@receiver(post_delete, sender=Cake)
+def cake_deleted(sender, instance, **kwargs):
+    """
+    Drop the pages showing a deleted cake. A receiver rather than a
+    Cake.delete() override, so the admin's bulk delete, queryset deletes
+    and cascades from a category or seller are covered too.
+    """
+    from .cache import invalidate_cake
+
+    invalidate_cake(instance.pk, [instance.category_id], listing_changed=True)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def category_changed(sender, instance, **kwargs):
+    """
+    Drop the cached category tree and the pages listing categories. As a
+    receiver this also covers queryset and cascade deletes, which skip
+    Category.delete(). Deferred to commit because Category.save() rewrites
+    the subtree's paths after post_save, in the same transaction.
+    """
+    from .categories import invalidate_category_tree
+    from .cache import bump_version, invalidate_categories
+
+    category_id = instance.pk
+
+    def invalidate():
+        invalidate_category_tree()
+        invalidate_categories()
+        bump_version(f'category:{category_id}')
+
+    transaction.on_commit(invalidate)
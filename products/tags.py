@@ -0,0 +1,24 @@
+# products/tags.py
+from django.db.models import Count, Q
+
+from .cache import get_or_build
+
+TAG_CLOUD_SIZE = 40
+
+
+def tag_cloud(limit=TAG_CLOUD_SIZE):
+    """
+    Most used tags with their number of active cakes, for the tag cloud.
+    Cached until a tag or any cake changes.
+    """
+    def build():
+        from .models import Tag
+
+        tags = (
+            Tag.objects.annotate(count=Count('cakes', filter=Q(cakes__is_active=True)))
+            .filter(count__gt=0)
+            .order_by('-count', 'name')[:limit]
+        )
+        return [{'name': tag.name, 'slug': tag.slug, 'count': tag.count} for tag in tags]
+
+    return get_or_build(f'tag_cloud:{limit}', ['tags', 'catalog'], build)
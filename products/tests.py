@@ -1,3 +1,501 @@
+import csv
+import json
+import os
+import tempfile
+from decimal import Decimal
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from accounts.models import User
+from orders.inventory import reserve_order_stock
+from orders.tests import ShopFixtures
+from .cache import get_versions
+from .catalog_io import CATALOG_FIELDS
+from .categories import active_category_nav, category_descendant_ids, get_category_tree, rollup_category_counts
+from .facets import compute_facets, price_bucket_bounds
+from .models import Cake, CakeImage, CakeVariant, Category, SearchTerm, Tag
+from .search import build_terms, index_cake, search_cakes, tokenize
+
+
+class CatalogFixtures:
+    """A seller and a category to hang test cakes on."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user(
+            email='seller@example.com', username='seller', password='x', role='seller',
+        )
+        cls.category = Category.objects.create(name='Birthday')
+
+    def setUp(self):
+        # Cached pages and versions would outlive the rolled back rows
+        cache.clear()
+
+    def make_cake(self, title, prices=(Decimal('500.00'),), stock=5, **fields):
+        fields.setdefault('category', self.category)
+        fields.setdefault('description', '')
+        fields.setdefault('flavor', 'Vanilla')
+        fields.setdefault('dietary', 'veg')
+        cake = Cake.objects.create(seller=self.seller, title=title, **fields)
+        for weight, price in zip(('0.5', '1', '2'), prices):
+            CakeVariant.objects.create(cake=cake, weight=weight, price=price, stock=stock)
+        return Cake.objects.get(pk=cake.pk)
+
+
+class TokenizeTests(TestCase):
+    def test_lowercases_and_splits_on_punctuation(self):
+        self.assertEqual(tokenize("Dark-Chocolate Truffle, 2KG!"), ['dark', 'chocolate', 'truffle', '2kg'])
+
+    def test_drops_stop_words_and_single_characters(self):
+        self.assertEqual(tokenize("A cake with a cherry on the top x"), ['cake', 'cherry', 'top'])
+
+    def test_empty(self):
+        self.assertEqual(tokenize(''), [])
+        self.assertEqual(tokenize(None), [])
+
+
+class SearchIndexTests(CatalogFixtures, TestCase):
+    def terms(self, cake):
+        return dict(SearchTerm.objects.filter(cake=cake).values_list('term', 'weight'))
+
+    def test_index_weights_fields(self):
+        cake = self.make_cake('Chocolate Truffle', description='Rich chocolate sponge', flavor='Chocolate')
+        terms = self.terms(cake)
+        # title 8 + flavor 4 + description 1
+        self.assertEqual(terms['chocolate'], 13)
+        self.assertEqual(terms['truffle'], 8)
+        self.assertEqual(terms['sponge'], 1)
+        self.assertEqual(terms, build_terms(cake))
+
+    def test_reindex_replaces_terms(self):
+        cake = self.make_cake('Chocolate Truffle')
+        Cake.objects.filter(pk=cake.pk).update(title='Lemon Drizzle')
+        cake.refresh_from_db()
+        index_cake(cake)
+        terms = self.terms(cake)
+        self.assertIn('lemon', terms)
+        self.assertNotIn('truffle', terms)
+
+    def test_tag_change_reindexes(self):
+        cake = self.make_cake('Truffle')
+        tag = Tag.objects.create(name='Gluten Free')
+        cake.tags.add(tag)
+        self.assertEqual(self.terms(cake)['gluten'], 4)
+        cake.tags.remove(tag)
+        self.assertNotIn('gluten', self.terms(cake))
+
+    def test_clearing_a_tag_reindexes(self):
+        cake = self.make_cake('Truffle')
+        tag = Tag.objects.create(name='Eggless')
+        cake.tags.add(tag)
+        tag.cakes.clear()
+        self.assertNotIn('eggless', self.terms(cake))
+
+
+class SearchCakesTests(CatalogFixtures, TestCase):
+    def search(self, query):
+        return list(
+            search_cakes(Cake.objects.all(), query).order_by('-search_rank', 'id').values_list('title', flat=True)
+        )
+
+    def test_title_match_outranks_description_match(self):
+        self.make_cake('Vanilla Sponge', description='Topped with chocolate shavings')
+        self.make_cake('Chocolate Truffle')
+        self.assertEqual(self.search('chocolate'), ['Chocolate Truffle', 'Vanilla Sponge'])
+
+    def test_prefix_match(self):
+        self.make_cake('Chocolate Truffle')
+        self.assertEqual(self.search('choc'), ['Chocolate Truffle'])
+
+    def test_every_word_must_match(self):
+        self.make_cake('Chocolate Truffle', dietary='veg')
+        self.make_cake('Chocolate Vegan Delight', dietary='vegan')
+        self.assertEqual(len(self.search('chocolate')), 2)
+        self.assertEqual(self.search('chocolate vegan'), ['Chocolate Vegan Delight'])
+
+    def test_rank_sums_matching_terms(self):
+        self.make_cake('Chocolate Truffle')
+        cake = search_cakes(Cake.objects.all(), 'chocolate truffle').get()
+        self.assertEqual(cake.search_rank, 16)
+
+    def test_query_without_terms_matches_nothing(self):
+        self.make_cake('Chocolate Truffle')
+        self.assertEqual(self.search('the a'), [])
+
+
+class PriceRangeTests(CatalogFixtures, TestCase):
+    def listed(self, **params):
+        response = self.client.get(reverse('cake_list'), params)
+        return {cake.title for cake in response.context['page_obj'].object_list}
+
+    def test_range_keeps_its_meaning(self):
+        self.make_cake('Spans the range', prices=(Decimal('400.00'), Decimal('2000.00')))
+        self.make_cake('Inside the range', prices=(Decimal('750.00'),))
+        self.assertEqual(self.listed(min_price='500', max_price='1000'), {'Inside the range'})
+        self.assertEqual(self.listed(min_price='1500'), {'Spans the range'})
+        self.assertEqual(self.listed(max_price='450'), {'Spans the range'})
+
+    def test_variant_save_refreshes_price_range(self):
+        cake = self.make_cake('Truffle', prices=(Decimal('500.00'), Decimal('900.00')), stock=0)
+        self.assertEqual((cake.min_price, cake.max_price, cake.in_stock), (Decimal('500.00'), Decimal('900.00'), False))
+
+        variant = cake.variants.get(weight='1')
+        variant.price = Decimal('1200.00')
+        variant.stock = 2
+        variant.save()
+        cake.refresh_from_db()
+        self.assertEqual((cake.min_price, cake.max_price, cake.in_stock), (Decimal('500.00'), Decimal('1200.00'), True))
+
+    def test_variant_delete_refreshes_price_range(self):
+        cake = self.make_cake('Truffle', prices=(Decimal('500.00'), Decimal('900.00')))
+        cake.variants.get(weight='0.5').delete()
+        cake.refresh_from_db()
+        self.assertEqual((cake.min_price, cake.max_price), (Decimal('900.00'), Decimal('900.00')))
+
+        cake.variants.get().delete()
+        cake.refresh_from_db()
+        self.assertEqual((cake.min_price, cake.max_price, cake.in_stock), (None, None, False))
+
+
+class FacetTests(CatalogFixtures, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.cakes_category = Category.objects.create(name='Cakes')
+        self.cupcakes = Category.objects.create(name='Cupcakes', parent=self.cakes_category)
+        self.make_cake('Chocolate Truffle', flavor='Chocolate', dietary='veg', category=self.cakes_category)
+        self.make_cake('Chocolate Cupcake', flavor='Chocolate', dietary='vegan', category=self.cupcakes,
+                       prices=(Decimal('300.00'),))
+        self.make_cake('Lemon Cupcake', flavor='Lemon', dietary='vegan', category=self.cupcakes,
+                       prices=(Decimal('1500.00'),))
+        self.make_cake('Vanilla Sponge', dietary='veg')
+
+    def filtered(self, **selected):
+        cakes = Cake.objects.filter(is_active=True)
+        if selected.get('category'):
+            cakes = cakes.filter(category_id__in=selected['category'])
+        if selected.get('dietary'):
+            cakes = cakes.filter(dietary=selected['dietary'])
+        if selected.get('flavor'):
+            cakes = cakes.filter(flavor=selected['flavor'])
+        if selected.get('price') is not None:
+            low, high = price_bucket_bounds(selected['price'])
+            if low is not None:
+                cakes = cakes.filter(min_price__gte=low)
+            if high is not None:
+                cakes = cakes.filter(min_price__lt=high)
+        return cakes
+
+    def test_counts_match_filtered_queryset(self):
+        for selected in ({}, {'flavor': 'Chocolate'}, {'dietary': 'vegan'}, {'flavor': 'Chocolate', 'price': 0}):
+            counts = compute_facets(Cake.objects.filter(is_active=True), selected)
+            others = {name: value for name, value in selected.items() if name != 'dietary'}
+            for dietary, _ in Cake.DIETARY_CHOICES:
+                self.assertEqual(counts['dietary'].get(dietary, 0),
+                                 self.filtered(dietary=dietary, **others).count(), (selected, dietary))
+            others = {name: value for name, value in selected.items() if name != 'flavor'}
+            for flavor in ('Chocolate', 'Lemon', 'Vanilla'):
+                self.assertEqual(counts['flavor'].get(flavor, 0),
+                                 self.filtered(flavor=flavor, **others).count(), (selected, flavor))
+
+    def test_selected_facet_does_not_narrow_its_own_counts(self):
+        counts = compute_facets(Cake.objects.filter(is_active=True), {'dietary': 'vegan'})
+        self.assertEqual(dict(counts['dietary']), {'veg': 2, 'vegan': 2})
+        self.assertEqual(dict(counts['flavor']), {'Chocolate': 1, 'Lemon': 1})
+
+    def test_category_rollup_includes_sub_categories(self):
+        counts = compute_facets(Cake.objects.filter(is_active=True), {})
+        totals = rollup_category_counts(counts['category'])
+        self.assertEqual(totals[self.cupcakes.pk], 2)
+        self.assertEqual(totals[self.cakes_category.pk], 3)
+        self.assertEqual(totals[self.category.pk], 1)
+        for category in (self.cupcakes, self.cakes_category, self.category):
+            ids = category_descendant_ids(category.pk)
+            self.assertEqual(totals[category.pk], self.filtered(category=ids).count())
+
+    def test_cached_counts_refresh_on_catalog_change(self):
+        def vegan_count():
+            response = self.client.get(reverse('cake_list'))
+            dietary = dict(response.context['facets'])['Dietary']
+            return next(option['count'] for option in dietary if option['value'] == 'vegan')
+
+        self.assertEqual(vegan_count(), 2)
+        self.make_cake('Vegan Brownie', dietary='vegan')
+        self.assertEqual(vegan_count(), 3)
+        Cake.objects.get(title='Vegan Brownie').delete()
+        self.assertEqual(vegan_count(), 2)
+
+
+class ListingQueryTests(CatalogFixtures, TestCase):
+    def add_cakes(self, count):
+        for i in range(count):
+            cake = self.make_cake(f'Cake {Cake.objects.count()} {i}', prices=(Decimal('500.00'), Decimal('800.00')))
+            image, = CakeImage.objects.bulk_create([CakeImage(cake=cake, image='products/cake.jpg', is_main=True)])
+            Cake.objects.filter(pk=cake.pk).update(main_image=image)
+
+    def listing_queries(self):
+        url = reverse('cake_list')
+        self.client.get(url)  # warm the facet, tag cloud and category caches
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_for_listing_fixed_queries(self):
+        self.add_cakes(3)
+        with self.assertNumQueries(2):
+            for cake in Cake.objects.for_listing():
+                (cake.seller.username, cake.category.name, cake.main_image.image.name,
+                 cake.min_price, [variant.price for variant in cake.variants.all()])
+
+    def test_listing_page_query_count_does_not_grow(self):
+        self.add_cakes(2)
+        few = self.listing_queries()
+        self.add_cakes(4)
+        self.assertEqual(self.listing_queries(), few)
+
+
+class CategoryTreeTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.root = Category.objects.create(name='Cakes')
+        self.child = Category.objects.create(name='Cupcakes', parent=self.root)
+        self.grandchild = Category.objects.create(name='Mini', parent=self.child)
+        self.other = Category.objects.create(name='Pastries')
+
+    def path(self, *categories):
+        return ''.join(f'{category.pk:08d}/' for category in categories)
+
+    def stored_path(self, category):
+        return Category.objects.values_list('path', flat=True).get(pk=category.pk)
+
+    def test_paths_follow_ancestors(self):
+        self.assertEqual(self.stored_path(self.root), self.path(self.root))
+        self.assertEqual(self.stored_path(self.grandchild), self.path(self.root, self.child, self.grandchild))
+        self.assertEqual(self.grandchild.depth, 2)
+
+    def test_moving_a_category_re_roots_its_subtree(self):
+        self.child.parent = self.other
+        self.child.save()
+        self.assertEqual(self.stored_path(self.child), self.path(self.other, self.child))
+        self.assertEqual(self.stored_path(self.grandchild), self.path(self.other, self.child, self.grandchild))
+        self.assertEqual(set(self.other.get_descendants().values_list('pk', flat=True)),
+                         {self.other.pk, self.child.pk, self.grandchild.pk})
+
+        self.child.parent = None
+        self.child.save()
+        self.assertEqual(self.stored_path(self.grandchild), self.path(self.child, self.grandchild))
+
+    def test_cannot_move_under_own_descendant(self):
+        self.root.parent = self.grandchild
+        with self.assertRaises(ValidationError):
+            self.root.full_clean()
+        with self.assertRaises(ValueError):
+            self.root.save()
+        self.assertEqual(self.stored_path(self.grandchild), self.path(self.root, self.child, self.grandchild))
+
+    def test_tree_dropped_on_queryset_delete(self):
+        self.assertEqual(category_descendant_ids(self.root.pk), {self.root.pk, self.child.pk, self.grandchild.pk})
+        with self.captureOnCommitCallbacks(execute=True):
+            # Bypasses Category.delete(), as the admin's "delete selected" does
+            Category.objects.filter(pk=self.child.pk).delete()
+        self.assertEqual(category_descendant_ids(self.root.pk), {self.root.pk})
+        self.assertIsNone(category_descendant_ids(self.grandchild.pk))
+        self.assertNotIn(self.child.pk, [node['id'] for node in active_category_nav()])
+
+    def test_tree_dropped_on_save(self):
+        self.assertIn(self.other.pk, get_category_tree()['nodes'])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.other.is_active = False
+            self.other.save()
+        self.assertNotIn(self.other.pk, [node['id'] for node in active_category_nav()])
+
+
+class CakeCacheTests(CatalogFixtures, TestCase):
+    def test_queryset_delete_bumps_versions(self):
+        cake = self.make_cake('Truffle')
+        names = (f'cake:{cake.pk}', f'category:{self.category.pk}', 'catalog', 'home')
+        before = get_versions(*names)
+        # Bypasses Cake.delete(), as the admin's "delete selected" does
+        Cake.objects.filter(pk=cake.pk).delete()
+        after = get_versions(*names)
+        for name, old, new in zip(names, before, after):
+            self.assertNotEqual(old, new, name)
+
+    def test_cascade_delete_bumps_versions(self):
+        cake = self.make_cake('Truffle')
+        before, = get_versions(f'cake:{cake.pk}')
+        self.category.delete()
+        self.assertNotEqual(get_versions(f'cake:{cake.pk}'), [before])
+
+    def test_cached_home_page_makes_no_queries(self):
+        cake = self.make_cake('Truffle', is_todays_special=True)
+        url = reverse('home')
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertIn(cake, response.context['todays_special_cakes'])
+
+        Cake.objects.filter(pk=cake.pk).delete()
+        response = self.client.get(url)
+        self.assertEqual(response.context['todays_special_cakes'], [])
+        self.assertEqual(response.context['latest_cakes'], [])
+
+
+class CakeApiTests(ShopFixtures, TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.url = reverse('api_cake_detail', args=[self.cake.pk])
+
+    def test_variants_show_available_stock_only(self):
+        variant, = self.client.get(self.url).json()['variants']
+        self.assertEqual(variant, {'id': self.variant.pk, 'weight': '1', 'price': '500.00', 'in_stock': True})
+
+        reserve_order_stock(self.make_order(quantity=3))
+        variant, = self.client.get(self.url).json()['variants']
+        self.assertFalse(variant['in_stock'])
+        variant, = self.client.get(reverse('api_cake_variants', args=[self.cake.pk])).json()
+        self.assertFalse(variant['in_stock'])
+
+    def test_matching_etag_gets_304(self):
+        response = self.client.get(self.url)
+        etag = response['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_etag_changes_with_availability(self):
+        etag = self.client.get(self.url)['ETag']
+        reserve_order_stock(self.make_order(quantity=3))
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_etag_changes_when_cake_is_edited(self):
+        etag = self.client.get(self.url)['ETag']
+        self.cake.title = 'Dark truffle'
+        self.cake.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['title'], 'Dark truffle')
+
+
+class CatalogImportExportTests(CatalogFixtures, TestCase):
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def row(self, **fields):
+        row = {'seller': 'seller@example.com', 'title': 'Truffle', 'description': '', 'category': 'Birthday',
+               'flavor': 'Chocolate', 'dietary': 'veg', 'tags': '', 'is_active': 'true',
+               'is_todays_special': 'false', 'weight': '1', 'price': '500', 'stock': '3', 'images': ''}
+        row.update(fields)
+        return row
+
+    def write_csv(self, rows, name='catalog.csv'):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w', newline='', encoding='utf-8') as file:
+            writer = csv.DictWriter(file, fieldnames=CATALOG_FIELDS)
+            writer.writeheader()
+            writer.writerows(rows)
+        return path
+
+    def import_catalog(self, path, *args):
+        stdout, stderr = StringIO(), StringIO()
+        call_command('import_catalog', path, *args, stdout=stdout, stderr=stderr)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def export_catalog(self, fmt='csv'):
+        path = os.path.join(self.directory, f'export.{fmt}')
+        call_command('export_catalog', '--format', fmt, '--output', path, stderr=StringIO())
+        with open(path, newline='', encoding='utf-8') as file:
+            if fmt == 'csv':
+                return list(csv.DictReader(file))
+            return [json.loads(line) for line in file]
+
+    def test_round_trip(self):
+        cake = self.make_cake('Truffle', prices=(Decimal('450.00'), Decimal('800.00')), stock=4,
+                              description='Dark, rich', dietary='eggless', is_todays_special=True)
+        cake.tags.add(Tag.objects.create(name='Chocolate'), Tag.objects.create(name='Party'))
+        self.make_cake('Red velvet')
+        exported = self.export_catalog()
+        self.assertEqual(len(exported), 3)
+
+        Cake.objects.all().delete()
+        path = self.write_csv(exported, 'reimport.csv')
+        _, stderr = self.import_catalog(path)
+        self.assertEqual(stderr, '')
+        self.assertEqual(self.export_catalog(), exported)
+
+        cake = Cake.objects.get(title='Truffle')
+        self.assertEqual((cake.min_price, cake.max_price), (Decimal('450.00'), Decimal('800.00')))
+        self.assertTrue(cake.in_stock)
+        self.assertEqual(set(search_cakes(Cake.objects.all(), 'party truffle')), {cake})
+
+    def test_jsonl_export_imports(self):
+        self.make_cake('Truffle', prices=(Decimal('450.00'), Decimal('800.00')))
+        exported = self.export_catalog('jsonl')
+        Cake.objects.all().delete()
+        path = os.path.join(self.directory, 'catalog.jsonl')
+        with open(path, 'w', encoding='utf-8') as file:
+            file.writelines(json.dumps(row) + '\n' for row in exported)
+        self.import_catalog(path)
+        self.assertEqual(self.export_catalog('jsonl'), exported)
+
+    def test_bad_rows_reported_and_skipped(self):
+        path = self.write_csv([
+            self.row(),
+            self.row(title='Ghost', seller='nobody@example.com'),
+            self.row(title='Odd', weight='3'),
+            self.row(title='Free', price='abc'),
+            self.row(title='Negative', stock='-1'),
+            self.row(title='Plain', category=''),
+            self.row(title='Pineapple', dietary='vegan'),
+        ])
+        stdout, stderr = self.import_catalog(path)
+        self.assertEqual(stderr.splitlines(), [
+            "line 3: unknown seller 'nobody@example.com'",
+            "line 4: weight must be one of 0.5, 1, 2",
+            "line 5: invalid price 'abc'",
+            "line 6: stock cannot be negative",
+            "line 7: missing category",
+        ])
+        self.assertIn('errors: 5', stdout)
+        self.assertEqual(set(Cake.objects.values_list('title', flat=True)), {'Truffle', 'Pineapple'})
+
+    def test_dry_run_saves_nothing(self):
+        path = self.write_csv([self.row(tags='Party'), self.row(weight='2', price='900')])
+        stdout, _ = self.import_catalog(path, '--dry-run')
+        self.assertIn('Dry run, nothing saved.', stdout)
+        self.assertIn('cakes created: 1', stdout)
+        self.assertIn('variants created: 2', stdout)
+        self.assertFalse(Cake.objects.exists())
+        self.assertFalse(CakeVariant.objects.exists())
+        self.assertFalse(Tag.objects.exists())
+
+    def test_reimport_updates_variants_and_replaces_tags(self):
+        self.import_catalog(self.write_csv([self.row(tags='Party, Chocolate')]))
+        cake = Cake.objects.get()
+        self.assertEqual(set(cake.tags.values_list('slug', flat=True)), {'party', 'chocolate'})
 
-# Create your tests here.
+        stdout, _ = self.import_catalog(self.write_csv([
+            self.row(tags='Anniversary', price='550', stock='0'),
+            self.row(tags='Anniversary', weight='2', price='900'),
+        ]))
+        self.assertIn('cakes updated: 1', stdout)
+        self.assertIn('variants updated: 1', stdout)
+        self.assertIn('variants created: 1', stdout)
+        cake = Cake.objects.get()
+        self.assertEqual(list(cake.tags.values_list('slug', flat=True)), ['anniversary'])
+        self.assertEqual((cake.min_price, cake.max_price), (Decimal('550.00'), Decimal('900.00')))
+        self.assertEqual(set(search_cakes(Cake.objects.all(), 'anniversary')), {cake})
+        self.assertFalse(search_cakes(Cake.objects.all(), 'party').exists())
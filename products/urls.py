@@ -6,4 +6,5 @@ urlpatterns = [
     path('', views.home, name='home'),
     path('cakes/', views.cake_list, name='cake_list'),
     path('cakes/<int:cake_id>/', views.cake_detail, name='cake_detail'),
+    path('tags/<slug:slug>/', views.tag_cakes, name='tag_cakes'),
 ]
\ No newline at end of file
@@ -1,80 +1,203 @@
 # products/views.py
 from django.shortcuts import render, get_object_or_404
-from django.db.models import Q, Min, Max
-from django.core.paginator import Paginator
+from django.http import Http404
+from django.db.models import Exists, OuterRef, Prefetch
+from cakeshop.pagination import KeysetPaginator
 from django.contrib.auth.decorators import login_required
 from accounts.decorators import seller_required
-from .models import Cake, Category, CakeVariant
+from orders.inventory import available_stock
+from .models import Cake, Category, CakeVariant, CakeImage, CakeRecommendation, Tag
+from .tags import tag_cloud
+from .cache import get_or_build, get_versions, remember_home_cakes
+from .search import search_cakes
+from .categories import active_category_nav, category_descendant_ids, rollup_category_counts
+from .facets import (
+    compute_facets, facet_options, flavor_choices, price_bucket_bounds, price_bucket_choices,
+)
 from django.shortcuts import render
 from .models import Cake, Category
 
+RELATED_CAKES = 4
+
+SORT_ORDERS = {
+    'newest': ('-created_at', '-id'),
+    'price_asc': ('min_price', 'id'),
+    'price_desc': ('-max_price', '-id'),
+}
+
 def cake_list(request):
-    cakes = Cake.objects.filter(is_active=True).select_related('seller', 'category')
+    cakes = Cake.objects.filter(is_active=True)
     
     # Search functionality
     search = request.GET.get('search')
     if search:
-        cakes = cakes.filter(
-            Q(title__icontains=search) |
-            Q(description__icontains=search) |
-            Q(tags__icontains=search) |
-            Q(flavor__icontains=search)
-        )
-    
-    # Filter by category
-    category_id = request.GET.get('category')
-    if category_id:
-        cakes = cakes.filter(category_id=category_id)
-    
-    # Filter by dietary preference
-    dietary = request.GET.get('dietary')
-    if dietary:
-        cakes = cakes.filter(dietary=dietary)
+        cakes = search_cakes(cakes, search)
     
-    # Filter by price range
+    # Filter by price range: some variant must be priced inside it. The
+    # denormalized price range prunes cakes that cannot match on the index
+    # before the per-cake variant check runs
     min_price = request.GET.get('min_price')
     max_price = request.GET.get('max_price')
     if min_price or max_price:
-        variants = CakeVariant.objects.all()
+        variants = CakeVariant.objects.filter(cake=OuterRef('pk'))
         if min_price:
+            cakes = cakes.filter(max_price__gte=min_price)
             variants = variants.filter(price__gte=min_price)
         if max_price:
+            cakes = cakes.filter(min_price__lte=max_price)
             variants = variants.filter(price__lte=max_price)
-        cake_ids = variants.values_list('cake_id', flat=True)
-        cakes = cakes.filter(id__in=cake_ids)
+        cakes = cakes.filter(Exists(variants))
+    
+    # Only cakes with at least one variant in stock
+    in_stock = request.GET.get('in_stock')
+    if in_stock:
+        cakes = cakes.filter(in_stock=True)
+    
+    # Facet counts are taken before the facet filters themselves are applied
+    category_id = request.GET.get('category')
+    dietary = request.GET.get('dietary')
+    flavor = request.GET.get('flavor')
+    price_bucket = request.GET.get('price')
+    categories = active_category_nav()
+    category_ids = (category_descendant_ids(category_id) or set()) if category_id else None
+    facet_counts = compute_facets(
+        cakes,
+        selected={'category': category_ids, 'dietary': dietary, 'flavor': flavor, 'price': price_bucket},
+        cache_params={
+            'search': search, 'min_price': min_price, 'max_price': max_price, 'in_stock': in_stock,
+            'catalog': get_versions('catalog')[0],
+        },
+    )
+    
+    # Filter by category, including all of its sub-categories
+    if category_id:
+        cakes = cakes.filter(category_id__in=category_ids or [])
+    
+    # Filter by dietary preference
+    if dietary:
+        cakes = cakes.filter(dietary=dietary)
     
-    # Pagination
-    paginator = Paginator(cakes, 6)  # 12 cakes per page
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Filter by flavor
+    if flavor:
+        cakes = cakes.filter(flavor=flavor)
+    
+    # Filter by price bucket
+    if price_bucket:
+        low, high = price_bucket_bounds(price_bucket)
+        if low is not None:
+            cakes = cakes.filter(min_price__gte=low)
+        if high is not None:
+            cakes = cakes.filter(min_price__lt=high)
+    
+    # Most relevant first when searching, newest first otherwise
+    sort = request.GET.get('sort')
+    if sort in SORT_ORDERS:
+        ordering = SORT_ORDERS[sort]
+        if sort != 'newest':
+            # Cakes without variants have no price to sort or page by
+            cakes = cakes.filter(min_price__isnull=False)
+    elif search:
+        ordering = ('-search_rank', '-created_at', '-id')
+    else:
+        ordering = SORT_ORDERS['newest']
+    
+    # Keyset pagination
+    paginator = KeysetPaginator(cakes.for_listing(), 6, ordering=ordering)
+    page_obj = paginator.get_page(request.GET.get('cursor'))
     
     context = {
         'page_obj': page_obj,
-        'categories': Category.objects.filter(is_active=True),
+        'categories': categories,
         'dietary_choices': Cake.DIETARY_CHOICES,
+        'facets': [
+            ('Category', facet_options(
+                rollup_category_counts(facet_counts['category']),
+                [(c['id'], c['name']) for c in categories],
+                category_id, request.GET, 'category')),
+            ('Dietary', facet_options(
+                facet_counts['dietary'], Cake.DIETARY_CHOICES, dietary, request.GET, 'dietary')),
+            ('Flavor', facet_options(
+                facet_counts['flavor'], flavor_choices(facet_counts['flavor']), flavor, request.GET, 'flavor')),
+            ('Price', facet_options(
+                facet_counts['price'], price_bucket_choices(), price_bucket, request.GET, 'price')),
+        ],
+        'tag_cloud': tag_cloud(),
         'current_filters': {
             'search': search,
             'category': category_id,
             'dietary': dietary,
+            'flavor': flavor,
+            'price': price_bucket,
             'min_price': min_price,
             'max_price': max_price,
+            'in_stock': in_stock,
+            'sort': sort,
         }
     }
     return render(request, 'products/cake_list.html', context)
 
-def cake_detail(request, cake_id):
-    cake = get_object_or_404(Cake, id=cake_id, is_active=True)
-    variants = cake.variants.all()
-    related_cakes = Cake.objects.filter(
-        category=cake.category, 
-        is_active=True
-    ).exclude(id=cake.id)[:4]
+def tag_cakes(request, slug):
+    tag = get_object_or_404(Tag, slug=slug)
+    cakes = Cake.objects.filter(tags=tag, is_active=True)
+    
+    paginator = KeysetPaginator(cakes.for_listing(), 6, ordering=SORT_ORDERS['newest'])
+    page_obj = paginator.get_page(request.GET.get('cursor'))
     
     context = {
-        'cake': cake,
-        'variants': variants,
-        'related_cakes': related_cakes,
+        'page_obj': page_obj,
+        'tag': tag,
+        'facets': [],
+        'tag_cloud': tag_cloud(),
     }
+    return render(request, 'products/cake_list.html', context)
+
+def cake_detail(request, cake_id):
+    def build_cake():
+        cake = Cake.objects.filter(id=cake_id, is_active=True).select_related('category').prefetch_related(
+            Prefetch('variants', queryset=CakeVariant.objects.order_by('id')),
+            Prefetch('images', queryset=CakeImage.objects.order_by('id')),
+        ).first()
+        if cake is None:
+            return {'cake': None}
+        return {'cake': cake, 'variants': list(cake.variants.all())}
+    
+    context = dict(get_or_build(f'page:cake_detail:{cake_id}', [f'cake:{cake_id}'], build_cake))
+    cake = context['cake']
+    if cake is None:
+        raise Http404("No Cake matches the given query.")
+    
+    # Availability moves with every checkout, so it is read live rather than cached
+    available = available_stock([variant.id for variant in context['variants']])
+    for variant in context['variants']:
+        variant.available = available.get(variant.id, 0)
+    
+    # Co-purchase recommendations first, topped up with cakes of the same category
+    recommended_ids = get_or_build(
+        f'recommendation_ids:{cake.id}',
+        ['recommendations'],
+        lambda: list(CakeRecommendation.objects.filter(cake_id=cake.id)
+                     .order_by('rank').values_list('recommended_id', flat=True)[:RELATED_CAKES]),
+    )
+    
+    def build_related():
+        by_id = {
+            related.id: related
+            for related in Cake.objects.filter(id__in=recommended_ids, is_active=True).for_listing()
+        }
+        related_cakes = [by_id[i] for i in recommended_ids if i in by_id]
+        if len(related_cakes) < RELATED_CAKES:
+            related_cakes += list(Cake.objects.filter(
+                category_id=cake.category_id, 
+                is_active=True
+            ).exclude(id__in=[cake.id, *by_id]).for_listing()[:RELATED_CAKES - len(related_cakes)])
+        return related_cakes
+    
+    # Invalidated by any change to the category or to one of the recommended cakes
+    context['related_cakes'] = get_or_build(
+        f'page:related_cakes:{cake.id}',
+        [f'category:{cake.category_id}', *(f'cake:{i}' for i in recommended_ids)],
+        build_related,
+    )
     return render(request, 'products/cake_detail.html', context)
 
 @seller_required
@@ -89,12 +212,17 @@ def seller_dashboard(request):
 
 def home(request):
     # Show featured cakes, e.g. today's special or latest
-    todays_special_cakes = Cake.objects.filter(is_todays_special=True, is_active=True)[:5]
-    latest_cakes = Cake.objects.filter(is_active=True).order_by('-created_at')[:10]
+    def build():
+        todays_special_cakes = list(
+            Cake.objects.filter(is_todays_special=True, is_active=True).for_listing()[:5])
+        latest_cakes = list(
+            Cake.objects.filter(is_active=True).order_by('-created_at').for_listing()[:10])
+        remember_home_cakes(cake.id for cake in todays_special_cakes + latest_cakes)
+        return {
+            'todays_special_cakes': todays_special_cakes,
+            'latest_cakes': latest_cakes,
+            'categories': list(Category.objects.filter(is_active=True)),
+        }
     
-    context = {
-        'todays_special_cakes': todays_special_cakes,
-        'latest_cakes': latest_cakes,
-        'categories': Category.objects.filter(is_active=True),
-    }
-    return render(request, 'products/home.html', context)
\ No newline at end of file
+    context = get_or_build('page:home', ['home', 'categories'], build)
+    return render(request, 'products/home.html', context)
@@ -1,5 +1,6 @@
 # reviews/admin.py
 from django.contrib import admin
+from django.utils import timezone
 from .models import Review
 
 @admin.register(Review)
@@ -10,7 +11,7 @@ class ReviewAdmin(admin.ModelAdmin):
     actions = ['approve_reviews', 'reject_reviews']
     
     def approve_reviews(self, request, queryset):
-        updated = queryset.update(is_approved=True)
+        updated = queryset.update(is_approved=True, updated_at=timezone.now())
         self.message_user(request, f"{updated} review(s) approved.")
     approve_reviews.short_description = "Approve selected reviews"
     
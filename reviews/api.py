@@ -0,0 +1,37 @@
+# reviews/api.py
+from django.db.models import Count, Max
+from django.shortcuts import get_object_or_404
+from rest_framework.decorators import api_view, renderer_classes
+from rest_framework.renderers import JSONRenderer
+
+from cakeshop.pagination import KeysetPaginator
+from products.api import conditional, make_etag
+from products.models import Cake
+from .serializers import ReviewSerializer
+
+API_PAGE_SIZE = 20
+
+
+@api_view(['GET'])
+@renderer_classes([JSONRenderer])
+def cake_reviews(request, cake_id):
+    cake = get_object_or_404(Cake.objects.only('id'), id=cake_id, is_active=True)
+    reviews = cake.reviews.filter(is_approved=True)
+
+    # Rejecting a review changes the count, a new one the max id, and an
+    # edit or approval the latest updated_at
+    stats = reviews.aggregate(total=Count('id'), last_id=Max('id'), last_updated=Max('updated_at'))
+    etag = make_etag(
+        'reviews', cake.id, stats['total'], stats['last_id'], stats['last_updated'], request.GET.urlencode(),
+    )
+
+    def build():
+        page = KeysetPaginator(reviews.select_related('user'), API_PAGE_SIZE).get_page(request.GET.get('cursor'))
+        return {
+            'count': stats['total'],
+            'results': ReviewSerializer(page.object_list, many=True).data,
+            'next': page.next_token,
+            'previous': page.previous_token,
+        }
+
+    return conditional(request, build, etag, stats['last_updated'])
@@ -0,0 +1,7 @@
+# reviews/api_urls.py
+from django.urls import path
+from . import api
+
+urlpatterns = [
+    path('cakes/<int:cake_id>/reviews/', api.cake_reviews, name='api_cake_reviews'),
+]
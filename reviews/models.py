@@ -14,6 +14,8 @@ class Review(models.Model):
     comment = models.TextField()
     is_approved = models.BooleanField(default=False)  # Admin approval required
     created_at = models.DateTimeField(auto_now_add=True)
+    # Part of the reviews API ETag, so edits and approvals show up there
+    updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         unique_together = ['user', 'cake', 'order']  # One review per cake per order
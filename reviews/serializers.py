@@ -0,0 +1,15 @@
+# reviews/serializers.py
+from rest_framework import serializers
+
+from .models import Review
+
+
+class ReviewSerializer(serializers.ModelSerializer):
+    author = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Review
+        fields = ['id', 'cake', 'rating', 'title', 'comment', 'author', 'created_at']
+
+    def get_author(self, obj):
+        return obj.user.get_full_name() or obj.user.username
@@ -3,6 +3,8 @@ from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.http import JsonResponse
+from django.db.models import Avg, Count
+from cakeshop.pagination import KeysetPaginator
 from .models import Review
 from orders.models import Order, OrderItem
 from products.models import Cake
@@ -45,19 +47,20 @@ def add_review(request, order_id, cake_id):
 
 def cake_reviews(request, cake_id):
     cake = get_object_or_404(Cake, id=cake_id)
-    reviews = cake.reviews.filter(is_approved=True).order_by('-created_at')
+    reviews = cake.reviews.filter(is_approved=True).select_related('user')
     
-    # Calculate average rating
-    if reviews.exists():
-        avg_rating = sum(review.rating for review in reviews) / reviews.count()
-        avg_rating = round(avg_rating, 1)
-    else:
-        avg_rating = 0
+    # Calculate average rating in the database rather than over every review
+    stats = reviews.aggregate(avg_rating=Avg('rating'), total=Count('id'))
+    avg_rating = round(stats['avg_rating'], 1) if stats['avg_rating'] is not None else 0
+    
+    paginator = KeysetPaginator(reviews, 10, ordering=('-created_at', '-id'))
+    page_obj = paginator.get_page(request.GET.get('cursor'))
     
     context = {
         'cake': cake,
-        'reviews': reviews,
+        'reviews': page_obj,
+        'page_obj': page_obj,
         'avg_rating': avg_rating,
-        'total_reviews': reviews.count(),
+        'total_reviews': stats['total'],
     }
     return render(request, 'reviews/cake_reviews.html', context)